@@ -0,0 +1,219 @@
+"""
+Response cache for deterministic AI insight calls.
+
+Entries are keyed on a hash of the normalized prompt plus the model and
+generation settings, expire after a TTL, and are evicted least-recently-used
+once the cache is full. The default SQLite backend lives under instance/ so
+cached replies survive restarts and are shared by every worker on the host;
+set AI_CACHE_BACKEND=memory for a per-process cache or `off` to disable.
+
+Lookups come from green threads and from tpool threads (`offload`), so the
+locks are real OS locks; no critical section yields to the hub.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+
+from ai.executor import _native_threading
+
+logger = logging.getLogger(__name__)
+
+AI_CACHE_BACKEND = os.environ.get("AI_CACHE_BACKEND", "sqlite").lower()
+AI_CACHE_TTL = int(os.environ.get("AI_CACHE_TTL", str(7 * 24 * 3600)))
+AI_CACHE_MAX_ENTRIES = int(os.environ.get("AI_CACHE_MAX_ENTRIES", "5000"))
+AI_CACHE_PATH = os.environ.get(
+    "AI_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'ai_response_cache.db')
+)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(text: str) -> str:
+    """Collapse whitespace so indentation changes in prompt templates don't miss the cache."""
+    return _WHITESPACE.sub(" ", text or "").strip()
+
+
+def make_key(namespace, prompt, system_prompt, model, max_tokens, temperature):
+    payload = json.dumps(
+        [namespace, model, normalize_prompt(system_prompt), normalize_prompt(prompt), int(max_tokens), float(temperature)]
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class MemoryCacheBackend:
+    """Per-process LRU with TTL."""
+
+    name = 'memory'
+
+    def __init__(self, max_entries=AI_CACHE_MAX_ENTRIES, ttl=AI_CACHE_TTL):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = _native_threading().Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """SQLite-backed LRU with TTL, shared across workers and restarts."""
+
+    name = 'sqlite'
+
+    def __init__(self, path=AI_CACHE_PATH, max_entries=AI_CACHE_MAX_ENTRIES, ttl=AI_CACHE_TTL):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._lock = _native_threading().Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ai_response_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_ai_response_cache_last_access ON ai_response_cache (last_access)"
+        )
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM ai_response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM ai_response_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE ai_response_cache SET last_access = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ai_response_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl, now)
+            )
+            self._conn.execute("DELETE FROM ai_response_cache WHERE expires_at < ?", (now,))
+            overflow = self._conn.execute("SELECT COUNT(*) FROM ai_response_cache").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM ai_response_cache WHERE key IN ("
+                    " SELECT key FROM ai_response_cache ORDER BY last_access LIMIT ?)",
+                    (overflow,)
+                )
+                return overflow
+            return 0
+
+    def size(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM ai_response_cache").fetchone()[0]
+
+
+class ResponseCache:
+    """Front for a cache backend that keeps per-namespace hit/miss counters."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = _native_threading().Lock()
+        self._counters = {}
+        self.evictions = 0
+
+    def _count(self, namespace, field, amount=1):
+        with self._lock:
+            counters = self._counters.setdefault(namespace, {'hits': 0, 'misses': 0})
+            counters[field] += amount
+
+    def get(self, namespace, key):
+        try:
+            value = self.backend.get(key) if self.backend else None
+        except Exception:
+            logger.exception("AI response cache lookup failed")
+            value = None
+        self._count(namespace, 'hits' if value is not None else 'misses')
+        return value
+
+    def set(self, key, value):
+        if not self.backend:
+            return
+        try:
+            evicted = self.backend.set(key, value)
+        except Exception:
+            logger.exception("AI response cache store failed")
+            return
+        if evicted:
+            with self._lock:
+                self.evictions += evicted
+
+    def stats(self):
+        with self._lock:
+            namespaces = {
+                name: dict(c, hit_rate=round(c['hits'] / (c['hits'] + c['misses']), 3) if c['hits'] + c['misses'] else 0.0)
+                for name, c in self._counters.items()
+            }
+            hits = sum(c['hits'] for c in self._counters.values())
+            misses = sum(c['misses'] for c in self._counters.values())
+            evictions = self.evictions
+        try:
+            size = self.backend.size() if self.backend else 0
+        except Exception:
+            size = None
+        return {
+            'backend': self.backend.name if self.backend else 'off',
+            'entries': size,
+            'hits': hits,
+            'misses': misses,
+            'evictions': evictions,
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            'namespaces': namespaces
+        }
+
+
+def _create_backend():
+    if AI_CACHE_BACKEND in ('off', 'none', 'disabled'):
+        return None
+    if AI_CACHE_BACKEND == 'memory':
+        return MemoryCacheBackend()
+    try:
+        return SQLiteCacheBackend()
+    except Exception:
+        logger.exception("Could not open SQLite AI response cache, falling back to memory")
+        return MemoryCacheBackend()
+
+
+response_cache = ResponseCache(_create_backend())
@@ -0,0 +1,71 @@
+"""
+Offload helpers that keep blocking AI work off the eventlet hub.
+
+Gunicorn runs a single eventlet worker, so a blocking Gemini call (gRPC is C code
+and does not cooperate with green threads) stalls every socket in the process.
+`offload` runs such calls in eventlet's native thread pool when the process is
+monkey patched and inline otherwise, and `run_coroutine` drives coroutines on one
+long-lived event loop instead of creating a new loop per request.
+"""
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _eventlet_patched():
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return False
+    return patcher.is_monkey_patched('thread')
+
+
+def _native_threading():
+    """Return the real OS threading module even when eventlet has patched it."""
+    if _eventlet_patched():
+        from eventlet import patcher
+        return patcher.original('threading')
+    return threading
+
+
+def offload(fn, *args, **kwargs):
+    """Run a blocking callable without blocking the eventlet hub."""
+    if _eventlet_patched():
+        from eventlet import tpool
+        return tpool.execute(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+def iter_offloaded(iterable):
+    """Iterate a blocking iterator (e.g. a streamed response), offloading each step."""
+    iterator = iter(iterable)
+    sentinel = object()
+    while True:
+        item = offload(next, iterator, sentinel)
+        if item is sentinel:
+            return
+        yield item
+
+
+def get_event_loop():
+    """Return the shared AI event loop, starting its native thread on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            thread = _native_threading().Thread(target=loop.run_forever, name='ai-event-loop', daemon=True)
+            thread.start()
+            _loop = loop
+            logger.info("Started shared AI event loop thread")
+        return _loop
+
+
+def run_coroutine(coro, timeout=None):
+    """Run a coroutine on the shared loop and wait for its result from sync code."""
+    future = asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+    return offload(future.result, timeout)
@@ -2,8 +2,11 @@
 import os
 import json
 import logging
+from collections import OrderedDict
 import google.generativeai as genai
 from dotenv import load_dotenv
+from ai.executor import _native_threading
+from ai.interface import AIProvider
 
 # Load environment variables (safe to call multiple times)
 load_dotenv()
@@ -12,6 +15,11 @@ logger = logging.getLogger(__name__)
 
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 GEMINI_MODEL_NAME = os.environ.get("GEMINI_MODEL_NAME", "gemini-1.5-flash") # Updated default model
+GEMINI_FALLBACK_MODEL_NAME = os.environ.get("GEMINI_FALLBACK_MODEL_NAME", "gemini-flash-latest")
+# Transport used by the SDK clients ('grpc' or 'rest'); None lets the SDK decide
+GEMINI_TRANSPORT = os.environ.get("GEMINI_TRANSPORT") or None
+# Maximum number of distinct (model, generation config) clients kept alive
+GEMINI_CLIENT_POOL_SIZE = int(os.environ.get("GEMINI_CLIENT_POOL_SIZE", "8"))
 
 # Debug logging
 logger.info(f"GEMINI_API_KEY loaded: {'Yes' if GEMINI_API_KEY else 'No'}")
@@ -19,6 +27,110 @@ if not GEMINI_API_KEY:
     logger.error("GEMINI_API_KEY is not set in environment variables!")
     logger.info(f"Available env vars starting with GEMINI: {[k for k in os.environ.keys() if k.startswith('GEMINI')]}")
 
+SAFETY_BLOCKED_REPLY = "I understand your message, but I'm unable to provide a specific response due to safety guidelines. Please consider reaching out to a mental health professional for personalized support."
+
+
+class GeminiClientRegistry:
+    """
+    Long-lived registry of configured Gemini models.
+
+    The SDK is configured once per process so the underlying gRPC channel / HTTP
+    session is kept alive and reused between calls. Models are keyed by model name
+    and generation config and evicted least-recently-used once the pool is full.
+    Callers include green threads, tpool threads (`offload`) and the native
+    `ai-event-loop` thread, so access is guarded by a real OS lock; the critical
+    section never yields to the hub.
+    """
+
+    def __init__(self, pool_size=GEMINI_CLIENT_POOL_SIZE):
+        self.pool_size = max(1, pool_size)
+        self._models = OrderedDict()
+        self._lock = _native_threading().Lock()
+        self._configured = False
+        self.hits = 0
+        self.cold_creations = 0
+        self.evictions = 0
+
+    def _ensure_configured(self):
+        if self._configured:
+            return
+        if not GEMINI_API_KEY:
+            raise RuntimeError("GEMINI_API_KEY not set")
+        genai.configure(api_key=GEMINI_API_KEY, transport=GEMINI_TRANSPORT)
+        self._configured = True
+        logger.info(f"Gemini SDK configured (transport={GEMINI_TRANSPORT or 'default'}, pool_size={self.pool_size})")
+
+    def get_model(self, model_name, max_tokens, temperature):
+        """Return a pooled GenerativeModel for the given model and generation config."""
+        key = (model_name, int(max_tokens), float(temperature))
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return model
+
+            self._ensure_configured()
+            model = genai.GenerativeModel(
+                model_name,
+                generation_config=genai.types.GenerationConfig(
+                    max_output_tokens=max_tokens,
+                    temperature=temperature
+                )
+            )
+            self._models[key] = model
+            self.cold_creations += 1
+            if len(self._models) > self.pool_size:
+                self._models.popitem(last=False)
+                self.evictions += 1
+            return model
+
+    def stats(self):
+        """Pool metrics for health checks and latency dashboards."""
+        with self._lock:
+            lookups = self.hits + self.cold_creations
+            return {
+                'configured': self._configured,
+                'pool_size': self.pool_size,
+                'pooled_models': len(self._models),
+                'hits': self.hits,
+                'cold_creations': self.cold_creations,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+client_registry = GeminiClientRegistry()
+
+
+def get_client_pool_stats():
+    """Return hit/cold-creation counters for the Gemini client pool."""
+    return client_registry.stats()
+
+
+def _generate(model_name, prompt, max_tokens, temperature):
+    model = client_registry.get_model(model_name, max_tokens, temperature)
+    return model.generate_content(prompt)
+
+
+def _response_text(response):
+    # Handle safety filter blocks
+    try:
+        return response.text
+    except ValueError as e:
+        if "safety_ratings" in str(e):
+            logger.warning("Response blocked by safety filters")
+            return SAFETY_BLOCKED_REPLY
+        else:
+            raise e
+
+
+def _build_prompt(system_prompt, user_text):
+    # The SDK expects a list of contents. The system prompt can be sent as a separate message.
+    # However, to match the previous implementation, I will concatenate the prompts.
+    return f"{system_prompt}\n\nUser: {user_text}"
+
+
 def ask_gemini_system_user(system_prompt: str, user_text: str, max_tokens: int = 1024, temperature: float = 0.2):
     """
     Simple wrapper to call Gemini using the Python SDK.
@@ -26,50 +138,104 @@ def ask_gemini_system_user(system_prompt: str, user_text: str, max_tokens: int =
     if not GEMINI_API_KEY:
         raise RuntimeError("GEMINI_API_KEY not set")
 
-    genai.configure(api_key=GEMINI_API_KEY)
-    
-    # Use the correct model name format for the installed version
-    model_name_sdk = "gemini-1.5-flash"
-    
+    prompt = _build_prompt(system_prompt, user_text)
+
     try:
-        model = genai.GenerativeModel(model_name_sdk)
-        
-        # The SDK expects a list of contents. The system prompt can be sent as a separate message.
-        # However, to match the previous implementation, I will concatenate the prompts.
-        prompt = f"{system_prompt}\n\nUser: {user_text}"
-        
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                max_output_tokens=max_tokens,
-                temperature=temperature
-            )
-        )
-        
-        # Handle safety filter blocks
-        try:
-            return response.text
-        except ValueError as e:
-            if "safety_ratings" in str(e):
-                logger.warning("Response blocked by safety filters")
-                return "I understand your message, but I'm unable to provide a specific response due to safety guidelines. Please consider reaching out to a mental health professional for personalized support."
-            else:
-                raise e
-        
+        response = _generate(GEMINI_MODEL_NAME, prompt, max_tokens, temperature)
+        return _response_text(response)
+
     except Exception as e:
         logger.exception("Gemini call failed")
-        # Try with gemini-flash-latest as a fallback (known working model)
+        # Try with the fallback model (known working model)
         try:
-            model = genai.GenerativeModel("gemini-flash-latest")
-            prompt = f"{system_prompt}\n\nUser: {user_text}"
-            response = model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    max_output_tokens=max_tokens,
-                    temperature=temperature
-                )
-            )
+            response = _generate(GEMINI_FALLBACK_MODEL_NAME, prompt, max_tokens, temperature)
             return response.text
         except Exception as e2:
             logger.exception("Gemini call with fallback model also failed")
             raise e2
+
+
+def stream_gemini_system_user(system_prompt: str, user_text: str, max_tokens: int = 1024, temperature: float = 0.2):
+    """
+    Generator yielding Gemini response text chunks as they arrive.
+
+    Falls back to the fallback model only if the primary model fails before
+    producing any output; failures mid-stream are raised to the caller.
+    """
+    if not GEMINI_API_KEY:
+        raise RuntimeError("GEMINI_API_KEY not set")
+
+    prompt = _build_prompt(system_prompt, user_text)
+    yielded = False
+    for model_name in (GEMINI_MODEL_NAME, GEMINI_FALLBACK_MODEL_NAME):
+        try:
+            model = client_registry.get_model(model_name, max_tokens, temperature)
+            for chunk in model.generate_content(prompt, stream=True):
+                text = _response_text(chunk)
+                if text:
+                    yielded = True
+                    yield text
+            return
+        except Exception:
+            if yielded or model_name == GEMINI_FALLBACK_MODEL_NAME:
+                logger.exception("Streaming Gemini call failed")
+                raise
+            logger.exception("Streaming Gemini call failed, retrying with fallback model")
+
+
+async def ask_gemini_system_user_async(system_prompt: str, user_text: str, max_tokens: int = 1024, temperature: float = 0.2):
+    """
+    Async counterpart of `ask_gemini_system_user` using the SDK's native async client.
+
+    Must run on a single long-lived event loop (see ai.executor), because the SDK
+    caches its async channel per loop.
+    """
+    if not GEMINI_API_KEY:
+        raise RuntimeError("GEMINI_API_KEY not set")
+
+    prompt = _build_prompt(system_prompt, user_text)
+
+    try:
+        model = client_registry.get_model(GEMINI_MODEL_NAME, max_tokens, temperature)
+        response = await model.generate_content_async(prompt)
+        return _response_text(response)
+    except Exception:
+        logger.exception("Async Gemini call failed")
+        try:
+            model = client_registry.get_model(GEMINI_FALLBACK_MODEL_NAME, max_tokens, temperature)
+            response = await model.generate_content_async(prompt)
+            return response.text
+        except Exception as e2:
+            logger.exception("Async Gemini call with fallback model also failed")
+            raise e2
+
+
+class GeminiProvider(AIProvider):
+    """AIProvider backed by the pooled Gemini clients, with a native async `ask`."""
+
+    def __init__(self, system_prompt: str = "You are a helpful AI assistant."):
+        self.system_prompt = system_prompt
+
+    def ask(self, prompt: str, **kwargs) -> str:
+        return ask_gemini_system_user(
+            kwargs.get('system_prompt', self.system_prompt),
+            prompt,
+            max_tokens=kwargs.get('max_tokens', 1024),
+            temperature=kwargs.get('temperature', 0.7)
+        )
+
+    def ask_stream(self, prompt: str, **kwargs):
+        return stream_gemini_system_user(
+            kwargs.get('system_prompt', self.system_prompt),
+            prompt,
+            max_tokens=kwargs.get('max_tokens', 1024),
+            temperature=kwargs.get('temperature', 0.7)
+        )
+
+    async def ask_async(self, prompt: str, **kwargs) -> str:
+        return await ask_gemini_system_user_async(
+            kwargs.get('system_prompt', self.system_prompt),
+            prompt,
+            max_tokens=kwargs.get('max_tokens', 1024),
+            temperature=kwargs.get('temperature', 0.7)
+        )
@@ -1,4 +1,6 @@
+import asyncio
 from abc import ABC, abstractmethod
+from functools import partial
 
 class AIProvider(ABC):
     """Abstract interface for an AI provider."""
@@ -16,3 +18,13 @@ class AIProvider(ABC):
             The AI's response as a string.
         """
         pass
+
+    async def ask_async(self, prompt: str, **kwargs) -> str:
+        """
+        Async variant of `ask`.
+
+        Providers with a native async client should override this; the default
+        runs the blocking `ask` in the event loop's executor.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(self.ask, prompt, **kwargs))
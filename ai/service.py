@@ -3,21 +3,77 @@ import json
 import re
 import logging
 import asyncio
-from ai.gemini_impl import ask_gemini_system_user
+from ai.gemini_impl import GeminiProvider, get_client_pool_stats, GEMINI_API_KEY, GEMINI_MODEL_NAME
+from ai.cache import response_cache, make_key
 from severity import heuristic_severity
 
 logger = logging.getLogger(__name__)
 
+# Shared provider instance; swap here to change the backing model service
+provider = GeminiProvider()
+
+def _strip_json_fence(response: str) -> str:
+    return response.strip().replace('```json', '').replace('```', '')
+
+def _is_json_reply(response: str) -> bool:
+    try:
+        json.loads(_strip_json_fence(response))
+        return True
+    except (TypeError, ValueError):
+        return False
+
 def ask(prompt: str, system_prompt: str = "You are a helpful AI assistant.", **kwargs) -> str:
     """
     A simple wrapper to call the configured AI client.
+
+    Pass `cache_namespace` to opt a call into the response cache; an optional
+    `cache_validate` callable decides whether a reply is worth storing.
     """
+    max_tokens = kwargs.get('max_tokens', 1024)
+    temperature = kwargs.get('temperature', 0.7)
+    cache_namespace = kwargs.get('cache_namespace')
+    cache_validate = kwargs.get('cache_validate')
+
+    cache_key = None
+    if cache_namespace:
+        cache_key = make_key(cache_namespace, prompt, system_prompt, GEMINI_MODEL_NAME, max_tokens, temperature)
+        cached = response_cache.get(cache_namespace, cache_key)
+        if cached is not None:
+            return cached
+
     try:
-        return ask_gemini_system_user(system_prompt, prompt, max_tokens=1024, temperature=0.7)
+        response = provider.ask(prompt, system_prompt=system_prompt, max_tokens=max_tokens, temperature=temperature)
     except Exception as e:
         logger.exception("AI service 'ask' failed")
         raise e
 
+    if cache_key and response and (cache_validate is None or cache_validate(response)):
+        response_cache.set(cache_key, response)
+    return response
+
+async def ask_async(prompt: str, system_prompt: str = "You are a helpful AI assistant.", **kwargs) -> str:
+    """
+    Non-blocking variant of `ask` for use on the shared AI event loop.
+    """
+    max_tokens = kwargs.get('max_tokens', 1024)
+    temperature = kwargs.get('temperature', 0.7)
+    try:
+        return await provider.ask_async(prompt, system_prompt=system_prompt, max_tokens=max_tokens, temperature=temperature)
+    except Exception as e:
+        logger.exception("AI service 'ask_async' failed")
+        raise e
+
+def check_api_status() -> dict:
+    """
+    Report AI availability plus client pool metrics for health checks.
+    """
+    return {
+        'model_available': bool(GEMINI_API_KEY),
+        'model': GEMINI_MODEL_NAME,
+        'client_pool': get_client_pool_stats(),
+        'response_cache': response_cache.stats()
+    }
+
 async def ask_with_severity(user_text: str, user_id=None, prefer_llm=True):
     # 1) quick heuristic
     score = heuristic_severity(user_text)
@@ -36,8 +92,8 @@ async def ask_with_severity(user_text: str, user_id=None, prefer_llm=True):
 
     raw = None
     try:
-        # call gemini wrapper with reduced tokens for chat
-        raw = ask_gemini_system_user(system_prompt, user_text, max_tokens=300, temperature=0.2)
+        # call gemini with reduced tokens for chat, without blocking the loop
+        raw = await provider.ask_async(user_text, system_prompt=system_prompt, max_tokens=300, temperature=0.2)
     except Exception:
         logger.exception("Gemini call failed inside ask_with_severity")
 
@@ -95,10 +151,12 @@ async def ask_with_severity(user_text: str, user_id=None, prefer_llm=True):
         'reason': reason
     }
 
-def generate_assessment_insights(assessment_type: str, score: int, responses: list) -> dict:
+def generate_assessment_insights(assessment_type: str, score: int, responses: list, raise_on_error: bool = False) -> dict:
     """
     Generate AI-powered insights based on assessment results.
     Returns a dictionary with summary, recommendations, and resources.
+    With `raise_on_error`, AI failures propagate instead of returning the fallback
+    (used by background jobs so they can be retried).
     """
     try:
         # Concise prompt for token efficiency
@@ -116,7 +174,8 @@ def generate_assessment_insights(assessment_type: str, score: int, responses: li
         """
         
         system_prompt = "You are a mental health professional."
-        response = ask(prompt, system_prompt=system_prompt, max_tokens=600)
+        response = ask(prompt, system_prompt=system_prompt, max_tokens=600,
+                       cache_namespace='assessment_insights', cache_validate=_is_json_reply)
         
         # Try to parse the response as JSON
         clean_response = response.strip().replace('```json', '').replace('```', '')
@@ -142,6 +201,8 @@ def generate_assessment_insights(assessment_type: str, score: int, responses: li
             
     except Exception as e:
         logger.exception("Error generating assessment insights")
+        if raise_on_error:
+            raise
         # Return a fallback response if anything goes wrong
         return {
             "summary": f"Your {assessment_type} assessment score is {score}. AI insights are temporarily unavailable.",
@@ -203,7 +264,7 @@ def generate_progress_recommendations(user_data: dict) -> dict:
             ]
         }
 
-def generate_digital_detox_insights(detox_data: dict) -> dict:
+def generate_digital_detox_insights(detox_data: dict, raise_on_error: bool = False) -> dict:
     """
     Generate AI-powered digital detox insights.
     """
@@ -220,7 +281,8 @@ def generate_digital_detox_insights(detox_data: dict) -> dict:
         """
         
         system_prompt = "You are a digital wellness coach."
-        response = ask(prompt, system_prompt=system_prompt, max_tokens=400)
+        response = ask(prompt, system_prompt=system_prompt, max_tokens=400,
+                       cache_namespace='digital_detox_insights', cache_validate=_is_json_reply)
         
         clean_response = response.strip().replace('```json', '').replace('```', '')
         try:
@@ -238,6 +300,8 @@ def generate_digital_detox_insights(detox_data: dict) -> dict:
             }
     except Exception as e:
         logger.exception("Error generating digital detox insights")
+        if raise_on_error:
+            raise
         return {
             "analysis": "Digital wellness analysis temporarily unavailable.",
             "recommendations": [
@@ -261,6 +325,23 @@ def generate_chat_response(prompt: str) -> str:
         logger.exception("Error generating chat response")
         return "I'm here to support you. How can I help you today?"
 
+def generate_chat_response_stream(prompt: str):
+    """
+    Streaming variant of `generate_chat_response`; yields reply text chunks.
+    """
+    enhanced_prompt = f"User: {prompt}\nResponse:"
+    system_prompt = "Supportive mental health assistant. Brief, empathetic (2-3 sentences)."
+
+    yielded = False
+    try:
+        for chunk in provider.ask_stream(enhanced_prompt, system_prompt=system_prompt, max_tokens=150):
+            yielded = True
+            yield chunk
+    except Exception:
+        logger.exception("Error streaming chat response")
+        if not yielded:
+            yield "I'm here to support you. How can I help you today?"
+
 def generate_goal_suggestions(patient_data: dict) -> list:
     """
     Generate AI-powered goal suggestions based on patient data.
@@ -273,7 +354,8 @@ def generate_goal_suggestions(patient_data: dict) -> list:
         """
         
         system_prompt = "Wellness coach."
-        response = ask(prompt, system_prompt=system_prompt, max_tokens=300)
+        response = ask(prompt, system_prompt=system_prompt, max_tokens=300,
+                       cache_namespace='goal_suggestions', cache_validate=_is_json_reply)
         
         clean_response = response.strip().replace('```json', '').replace('```', '')
         try:
@@ -303,7 +385,8 @@ def analyze_medication_adherence(medication_logs: list, patient_data: dict) -> d
         """
         
         system_prompt = "Medical assistant."
-        response = ask(prompt, system_prompt=system_prompt, max_tokens=300)
+        response = ask(prompt, system_prompt=system_prompt, max_tokens=300,
+                       cache_namespace='medication_adherence', cache_validate=_is_json_reply)
         
         clean_response = response.strip().replace('```json', '').replace('```', '')
         try:
@@ -323,7 +406,7 @@ def analyze_medication_adherence(medication_logs: list, patient_data: dict) -> d
             "recommendation": "Continue tracking your medication."
         }
 
-def generate_journal_insights(title: str, content: str, sentiment: str) -> str:
+def generate_journal_insights(title: str, content: str, sentiment: str, raise_on_error: bool = False) -> str:
     """
     Generate AI-powered insights for a journal entry.
     """
@@ -346,9 +429,11 @@ def generate_journal_insights(title: str, content: str, sentiment: str) -> str:
         return ask(prompt, system_prompt=system_prompt, max_tokens=400)
     except Exception as e:
         logger.exception("Error generating journal insights")
+        if raise_on_error:
+            raise
         return "Thank you for sharing. Consider discussing these feelings with a professional."
 
-def analyze_voice_emotion(transcribed_text: str, audio_features: dict) -> str:
+def analyze_voice_emotion(transcribed_text: str, audio_features: dict, raise_on_error: bool = False) -> str:
     """
     Analyze voice recording for emotion and insights.
     """
@@ -368,4 +453,6 @@ def analyze_voice_emotion(transcribed_text: str, audio_features: dict) -> str:
         return ask(prompt, system_prompt=system_prompt, max_tokens=300)
     except Exception as e:
         logger.exception("Error analyzing voice emotion")
+        if raise_on_error:
+            raise
         return "Neutral: Analysis unavailable."
\ No newline at end of file
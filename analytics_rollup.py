@@ -0,0 +1,130 @@
+"""
+Daily institutional analytics rollups.
+
+Each InstitutionalAnalytics row is the institution summary as it stood at the
+end of one day (same windows as get_institutional_summary). Past days never
+change, so provider pages read history from this table and only compute today
+live; page cost stays flat as the raw log tables grow.
+
+The rollup is incremental: for every institution it fills in days after the
+last stored row up to yesterday. It runs as a self-rescheduling background job
+shortly after midnight, and can be run or backfilled by hand with
+`python -m scripts.rollup_institutional_analytics`.
+"""
+import logging
+import os
+from datetime import datetime, date, timedelta
+
+from extensions import db
+from job_queue import register_job, enqueue
+from models import User, InstitutionalAnalytics, BackgroundJob, DigitalDetoxLog, get_institutional_summary
+
+logger = logging.getLogger(__name__)
+
+# How far back to fill in when an institution has no rollups yet
+ROLLUP_BACKFILL_DAYS = int(os.environ.get("ROLLUP_BACKFILL_DAYS", "30"))
+# Minutes after midnight (server local time) to run the daily rollup
+ROLLUP_DELAY_MINUTES = int(os.environ.get("ROLLUP_DELAY_MINUTES", "5"))
+
+ROLLUP_JOB = 'institutional_rollup'
+
+
+def institutions():
+    """Distinct non-empty institutions that have patients."""
+    rows = db.session.query(User.institution).filter(
+        User.role == 'patient', User.institution.isnot(None), User.institution != ''
+    ).distinct().all()
+    return [row[0] for row in rows]
+
+
+def day_screen_time(institution, day):
+    """Mean screen time of the institution's detox logs dated `day`, or None without logs."""
+    patient_ids = db.session.query(User.id).filter(User.role == 'patient', User.institution == institution)
+    return db.session.query(db.func.avg(DigitalDetoxLog.screen_time_hours)).filter(
+        DigitalDetoxLog.user_id.in_(patient_ids), DigitalDetoxLog.date == day
+    ).scalar()
+
+
+def rollup_day(institution, day):
+    """Compute and upsert the rollup row for one institution and day (not committed)."""
+    summary = get_institutional_summary(institution, db, as_of=day)
+    row = InstitutionalAnalytics.query.filter_by(institution=institution, date=day).first()
+    if row is None:
+        row = InstitutionalAnalytics(institution=institution, date=day)
+        db.session.add(row)
+    row.total_users = summary['total_users']
+    row.active_users = summary['active_users']
+    row.avg_wellness_score = summary['avg_wellness_score']
+    row.avg_screen_time = summary['avg_screen_time']
+    row.day_screen_time = day_screen_time(institution, day)
+    row.high_risk_users = summary['high_risk_users']
+    row.engagement_rate = summary['engagement_rate']
+    row.completion_rate = summary['completion_rate']
+    return row
+
+
+def rollup_institution(institution, through=None, backfill_days=ROLLUP_BACKFILL_DAYS):
+    """Fill in missing days for one institution up to `through` (default yesterday)."""
+    through = through or date.today() - timedelta(days=1)
+    last = db.session.query(db.func.max(InstitutionalAnalytics.date)).filter(
+        InstitutionalAnalytics.institution == institution
+    ).scalar()
+    day = last + timedelta(days=1) if last else through - timedelta(days=backfill_days - 1)
+
+    written = 0
+    while day <= through:
+        rollup_day(institution, day)
+        written += 1
+        day += timedelta(days=1)
+    db.session.commit()
+    return written
+
+
+def run_rollups(through=None, backfill_days=ROLLUP_BACKFILL_DAYS):
+    """Incrementally roll up every institution; returns {institution: days written}."""
+    results = {}
+    for institution in institutions():
+        try:
+            results[institution] = rollup_institution(institution, through, backfill_days)
+        except Exception:
+            db.session.rollback()
+            logger.exception(f"Analytics rollup failed for {institution}")
+    logger.info(f"Institutional analytics rollup wrote {sum(results.values())} rows for {len(results)} institutions")
+    return results
+
+
+def get_rollup_series(institution, days=30):
+    """Stored rollup rows for the last `days` days before today, oldest first."""
+    start = date.today() - timedelta(days=days)
+    return InstitutionalAnalytics.query.filter(
+        InstitutionalAnalytics.institution == institution,
+        InstitutionalAnalytics.date >= start,
+        InstitutionalAnalytics.date < date.today()
+    ).order_by(InstitutionalAnalytics.date.asc()).all()
+
+
+def _seconds_until_next_run():
+    now = datetime.now()
+    next_run = datetime.combine(now.date() + timedelta(days=1), datetime.min.time()) + timedelta(minutes=ROLLUP_DELAY_MINUTES)
+    return (next_run - now).total_seconds()
+
+
+def schedule_daily_rollup(delay=None):
+    """Enqueue the next rollup job unless one is already pending."""
+    pending = BackgroundJob.query.filter(
+        BackgroundJob.job_type == ROLLUP_JOB,
+        BackgroundJob.status.in_(('pending', 'running'))
+    ).first()
+    if pending is not None:
+        return pending
+    job = enqueue(ROLLUP_JOB, {}, delay=_seconds_until_next_run() if delay is None else delay)
+    db.session.commit()
+    return job
+
+
+@register_job(ROLLUP_JOB)
+def institutional_rollup_job(payload):
+    results = run_rollups()
+    # Queue tomorrow's run; the current job is still 'running' so add it directly
+    enqueue(ROLLUP_JOB, {}, delay=_seconds_until_next_run())
+    return {'rows_written': sum(results.values())}
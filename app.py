@@ -72,18 +72,31 @@ from flask_wtf.csrf import CSRFProtect, CSRFError
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from flask_caching import Cache
 from flask_assets import Environment, Bundle
 # Import blueprints from routes package
 from routes import all_blueprints
 
 import ai.service as ai_service
+from ai.executor import offload, iter_offloaded
+from severity import heuristic_severity
 from extensions import db, migrate, flask_session, compress, csrf
 from models import User, Assessment, DigitalDetoxLog, RPMData, Gamification, ClinicalNote, InstitutionalAnalytics, Appointment, Goal, Medication, MedicationLog, BreathingExerciseLog, YogaLog, MusicTherapyLog, ProgressRecommendation, get_user_wellness_trend, get_institutional_summary, Notification
 from models import BlogPost, BlogComment, BlogLike, BlogInsight, Prescription, MoodLog  # Ensure BlogPost and related models are imported
 
-# Import shared data storage instead of defining locally to avoid circular imports
-from shared_data import patient_journal_entries, patient_voice_logs_data
+import job_queue
+from enrichment_jobs import enqueue_detox_insights, enqueue_voice_analysis, enqueue_voice_features
+import emotion_classifier
+import voice_analysis
+import voice_stream
+from analytics_rollup import schedule_daily_rollup
+from audio_catalog import get_catalog, MOOD_MUSIC_QUERIES
+from timeseries import assessment_series, summary_series
+from leaderboard import leaderboards
+from media import send_media, track_version
+import binaural_synth
+from view_counter import view_counter
+from route_cache import cached_json
+from routes.blog import load_blog_page
 
 # File upload configuration
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'wav', 'mp3', 'ogg'}
@@ -95,14 +108,10 @@ ALLOWED_MIME_TYPES = {
 # Import new dependencies for patient features
 try:
     from textblob import TextBlob
-    import librosa
-    import numpy as np
     TEXTBLOB_AVAILABLE = True
-    LIBROSA_AVAILABLE = True
 except ImportError as e:
     logger.warning(f"Some patient feature dependencies not available: {e}")
     TEXTBLOB_AVAILABLE = False
-    LIBROSA_AVAILABLE = False
 
 # Database configuration
 app = Flask(__name__)
@@ -165,9 +174,6 @@ def exempt_health_checks():
     """Exempt health check endpoints from rate limiting"""
     return request.endpoint in ['static', 'health_check']
 
-# Initialize caching
-cache = Cache(app, config={'CACHE_TYPE': 'simple'})
-
 # Configure session BEFORE initializing extensions
 app.secret_key = os.getenv('SECRET_KEY', 'supersecretkey')  # Use environment variable or fallback
 app.config['SESSION_TYPE'] = 'filesystem'
@@ -191,7 +197,7 @@ from extensions import init_extensions
 init_extensions(app)
 
 from models import *
-from utils.database_utils import check_database, init_db
+from utils.database_utils import check_database, init_db, ensure_schema
 
 # Check database connection at startup
 with app.app_context():
@@ -201,6 +207,19 @@ with app.app_context():
             app.logger.info("Database initialized successfully")
         else:
             app.logger.error("Failed to initialize database. Some features may not work correctly.")
+    if ensure_schema():
+        sync_institution_tokens()
+        sync_activity_stats()
+        try:
+            app.logger.info(f"Leaderboards built for {leaderboards.load()} users")
+        except Exception as e:
+            app.logger.warning(f"Leaderboards not built at startup: {e}")
+
+# Parse the local audio dataset once; the catalog rebuilds itself when files change
+try:
+    get_catalog()
+except Exception as e:
+    app.logger.warning(f"Audio track catalog not built at startup: {e}")
 
 # Enable CSRF protection for security
 csrf.init_app(app)
@@ -235,6 +254,14 @@ def generate_csp_nonce():
     # 18 random bytes -> base64 ascii nonce
     g.csp_nonce = base64.b64encode(os.urandom(18)).decode('ascii')
 
+@app.before_request
+def start_background_jobs():
+    # Started lazily so workers run in the serving process, not the --preload master
+    if job_queue.start_workers(app, socketio):
+        # Catch up on any missed daily analytics rollups, then run nightly
+        schedule_daily_rollup(delay=0)
+    view_counter.start(app, socketio)
+
 
 
 # Add enhanced security headers for modern web security
@@ -465,45 +492,13 @@ def wellness_report(user_id):
     
     recent_sessions = ClinicalNote.query.filter_by(patient_id=user_id).order_by(ClinicalNote.session_date.desc()).limit(10).all()
 
-    # Fetch RPM data for mood charting using list comprehensions
-    rpm_logs = RPMData.query.filter_by(user_id=user_id).order_by(RPMData.date.asc()).limit(90).all()
-    mood_chart_labels = [log.date.strftime('%Y-%m-%d') for log in rpm_logs]
-    mood_chart_data = [log.mood_score if log.mood_score else 0 for log in rpm_logs]
-
-    # Fetch assessments for mental health charting with improved data processing
-    mental_health_assessments = Assessment.query.filter_by(user_id=user_id).order_by(Assessment.created_at.asc()).all()
-
-    # Initialize data structures
-    mh_chart_labels = []
-    gad7_data = []
-    phq9_data = []
-
-    # Process assessments using modern Python patterns
-    for assessment in mental_health_assessments:
-        date_str = assessment.created_at.strftime('%Y-%m-%d')
-
-        # Check if date already exists in labels
-        if date_str not in mh_chart_labels:
-            mh_chart_labels.append(date_str)
-            gad7_data.append(None)  # Initialize with None
-            phq9_data.append(None)  # Initialize with None
-
-        # Update the appropriate data array
-        idx = mh_chart_labels.index(date_str)
-        if assessment.assessment_type == 'GAD-7':
-            gad7_data[idx] = assessment.score
-        elif assessment.assessment_type == 'PHQ-9':
-            phq9_data[idx] = assessment.score
-
-    # Filter out dates where both GAD-7 and PHQ-9 are None using list comprehensions
-    filtered_indices = [
-        i for i, (gad, phq) in enumerate(zip(gad7_data, phq9_data))
-        if gad is not None or phq is not None
-    ]
+    # Daily mean RPM mood over the last 90 days, bounded to CHART_MAX_POINTS
+    mood_chart = summary_series('rpm_mood', user_id, days=90)
+    mood_chart_labels = mood_chart['labels']
+    mood_chart_data = mood_chart['mean']
 
-    filtered_mh_chart_labels = [mh_chart_labels[i] for i in filtered_indices]
-    filtered_gad7_data = [gad7_data[i] for i in filtered_indices]
-    filtered_phq9_data = [phq9_data[i] for i in filtered_indices]
+    # Last GAD-7 / PHQ-9 score of each day that has one, bucketed in SQL
+    mh_chart = assessment_series(user_id)
 
     # Prepare patient data for AI goal suggestions
     patient_data_for_ai = {
@@ -540,9 +535,9 @@ def wellness_report(user_id):
                          recent_sessions=recent_sessions,
                          mood_chart_labels=mood_chart_labels,
                          mood_chart_data=mood_chart_data,
-                         mh_chart_labels=filtered_mh_chart_labels,
-                         gad7_data=filtered_gad7_data,
-                         phq9_data=filtered_phq9_data,
+                         mh_chart_labels=mh_chart.labels,
+                         gad7_data=mh_chart.series['GAD-7'],
+                         phq9_data=mh_chart.series['PHQ-9'],
                          ai_goal_suggestions=ai_goal_suggestions,
                          ai_medication_adherence_insights=ai_medication_adherence_insights,
                          datetime=datetime)
@@ -700,50 +695,27 @@ def log_digital_detox():
                 'message': 'Social interactions must be a string or null'
             }), 400
 
-        # Get historical data for better AI analysis with error handling
-        try:
-            historical_data = DigitalDetoxLog.query.filter_by(user_id=user_id).order_by(DigitalDetoxLog.date.asc()).limit(30).all()
-            history_for_ai = [
-                {'screen_time_hours': log.screen_time_hours, 'academic_score': log.academic_score}
-                for log in historical_data
-            ]
-        except Exception as e:
-            logger.warning(f"Failed to fetch historical data for user {user_id}: {e}")
-            history_for_ai = []
-
-        # Call AI service for digital detox insights with error handling
-        detox_data = {
-            'screen_time': screen_time,
-            'academic_score': academic_score,
-            'social_interactions': social_interactions
-        }
-
-        try:
-            ai_analysis = ai_service.generate_digital_detox_insights(detox_data)
-        except Exception as e:
-            logger.error(f"AI service error for user {user_id}: {e}")
-            ai_analysis = {'ai_score': 'N/A', 'ai_suggestion': 'Service temporarily unavailable'}
-
-        # Create new log entry with validation
+        # Create new log entry with validation; AI fields are filled in by a background job
         try:
             new_log = DigitalDetoxLog(
                 user_id=user_id,
                 date=date.today(),
                 screen_time_hours=screen_time,
                 academic_score=academic_score,
-                social_interactions=social_interactions,
-                ai_score=ai_analysis.get('ai_score', 'N/A'),
-                ai_suggestion=ai_analysis.get('ai_suggestion', 'No suggestion available')
+                social_interactions=social_interactions
             )
 
             db.session.add(new_log)
-            db.session.commit()
-
-            # Award points for logging with error handling
+            db.session.flush()
+            enqueue_detox_insights(new_log)
+            # Award points for logging, committed together with the log; a
+            # failed award only rolls back its savepoint, never the log
             try:
-                award_points(user_id, 15, 'digital_detox_log')
+                with db.session.begin_nested():
+                    award_points(user_id, 15, 'digital_detox_log')
             except Exception as e:
                 logger.warning(f"Failed to award points for user {user_id}: {e}")
+            db.session.commit()
 
             return jsonify({
                 'success': True,
@@ -755,7 +727,7 @@ def log_digital_detox():
                     'social_interactions': new_log.social_interactions,
                     'ai_score': new_log.ai_score
                 },
-                'ai_analysis': ai_analysis
+                'ai_pending': True
             })
 
         except Exception as e:
@@ -782,21 +754,12 @@ def log_digital_detox():
 
 
 @app.route('/api/mood-music', methods=['GET'])
+@cached_json('mood_music', tags=('binaural_tracks',), vary=lambda: [get_catalog().signature])
 def api_mood_music():
     """Return a curated mapping of moods to YouTube search queries (and optional curated video IDs).
 
     The frontend can fetch this and either open a search page or use curated video IDs to embed a player.
     """
-    # Default static mapping (fallback)
-    mood_map = {
-        'happy': {'query': 'binaural beats happy uplifting 528hz', 'videos': []},
-        'sad': {'query': 'binaural beats sad calming 432hz', 'videos': []},
-        'angry': {'query': 'binaural beats anger release calming bass', 'videos': []},
-        'calm': {'query': 'binaural beats calm relaxation 432hz mindfulness', 'videos': []},
-        'anxious': {'query': 'binaural beats anxiety relief slow tempo 432hz', 'videos': []},
-        'focus': {'query': 'binaural beats focus concentration alpha waves 432hz', 'videos': []}
-    }
-
     # Prefer DB-backed tracks if the optional `binaural_tracks` table has entries.
     try:
         from models import BinauralTrack
@@ -832,7 +795,7 @@ def api_mood_music():
 
             # Convert to response shape using dictionary comprehensions
             resp_map = {
-                k: {'query': mood_map[k]['query'], 'videos': []}
+                k: {'query': MOOD_MUSIC_QUERIES[k], 'videos': []}
                 for k in mapping.keys()
             }
 
@@ -860,106 +823,9 @@ def api_mood_music():
             logger.debug(f"Failed to build mood map from DB tracks: {e}")
             # fall through to file-based parsing/fallback
 
-    # Attempt to enrich mapping from a local copy of the binaural-beats dataset
-    # Expected location: ./data/binaural-beats-dataset/ (user can git clone the repo there)
-    dataset_dir = os.path.join(basedir, 'data', 'binaural-beats-dataset')
-    try:
-        if os.path.isdir(dataset_dir):
-            # Try common filenames in the dataset
-            possible_files = ['tracks.csv', 'dataset.csv', 'tracks.json', 'data.json']
-            found = None
-            for fn in possible_files:
-                path = os.path.join(dataset_dir, fn)
-                if os.path.isfile(path):
-                    found = path
-                    break
-
-            if found:
-                # Prefer CSV, otherwise JSON
-                if found.lower().endswith('.csv'):
-                    import csv
-                    with open(found, 'r', encoding='utf-8') as fh:
-                        reader = csv.DictReader(fh)
-                        for row in reader:
-                            # Dataset may have columns like: title, artist, emotion, youtube_id, tags
-                            emotion = (row.get('emotion') or row.get('mood') or '').strip().lower()
-                            youtube_id = (row.get('youtube_id') or row.get('video_id') or row.get('youtube') or '').strip()
-                            title = (row.get('title') or row.get('name') or '').strip()
-                            if not emotion:
-                                continue
-
-                            # Map dataset emotion labels to our mood keys
-                            mapping = {
-                                'happy': ['happy', 'uplifting', 'joy', 'positive'],
-                                'sad': ['sad', 'melancholy', 'blue'],
-                                'angry': ['angry', 'anger', 'irritated'],
-                                'calm': ['calm', 'relaxed', 'relaxation', 'peaceful'],
-                                'anxious': ['anxious', 'anxiety', 'tense'],
-                                'focus': ['focus', 'concentration', 'study', 'attention']
-                            }
-
-                            for mood_key, labels in mapping.items():
-                                if any(label in emotion for label in labels):
-                                    if youtube_id:
-                                        mood_map[mood_key]['videos'].append({'id': youtube_id, 'title': title})
-                                    else:
-                                        # If no direct video id, append title to query suggestions
-                                        mood_map[mood_key]['query'] = mood_map[mood_key]['query'] + ' ' + title
-                                    break
-
-                else:
-                    # JSON file
-                    import json
-                    with open(found, 'r', encoding='utf-8') as fh:
-                        data = json.load(fh)
-                        # Expect list of tracks
-                        items = data if isinstance(data, list) else data.get('tracks') or data.get('data') or []
-                        for item in items:
-                            emotion = (item.get('emotion') or item.get('mood') or '')
-                            if emotion:
-                                emotion = emotion.strip().lower()
-                            youtube_id = (item.get('youtube_id') or item.get('video_id') or item.get('youtube') or '')
-                            title = (item.get('title') or item.get('name') or '')
-                            if not emotion:
-                                continue
-
-                            mapping = {
-                                'happy': ['happy', 'uplifting', 'joy', 'positive'],
-                                'sad': ['sad', 'melancholy', 'blue'],
-                                'angry': ['angry', 'anger', 'irritated'],
-                                'calm': ['calm', 'relaxed', 'relaxation', 'peaceful'],
-                                'anxious': ['anxious', 'anxiety', 'tense'],
-                                'focus': ['focus', 'concentration', 'study', 'attention']
-                            }
-
-                            for mood_key, labels in mapping.items():
-                                if any(label in emotion for label in labels):
-                                    if youtube_id:
-                                        mood_map[mood_key]['videos'].append({'id': youtube_id, 'title': title})
-                                    else:
-                                        mood_map[mood_key]['query'] = mood_map[mood_key]['query'] + ' ' + title
-                                    break
-
-    except Exception as e:
-        # Fail gracefully — keep default mapping and log
-        logger.debug(f"Failed to load local binaural-beats dataset: {e}")
-
-    # Deduplicate video lists by id
-    for k, v in mood_map.items():
-        vids = v.get('videos') or []
-        seen = set()
-        deduped = []
-        for it in vids:
-            vid = it.get('id')
-            if not vid:
-                continue
-            if vid in seen:
-                continue
-            seen.add(vid)
-            deduped.append(it)
-        mood_map[k]['videos'] = deduped
-
-    return jsonify({'success': True, 'moods': mood_map})
+    # Default mapping enriched from a local copy of the binaural-beats dataset
+    # (./data/binaural-beats-dataset/), parsed once by the track catalog
+    return jsonify({'success': True, 'moods': get_catalog().mood_music_map()})
 
 
 @app.route('/api/play-mood', methods=['POST'])
@@ -981,25 +847,22 @@ def api_play_mood():
         return jsonify({'success': False, 'message': 'Missing mood parameter'}), 400
 
     # 1) local audio folder
-    audio_dir = os.path.join(basedir, 'data', 'binaural-beats-dataset', 'audio')
     try:
-        if os.path.isdir(audio_dir):
-            # look for files containing the mood in filename
-            for fn in os.listdir(audio_dir):
-                if mood in fn.lower() and fn.lower().endswith(('.mp3', '.wav', '.m4a', '.flac')):
-                    path = os.path.join(audio_dir, fn)
-                    try:
-                        # On Windows, this opens the default program for the file
-                        if os.name == 'nt':
-                            os.startfile(path)
-                            return jsonify({'success': True, 'action': 'local', 'path': path})
-                        else:
-                            # Non-blocking attempt for other OSes
-                            import subprocess
-                            subprocess.Popen(['xdg-open' if os.name == 'posix' else 'open', path])
-                            return jsonify({'success': True, 'action': 'local', 'path': path})
-                    except Exception as e:
-                        logger.debug(f"Failed to open local audio file {path}: {e}")
+        track = get_catalog().find_local(mood)
+        if track is not None:
+            path = get_catalog().path(track)
+            try:
+                # On Windows, this opens the default program for the file
+                if os.name == 'nt':
+                    os.startfile(path)
+                    return jsonify({'success': True, 'action': 'local', 'path': path})
+                else:
+                    # Non-blocking attempt for other OSes
+                    import subprocess
+                    subprocess.Popen(['xdg-open' if os.name == 'posix' else 'open', path])
+                    return jsonify({'success': True, 'action': 'local', 'path': path})
+            except Exception as e:
+                logger.debug(f"Failed to open local audio file {path}: {e}")
 
     except Exception as e:
         logger.debug(f"Error while searching for local audio files: {e}")
@@ -1026,9 +889,8 @@ def serve_audio(filename):
     """Serve audio files from data/binaural-beats-dataset for in-browser playback.
 
     Supports both 'audio/' and 'tracks/' subdirectories found in common datasets.
-
-    NOTE: This route is intentionally simple. If you deploy publicly, consider adding
-    authentication and range requests for large files.
+    Byte ranges, ETags and cache headers are handled by media.send_media; `v`
+    is the content version from /api/mood-audio URLs.
     """
     base_dir = os.path.join(basedir, 'data', 'binaural-beats-dataset')
     if not os.path.isdir(base_dir):
@@ -1045,17 +907,60 @@ def serve_audio(filename):
         # Ensure full_path is inside base_dir
         if not full_path.startswith(os.path.normpath(base_dir)):
             return jsonify({'success': False, 'message': 'Invalid path'}), 400
-        # Serve via send_from_directory using base_dir and the relative safe path
-        return send_from_directory(base_dir, safe_filename)
-    except Exception:
+        if not os.path.isfile(full_path):
+            return jsonify({'success': False, 'message': 'File not found'}), 404
+        return send_media(full_path, safe_filename, request.args.get('v'))
+    except OSError:
         return jsonify({'success': False, 'message': 'File not found'}), 404
 
 
+def _synth_spec(track_type):
+    return binaural_synth.make_spec(
+        track_type, request.args.get('carrier'), request.args.get('beat'),
+        request.args.get('duration'), request.args.get('solfeggio')
+    )
+
+
+def _synth_starts_no_render():
+    """True when a /synth request is invalid or already rendered, so it costs no synthesis."""
+    try:
+        return binaural_synth.is_rendered(_synth_spec(request.view_args['track_type']))
+    except ValueError:
+        return True
+
+
+@app.route('/synth/<track_type>.wav')
+@limiter.limit("120 per minute")  # Range requests while seeking
+@limiter.limit("20 per hour", exempt_when=_synth_starts_no_render)  # Limit new renders
+def synth_audio(track_type):
+    """Synthesized binaural, isochronic or solfeggio-layered track as WAV.
+
+    Query: carrier (Hz, default 200), beat (Hz), duration (s, default 600),
+    solfeggio (Hz, solfeggio tracks only). Streamed while it renders the first
+    time, then served from the render cache (see binaural_synth). Anonymous
+    clients may only request the catalog presets.
+    """
+    try:
+        spec = _synth_spec(track_type)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    if spec not in binaural_synth.SYNTH_PRESETS and 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Authentication required'}), 401
+    try:
+        return binaural_synth.send_render(spec, request.args.get('v'))
+    except binaural_synth.RendererBusy:
+        response = jsonify({'success': False, 'message': 'Too many tracks are being synthesized. Please try again shortly.'})
+        response.headers['Retry-After'] = '10'
+        return response, 503
+
+
 @app.route('/api/mood-audio', methods=['POST'])
+@cached_json('mood_audio', vary=lambda: [get_catalog().signature])
 def api_mood_audio():
     """Return a list of audio URLs for the requested mood, using local audio files only.
 
-    Searches common subdirectories in the dataset ('audio/', 'tracks/').
+    Searches common subdirectories in the dataset ('audio/', 'tracks/') and the
+    synthesized presets ('/synth/..' URLs).
     Supports additional filtering by frequency range, type, and sorting.
 
     Response: { success: True, files: [ { url: '/audio/..', filename: '...' }, ... ] }
@@ -1071,216 +976,33 @@ def api_mood_audio():
         return jsonify({'success': False, 'message': 'Missing mood parameter'}), 400
 
     base_dir = os.path.join(basedir, 'data', 'binaural-beats-dataset')
-    if not os.path.isdir(base_dir):
-        return jsonify({'success': False, 'files': []})
 
-    subdirs = ['audio', 'tracks']
-
-    # Enhanced mood mapping with more comprehensive keywords and frequency ranges
-    mood_keywords = {
-        'calm': {
-            'keywords': ['delta', 'theta', 'calm', 'relax', 'peace', 'meditat', 'sleep', 'rest'],
-            'brainwaves': ['delta', 'theta'],
-            'freq_range': (0.5, 8.0),  # Delta: 0.5-4 Hz, Theta: 4-8 Hz
-            'priority_freq': [2.0, 4.0, 6.0]
-        },
-        'focus': {
-            'keywords': ['alpha', 'beta', 'focus', 'concentr', 'study', 'work', 'attent', 'alert'],
-            'brainwaves': ['alpha', 'beta'],
-            'freq_range': (8.0, 30.0),  # Alpha: 8-12 Hz, Beta: 12-30 Hz
-            'priority_freq': [10.0, 12.0, 15.0, 20.0]
-        },
-        'anxious': {
-            'keywords': ['theta', 'delta', 'anxiety', 'stress', 'tension', 'worry', 'calm', 'sooth'],
-            'brainwaves': ['theta', 'delta'],
-            'freq_range': (0.5, 8.0),
-            'priority_freq': [4.0, 6.0, 8.0]
-        },
-        'happy': {
-            'keywords': ['alpha', 'gamma', 'happy', 'joy', 'uplift', 'positive', 'energiz', 'boost'],
-            'brainwaves': ['alpha', 'gamma'],
-            'freq_range': (8.0, 100.0),  # Alpha: 8-12 Hz, Gamma: 30+ Hz
-            'priority_freq': [10.0, 40.0, 60.0]
-        },
-        'sad': {
-            'keywords': ['theta', 'delta', 'sad', 'melanchol', 'blue', 'depress', 'comfort', 'heal'],
-            'brainwaves': ['theta', 'delta'],
-            'freq_range': (0.5, 8.0),
-            'priority_freq': [4.0, 6.0]
-        },
-        'angry': {
-            'keywords': ['delta', 'theta', 'anger', 'rage', 'frustrat', 'calm', 'cool', 'release'],
-            'brainwaves': ['delta', 'theta'],
-            'freq_range': (0.5, 8.0),
-            'priority_freq': [2.0, 4.0, 6.0]
-        }
-    }
-    
-    mood_config = mood_keywords.get(mood, {
-        'keywords': [mood],
-        'brainwaves': [],
-        'freq_range': (0.0, 1000.0),
-        'priority_freq': []
-    })
-    keywords = mood_config['keywords']
-
-    def parse_track_info(filename):
-        # Example names:
-        # Alpha_12_Hz.mp3
-        # Alpha_10_Hz_Isochronic_Pulses.mp3
-        # Alpha_12_Hz_Solfeggio_396_Hz.mp3
-        try:
-            base = os.path.splitext(filename)[0]
-            parts = base.split('_')
-            info = {
-                'brainwave': None,
-                'frequency': None,
-                'type': 'pure',  # pure|isochronic|solfeggio
-                'solfeggio_frequency': None,
-                'label': filename,
-                'length_hint': 'short'  # long for solfeggio (15m), others are usually short
-            }
-            if parts:
-                bw = parts[0].lower()
-                if bw in ('alpha','beta','delta','gamma','theta'):
-                    info['brainwave'] = bw
-            # Find main Hz
-            for i, p in enumerate(parts):
-                if p.lower() == 'hz' and i > 0:
-                    try:
-                        info['frequency'] = float(parts[i-1])
-                    except Exception:
-                        pass
-            name_l = filename.lower()
-            if 'isochronic_pulses' in name_l:
-                info['type'] = 'isochronic'
-            if 'solfeggio' in name_l:
-                info['type'] = 'solfeggio'
-                info['length_hint'] = 'long'
-                # Extract solfeggio frequency
-                try:
-                    # ..._Solfeggio_396_Hz
-                    idx = parts.index('Solfeggio') if 'Solfeggio' in parts else parts.index('Solfeggio'.lower())
-                except Exception:
-                    idx = -1
-                if idx != -1 and idx + 2 < len(parts) and parts[idx+2].lower() == 'Hz'.lower():
-                    try:
-                        info['solfeggio_frequency'] = float(parts[idx+1])
-                    except Exception:
-                        pass
-            # Build label
-            bw_label = (info['brainwave'] or '').capitalize()
-            freq_label = f"{int(info['frequency']) if info['frequency'] and info['frequency'].is_integer() else info['frequency']} Hz" if info['frequency'] else ''
-            suffix = ''
-            if info['type'] == 'isochronic':
-                suffix = ' (Isochronic)'
-            elif info['type'] == 'solfeggio':
-                sf = f" {int(info['solfeggio_frequency']) if info['solfeggio_frequency'] and float(info['solfeggio_frequency']).is_integer() else info['solfeggio_frequency']} Hz" if info['solfeggio_frequency'] else ''
-                suffix = f" (Solfeggio{sf})"
-            pretty = ' '.join([s for s in [bw_label, freq_label] if s]).strip() + suffix
-            info['label'] = pretty or filename
-            return info
-        except Exception:
-            return {
-                'brainwave': None,
-                'frequency': None,
-                'type': 'pure',
-                'solfeggio_frequency': None,
-                'label': filename,
-                'length_hint': 'short'
-            }
+    try:
+        min_freq = float(min_freq) if min_freq is not None else None
+        max_freq = float(max_freq) if max_freq is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid frequency range'}), 400
 
+    # Matching, scoring and sorting are precomputed per mood by the track catalog
     matches = []
-    for sub in subdirs:
-        d = os.path.join(base_dir, sub)
-        if not os.path.isdir(d):
-            continue
-        try:
-            for fn in os.listdir(d):
-                name_l = fn.lower()
-                if not name_l.endswith(('.mp3', '.wav', '.m4a', '.flac')):
-                    continue
-                # Enhanced matching logic
-                meta = parse_track_info(fn)
-                should_include = False
-                
-                # Check keyword matching
-                if any(kw in name_l for kw in keywords):
-                    should_include = True
-                
-                # Check brainwave matching
-                if meta['brainwave'] and meta['brainwave'].lower() in mood_config['brainwaves']:
-                    should_include = True
-                
-                # Check frequency range matching
-                if meta['frequency'] and mood_config['freq_range']:
-                    freq = meta['frequency']
-                    min_range, max_range = mood_config['freq_range']
-                    if min_range <= freq <= max_range:
-                        should_include = True
-                
-                if should_include:
-                    # Apply additional filters
-                    if min_freq is not None and meta['frequency'] and meta['frequency'] < min_freq:
-                        continue
-                    if max_freq is not None and meta['frequency'] and meta['frequency'] > max_freq:
-                        continue
-                    if filter_type and filter_type != 'all' and meta['type'] != filter_type:
-                        continue
-                        
-                    rel = f"{sub}/{fn}"
-                    # Ensure URL uses forward slashes
-                    rel_url = rel.replace('\\', '/').replace('\\', '/')
-                    
-                    # Calculate relevance score for sorting
-                    relevance_score = 0
-                    if meta['brainwave'] and meta['brainwave'].lower() in mood_config['brainwaves']:
-                        relevance_score += 10
-                    if meta['frequency'] and meta['frequency'] in mood_config['priority_freq']:
-                        relevance_score += 5
-                    if any(kw in name_l for kw in keywords[:3]):  # Prioritize first 3 keywords
-                        relevance_score += 3
-                        
-                    matches.append({
-                        'url': url_for('serve_audio', filename=rel_url),
-                        'filename': fn,
-                        'label': meta['label'],
-                        'length_hint': meta['length_hint'],
-                        'type': meta['type'],
-                        'brainwave': meta['brainwave'],
-                        'frequency': meta['frequency'],
-                        'solfeggio_frequency': meta['solfeggio_frequency'],
-                        'relevance_score': relevance_score
-                    })
-        except Exception as e:
-            logger.debug(f"Failed to scan directory {d}: {e}")
-
-    # Enhanced sorting logic
-    def get_sort_key(item, sort_method):
-        if sort_method == 'relevance':
-            return (-item.get('relevance_score', 0), item.get('label', 'zzz'))
-        elif sort_method == 'frequency_asc':
-            return (item.get('frequency') or 1e9, item.get('label', 'zzz'))
-        elif sort_method == 'frequency_desc':
-            return (-(item.get('frequency') or 0), item.get('label', 'zzz'))
-        elif sort_method == 'duration':
-            # Solfeggio tracks are typically longer
-            length_priority = {'solfeggio': 0, 'isochronic': 1, 'pure': 2}
-            return (length_priority.get(item.get('type', 'pure'), 2), item.get('label', 'zzz'))
-        elif sort_method == 'brainwave':
-            brainwave_order = {'delta': 0, 'theta': 1, 'alpha': 2, 'beta': 3, 'gamma': 4}
-            return (brainwave_order.get(item.get('brainwave', 'unknown'), 5), item.get('frequency', 0))
-        else:  # default
-            # Default: relevance first, then type, then brainwave, then frequency
-            type_rank = {'solfeggio': 0, 'isochronic': 1, 'pure': 2}
-            return (
-                -item.get('relevance_score', 0),
-                type_rank.get(item.get('type') or 'pure', 2),
-                item.get('brainwave') or 'zzzz',
-                item.get('frequency') or 1e9
-            )
-    
-    matches.sort(key=lambda x: get_sort_key(x, sort_by))
+    catalog = get_catalog(base_dir)
+    for track, relevance_score in catalog.search(mood, min_freq, max_freq, filter_type, sort_by):
+        if track.subdir == binaural_synth.SYNTH_SUBDIR:
+            url = binaural_synth.track_url(binaural_synth.PRESETS_BY_FILENAME[track.filename])
+        else:
+            # `v` makes the URL change with the content, so it can be cached as immutable
+            url = url_for('serve_audio', filename=f"{track.subdir}/{track.filename}", v=track_version(catalog.path(track)))
+        matches.append({
+            'url': url,
+            'filename': track.filename,
+            'label': track.label,
+            'length_hint': track.length_hint,
+            'type': track.type,
+            'brainwave': track.brainwave,
+            'frequency': track.frequency,
+            'solfeggio_frequency': track.solfeggio_frequency,
+            'relevance_score': relevance_score
+        })
 
     return jsonify({'success': True, 'files': matches})
 
@@ -1549,27 +1271,6 @@ def save_mood():
         else:
             rpm_data.mood_score = mood
         
-        # Update gamification points
-        gamification = Gamification.query.filter_by(user_id=user_id).first()
-        if not gamification:
-            gamification = Gamification(user_id=user_id, points=0, streak=0)
-            db.session.add(gamification)
-            
-        # Add points for mood check-in
-        gamification.points += 10
-        
-        # Check for streak
-        if gamification.last_activity:
-            last_activity = gamification.last_activity.date() if hasattr(gamification.last_activity, 'date') else gamification.last_activity
-            if last_activity == today - timedelta(days=1):
-                gamification.streak += 1
-            elif last_activity < today - timedelta(days=1):
-                gamification.streak = 1
-        else:
-            gamification.streak = 1
-        
-        gamification.last_activity = today
-
         # Update user's last assessment time
         user = db.session.get(User, user_id)
         if not user:
@@ -1579,6 +1280,9 @@ def save_mood():
             }), 400
 
         user.last_assessment_at = datetime.utcnow()
+
+        # Add points for mood check-in; awarded last so the row lock is held briefly
+        gamification = award_points(user_id, 10, 'mood_checkin', today=today)
         
         db.session.commit()
         
@@ -1601,31 +1305,20 @@ def save_mood():
 
 @app.route('/blog')
 def blog_list():
+    before = request.args.get('before')
     try:
-        posts = BlogPost.query.filter_by(is_published=True).order_by(BlogPost.created_at.desc()).all()
-        # Get blog insights for display
-        insights = {
-            'total_posts': BlogPost.query.count(),
-            'total_likes': 0,
-            'total_comments': 0,
-            'total_views': sum([post.views for post in posts]) if posts else 0,
-            'most_popular_post': None
-        }
-        if posts:
-            insights['most_popular_post'] = max(posts, key=lambda p: p.views) if posts else None
+        page = load_blog_page(before)
     except SQLAlchemyError as e:
         logger.error(f"Error fetching blog posts: {e}")
-        posts = []
-        insights = None
-    return render_template('blog_list.html', posts=posts, insights=insights)
+        page = {'posts': [], 'next_cursor': None, 'insights': None}
+    return render_template('blog_list.html', before=before, **page)
 
 @app.route('/blog/<int:post_id>')
 def blog_detail(post_id):
     post = BlogPost.query.get_or_404(post_id)
     
-    # Increment view count
-    post.views += 1
-    db.session.commit()
+    # Count the view in memory; it is written by the periodic bulk flush
+    view_counter.hit(post_id)
     
     # Get comments for this post
     comments = BlogComment.query.filter_by(post_id=post_id).order_by(BlogComment.created_at.asc()).all()
@@ -1640,6 +1333,7 @@ def blog_detail(post_id):
     
     return render_template('blog_detail.html', 
                          post=post, 
+                         view_count=(post.views or 0) + view_counter.pending(post_id),
                          comments=comments, 
                          user_has_liked=user_has_liked)
 
@@ -1708,17 +1402,18 @@ def blog_like(post_id):
         if existing_like:
             # Unlike the post
             db.session.delete(existing_like)
+            BlogPost.bump_counters(post_id, likes=-1)
             liked = False
         else:
             # Like the post
             new_like = BlogLike(user_id=user_id, post_id=post_id)
             db.session.add(new_like)
+            BlogPost.bump_counters(post_id, likes=1)
             liked = True
         
         db.session.commit()
         
-        # Get updated like count
-        like_count = BlogLike.query.filter_by(post_id=post_id).count()
+        like_count = post.like_count
         
         return jsonify({
             'success': True,
@@ -1757,10 +1452,10 @@ def blog_comment(post_id):
             content=content
         )
         db.session.add(new_comment)
+        BlogPost.bump_counters(post_id, comments=1)
         db.session.commit()
         
-        # Get updated comment count
-        comment_count = BlogComment.query.filter_by(post_id=post_id).count()
+        comment_count = post.comment_count
         
         # Get user info for response
         user = User.query.get(user_id)
@@ -1779,6 +1474,7 @@ def blog_comment(post_id):
     except SQLAlchemyError as e:
         db.session.rollback()
         logger.error(f"Error adding comment to post {post_id}: {e}")
+        return jsonify({'success': False, 'message': 'Failed to add comment'}), 500
 
 
 # --- PATIENT JOURNAL ROUTES ---
@@ -1790,24 +1486,13 @@ def delete_journal_entry(entry_id):
     """Delete a specific journal entry."""
     user_id = session['user_id']
 
-    # Find the journal entry
-    if user_id not in patient_journal_entries:
-        return jsonify({'success': False, 'message': 'No journal entries found'}), 404
-
-    journal_entries = patient_journal_entries[user_id]
-    journal_entry = None
-
-    for entry in journal_entries:
-        if entry['id'] == entry_id:
-            journal_entry = entry
-            break
-
+    journal_entry = JournalEntry.query.filter_by(id=entry_id, user_id=user_id).first()
     if not journal_entry:
         return jsonify({'success': False, 'message': 'Journal entry not found'}), 404
 
     try:
-        # Remove the journal entry from the list
-        patient_journal_entries[user_id].remove(journal_entry)
+        db.session.delete(journal_entry)
+        db.session.commit()
 
         return jsonify({
             'success': True,
@@ -1815,6 +1500,7 @@ def delete_journal_entry(entry_id):
         })
 
     except Exception as e:
+        db.session.rollback()
         logger.error(f"Error deleting journal entry {entry_id}: {e}")
         return jsonify({'success': False, 'message': 'Failed to delete journal entry'}), 500
 
@@ -1827,30 +1513,20 @@ def delete_voice_log(voice_log_id):
     """Delete a specific voice log entry."""
     user_id = session['user_id']
 
-    # Find the voice log entry
-    if user_id not in patient_voice_logs_data:
-        return jsonify({'success': False, 'message': 'No voice logs found'}), 404
-
-    voice_logs = patient_voice_logs_data[user_id]
-    voice_log = None
-
-    for log in voice_logs:
-        if log['id'] == voice_log_id:
-            voice_log = log
-            break
-
+    voice_log = VoiceLog.query.filter_by(id=voice_log_id, user_id=user_id).first()
     if not voice_log:
         return jsonify({'success': False, 'message': 'Voice log not found'}), 404
 
     try:
-        # Remove the voice log from the list
-        patient_voice_logs_data[user_id].remove(voice_log)
+        file_path = voice_log.file_path
+        db.session.delete(voice_log)
+        db.session.commit()
 
         # Delete the audio file if it exists
         try:
-            if 'file_path' in voice_log and os.path.exists(voice_log['file_path']):
-                os.remove(voice_log['file_path'])
-                logger.info(f"Deleted audio file: {voice_log['file_path']}")
+            if file_path and os.path.exists(file_path):
+                os.remove(file_path)
+                logger.info(f"Deleted audio file: {file_path}")
         except Exception as file_error:
             logger.warning(f"Could not delete audio file: {file_error}")
 
@@ -1860,6 +1536,7 @@ def delete_voice_log(voice_log_id):
         })
 
     except Exception as e:
+        db.session.rollback()
         logger.error(f"Error deleting voice log {voice_log_id}: {e}")
         return jsonify({'success': False, 'message': 'Failed to delete voice log'}), 500
 
@@ -1883,6 +1560,11 @@ def upload_voice():
     if not audio_file.content_type.startswith('audio/'):
         return jsonify({'success': False, 'message': 'Invalid file type. Please upload an audio file.'}), 400
 
+    if voice_analysis.queue_full():
+        response = jsonify({'success': False, 'message': 'Voice analysis is busy. Please try again in a minute.'})
+        response.headers['Retry-After'] = '60'
+        return response, 503
+
     try:
         # Ensure uploads directory exists
         uploads_dir = app.config['UPLOAD_FOLDER']
@@ -1898,109 +1580,44 @@ def upload_voice():
         # Save the file
         audio_file.save(file_path)
 
-        # Process audio features if librosa is available
-        audio_features = {}
-        emotion_result = 'neutral'  # Default fallback
-
-        if LIBROSA_AVAILABLE:
-            try:
-                # Load audio file
-                y, sr = librosa.load(file_path, duration=120)  # Max 2 minutes
-
-                # Extract basic features
-                audio_features = {
-                    'duration': len(y) / sr,
-                    'sample_rate': sr
-                }
-
-                # Extract acoustic features
-                try:
-                    # Pitch (fundamental frequency)
-                    pitches, magnitudes = librosa.piptrack(y=y, sr=sr)
-                    pitch_values = pitches[pitches > 0]
-                    if len(pitch_values) > 0:
-                        audio_features['mean_pitch'] = float(np.mean(pitch_values))
-                        audio_features['pitch_std'] = float(np.std(pitch_values))
-
-                    # Energy (RMS)
-                    rms = librosa.feature.rms(y=y)
-                    audio_features['mean_energy'] = float(np.mean(rms))
-                    audio_features['energy_std'] = float(np.std(rms))
-
-                    # Zero-crossing rate (related to voice quality)
-                    zcr = librosa.feature.zero_crossing_rate(y)
-                    audio_features['mean_zcr'] = float(np.mean(zcr))
-                    audio_features['zcr_std'] = float(np.std(zcr))
-
-                    # Spectral features
-                    spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr)
-                    audio_features['mean_spectral_centroid'] = float(np.mean(spectral_centroid))
-                    audio_features['spectral_centroid_std'] = float(np.std(spectral_centroid))
-
-                except Exception as feature_error:
-                    logger.warning(f"Feature extraction error: {feature_error}")
-
-                # Simple emotion classification based on features
-                emotion_result = classify_emotion(audio_features)
-            except Exception as audio_error:
-                logger.warning(f"Audio processing error: {audio_error}")
-                emotion_result = 'neutral'
-
-        # Get AI-powered emotion analysis for voice
-        emotion_result = get_ai_voice_emotion_analysis(file_path, audio_features)
-
-        # Create voice log entry
-        voice_log = {
-            'id': str(uuid.uuid4()),
-            'filename': filename,
-            'file_path': file_path,
-            'audio_features': audio_features,
-            'emotion': emotion_result,
-            'ai_analysis': emotion_result,  # Store AI analysis result
-            'created_at': datetime.now()
-        }
-
-        # Initialize user's voice logs if not exists
-        if user_id not in patient_voice_logs_data:
-            patient_voice_logs_data[user_id] = []
-            
-        patient_voice_logs_data[user_id].append(voice_log)
+        # Create voice log entry; audio features, emotion and ai_analysis are
+        # filled in by background jobs
+        voice_log = VoiceLog(
+            user_id=user_id,
+            filename=filename,
+            file_path=file_path,
+            audio_features={}
+        )
+        db.session.add(voice_log)
+        db.session.flush()
 
         # Award points for voice logging
         award_points(user_id, 20, 'voice_log')
 
+        if voice_analysis.LIBROSA_AVAILABLE:
+            job = enqueue_voice_features(user_id, voice_log)
+        else:
+            voice_log.emotion = 'neutral'
+            job = enqueue_voice_analysis(user_id, voice_log)
+        db.session.commit()
+
         return jsonify({
             'success': True,
-            'message': 'Voice log uploaded and processed successfully!',
+            'message': 'Voice log uploaded; analysis in progress.',
+            'job_id': job.id,
+            'job_type': job.job_type,
             'voice_log': {
-                'id': voice_log['id'],
-                'emotion': voice_log['emotion'],
-                'audio_features': voice_log['audio_features']
-            }
-        })
+                'id': voice_log.id,
+                'emotion': voice_log.emotion,
+                'audio_features': voice_log.audio_features
+            },
+            'ai_pending': True
+        }), 202
 
     except Exception as e:
+        db.session.rollback()
         logger.error(f"Error uploading voice file: {e}")
-        zcr = audio_features.get('mean_zcr', 0)
-
-        # Higher pitch and energy might indicate excitement/happiness
-        if pitch > 200 and energy > 0.1:
-            return 'happy'
-        # Lower pitch and energy might indicate sadness
-        elif pitch < 150 and energy < 0.05:
-            return 'sad'
-        # Higher zero-crossing rate might indicate stress/agitation
-        elif zcr > 0.1:
-            return 'stressed'
-        # Medium pitch and energy might indicate calmness
-        elif 150 <= pitch <= 200 and 0.05 <= energy <= 0.1:
-            return 'calm'
-        else:
-            return 'neutral'
-
-    except Exception as e:
-        logger.warning(f"Emotion classification error: {e}")
-        return 'neutral'
+        return jsonify({'success': False, 'message': 'Failed to upload voice log'}), 500
 
 
 # Health check endpoint for monitoring
@@ -2015,16 +1632,31 @@ def health_check():
         db_status = f'unhealthy: {str(e)}'
 
     # Test AI services
+    ai_client_pool = None
+    ai_response_cache = None
     try:
         ai_check = ai_service.check_api_status()
         ai_status = 'available' if ai_check.get('model_available') else 'unavailable'
+        ai_client_pool = ai_check.get('client_pool')
+        ai_response_cache = ai_check.get('response_cache')
     except Exception as e:
         ai_status = f'error: {str(e)}'
 
+    # Public liveness only; per-status job counts are at /api/jobs/stats for providers
+    try:
+        job_queue.queue_stats()
+        background_jobs = True
+    except Exception:
+        background_jobs = False
+
     return jsonify({
         'status': 'healthy',
         'database': db_status,
+        'background_jobs': background_jobs,
+        'blog_views': view_counter.stats(),
         'ai_service': ai_status,
+        'ai_client_pool': ai_client_pool,
+        'ai_response_cache': ai_response_cache,
         'timestamp': datetime.now().isoformat()
     }), 200
 
@@ -2073,6 +1705,104 @@ def handle_disconnect():
         user_room = f'user_{session["user_id"]}'
         leave_room(user_room)
         logger.info(f"User {session['user_id']} disconnected from room {user_room}")
+    voice_stream.abort_stream(request.sid)
+
+# --- SocketIO Voice Log Streaming ---
+# The recorder streams PCM while recording; features are accumulated per chunk
+# (see voice_stream.py) and the voice log is stored as soon as the stream ends.
+@socketio.on('voice_stream_start')
+def handle_voice_stream_start(data):
+    if 'user_id' not in session or session.get('user_role') != 'patient':
+        return {'success': False, 'message': 'Authentication required'}
+    try:
+        sample_rate = int((data or {}).get('sample_rate', 0))
+    except (TypeError, ValueError):
+        sample_rate = 0
+    if not 8000 <= sample_rate <= 96000:
+        return {'success': False, 'message': 'Unsupported sample rate'}
+
+    user_id = session['user_id']
+    uploads_dir = app.config['UPLOAD_FOLDER']
+    os.makedirs(uploads_dir, exist_ok=True)
+    filename = secure_filename(f"{user_id}_{uuid.uuid4()}.wav")
+    try:
+        voice_stream.open_stream(request.sid, user_id, os.path.join(uploads_dir, filename), sample_rate)
+    except RuntimeError as e:
+        return {'success': False, 'message': str(e)}
+    return {'success': True}
+
+@socketio.on('voice_stream_chunk')
+def handle_voice_stream_chunk(data):
+    stream = voice_stream.get_stream(request.sid)
+    if stream is None:
+        return
+    try:
+        stream.add_chunk(int(data['seq']), data['pcm'])
+    except (KeyError, TypeError, ValueError) as e:
+        logger.warning(f"Dropping voice stream {stream.filename}: {e}")
+        voice_stream.abort_stream(request.sid)
+        emit('voice_stream_error', {'message': 'Recording upload failed'})
+
+@socketio.on('voice_stream_end')
+def handle_voice_stream_end(data):
+    stream = voice_stream.get_stream(request.sid)
+    if stream is None or stream.user_id != session.get('user_id'):
+        return {'success': False, 'message': 'No recording in progress'}
+
+    # Chunk handlers may still be running; give late chunks a moment. The
+    # stream stays registered meanwhile so they are still applied to it
+    try:
+        chunks = int((data or {}).get('chunks', 0))
+    except (TypeError, ValueError):
+        voice_stream.abort_stream(request.sid)
+        return {'success': False, 'message': 'Invalid chunk count'}
+    for _ in range(20):
+        if stream.received(chunks):
+            break
+        socketio.sleep(0.1)
+    else:
+        # Still missing chunks: never save a truncated recording as a normal log
+        logger.warning(f"Voice stream {stream.filename} ended with chunks missing")
+        voice_stream.abort_stream(request.sid)
+        return {'success': False, 'message': 'Recording was incomplete, please try again'}
+    if voice_stream.close_stream(request.sid, stream) is None:
+        return {'success': False, 'message': 'Recording was discarded'}
+
+    try:
+        features, emotion = stream.finish()
+        if not features.get('duration'):
+            stream.abort()
+            return {'success': False, 'message': 'Recording was empty'}
+        voice_log = VoiceLog(
+            user_id=stream.user_id,
+            filename=stream.filename,
+            file_path=stream.file_path,
+            audio_features=features
+        )
+        voice_log.set_emotion(emotion)
+        db.session.add(voice_log)
+        db.session.flush()
+        award_points(stream.user_id, 20, 'voice_log')
+        ai_pending = emotion_classifier.needs_llm(emotion.confidence)
+        if ai_pending:
+            enqueue_voice_analysis(stream.user_id, voice_log)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        stream.abort()
+        logger.error(f"Error saving streamed voice log for user {stream.user_id}: {e}")
+        return {'success': False, 'message': 'Failed to save voice log'}
+
+    return {
+        'success': True,
+        'voice_log': {
+            'id': voice_log.id,
+            'emotion': voice_log.emotion,
+            'emotion_confidence': voice_log.emotion_confidence,
+            'audio_features': voice_log.audio_features
+        },
+        'ai_pending': ai_pending
+    }
 
 # --- SocketIO Chat Handler ---
 @socketio.on('chat_message')
@@ -2093,14 +1823,28 @@ def handle_chat_message(data):
         emit('error', {'message': 'Message cannot be empty'})
         return
     
+    # Heuristic crisis check runs before any AI output reaches the client
+    is_crisis = heuristic_severity(user_message) >= 7
+    # Opt-in: only a client that listens for chat_response_chunk asks for chunks
+    stream = bool(data.get('stream', False))
+
     try:
-        ai_resp = ai_service.generate_chat_response(user_message)
-        if isinstance(ai_resp, dict):
-            reply_text = ai_resp.get('response') or ai_resp.get('reply') or str(ai_resp)
-            is_crisis = bool(ai_resp.get('needs_followup')) or bool(ai_resp.get('is_crisis'))
+        if stream:
+            # Emit chunks as they arrive so time-to-first-token is the visible latency;
+            # each step of the stream is offloaded so other sockets keep being served
+            reply_parts = []
+            for chunk in iter_offloaded(ai_service.generate_chat_response_stream(user_message)):
+                emit('chat_response_chunk', {'chunk': chunk, 'index': len(reply_parts), 'is_crisis': is_crisis})
+                reply_parts.append(chunk)
+            reply_text = ''.join(reply_parts)
         else:
-            reply_text = str(ai_resp)
-            is_crisis = False
+            # Offload the Gemini round-trip so other sockets keep being served
+            ai_resp = offload(ai_service.generate_chat_response, user_message)
+            if isinstance(ai_resp, dict):
+                reply_text = ai_resp.get('response') or ai_resp.get('reply') or str(ai_resp)
+                is_crisis = is_crisis or bool(ai_resp.get('needs_followup')) or bool(ai_resp.get('is_crisis'))
+            else:
+                reply_text = str(ai_resp)
         
         # Log the interaction for monitoring
         logger.info(f"Chat interaction - User: {session.get('user_email', 'unknown')}, Length: {len(user_message)}, Crisis: {is_crisis}")
@@ -2108,7 +1852,6 @@ def handle_chat_message(data):
     except Exception as e:
         logger.error(f"Chat handler error: {e}")
         reply_text = "I apologize, but I'm having trouble responding right now. Please try again in a moment."
-        is_crisis = False
     
     emit('chat_response', {'reply': reply_text, 'is_crisis': is_crisis})
 
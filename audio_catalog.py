@@ -0,0 +1,419 @@
+"""
+In-memory catalog of the local binaural-beats dataset.
+
+The dataset directory (data/binaural-beats-dataset) is scanned once, every
+audio filename is parsed into a compact `Track` record, and indexes by
+brainwave, type and frequency (sorted, for range queries) are built up front.
+The dataset's tracks.csv/data.json is parsed into the /api/mood-music map at
+the same time. The mood music endpoints then only do index lookups. The
+binaural_synth presets are listed alongside the files, under the `synth`
+subdirectory (SYNTH_LISTED=0 hides them).
+
+The catalog is rebuilt when the mtime of the dataset directory, one of its
+audio subdirectories or the metadata file changes; the check is a few stat()
+calls and runs at most every CATALOG_CHECK_INTERVAL seconds.
+"""
+import copy
+import csv
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+from binaural_synth import PRESETS_BY_FILENAME, SYNTH_SUBDIR
+
+logger = logging.getLogger(__name__)
+
+DATASET_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'data', 'binaural-beats-dataset')
+AUDIO_SUBDIRS = ('audio', 'tracks')
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.m4a', '.flac')
+METADATA_FILES = ('tracks.csv', 'dataset.csv', 'tracks.json', 'data.json')
+CATALOG_CHECK_INTERVAL = float(os.environ.get("CATALOG_CHECK_INTERVAL", "10"))
+SYNTH_LISTED = os.environ.get("SYNTH_LISTED", "1") != "0"
+
+BRAINWAVE_ORDER = {'delta': 0, 'theta': 1, 'alpha': 2, 'beta': 3, 'gamma': 4}
+TYPE_RANK = {'solfeggio': 0, 'isochronic': 1, 'pure': 2}
+SORT_METHODS = ('default', 'relevance', 'frequency_asc', 'frequency_desc', 'duration', 'brainwave')
+
+# Mood -> keywords, brainwaves and frequency ranges used by /api/mood-audio
+MOOD_KEYWORDS = {
+    'calm': {
+        'keywords': ['delta', 'theta', 'calm', 'relax', 'peace', 'meditat', 'sleep', 'rest'],
+        'brainwaves': ['delta', 'theta'],
+        'freq_range': (0.5, 8.0),  # Delta: 0.5-4 Hz, Theta: 4-8 Hz
+        'priority_freq': [2.0, 4.0, 6.0]
+    },
+    'focus': {
+        'keywords': ['alpha', 'beta', 'focus', 'concentr', 'study', 'work', 'attent', 'alert'],
+        'brainwaves': ['alpha', 'beta'],
+        'freq_range': (8.0, 30.0),  # Alpha: 8-12 Hz, Beta: 12-30 Hz
+        'priority_freq': [10.0, 12.0, 15.0, 20.0]
+    },
+    'anxious': {
+        'keywords': ['theta', 'delta', 'anxiety', 'stress', 'tension', 'worry', 'calm', 'sooth'],
+        'brainwaves': ['theta', 'delta'],
+        'freq_range': (0.5, 8.0),
+        'priority_freq': [4.0, 6.0, 8.0]
+    },
+    'happy': {
+        'keywords': ['alpha', 'gamma', 'happy', 'joy', 'uplift', 'positive', 'energiz', 'boost'],
+        'brainwaves': ['alpha', 'gamma'],
+        'freq_range': (8.0, 100.0),  # Alpha: 8-12 Hz, Gamma: 30+ Hz
+        'priority_freq': [10.0, 40.0, 60.0]
+    },
+    'sad': {
+        'keywords': ['theta', 'delta', 'sad', 'melanchol', 'blue', 'depress', 'comfort', 'heal'],
+        'brainwaves': ['theta', 'delta'],
+        'freq_range': (0.5, 8.0),
+        'priority_freq': [4.0, 6.0]
+    },
+    'angry': {
+        'keywords': ['delta', 'theta', 'anger', 'rage', 'frustrat', 'calm', 'cool', 'release'],
+        'brainwaves': ['delta', 'theta'],
+        'freq_range': (0.5, 8.0),
+        'priority_freq': [2.0, 4.0, 6.0]
+    }
+}
+
+# Default YouTube search queries for /api/mood-music
+MOOD_MUSIC_QUERIES = {
+    'happy': 'binaural beats happy uplifting 528hz',
+    'sad': 'binaural beats sad calming 432hz',
+    'angry': 'binaural beats anger release calming bass',
+    'calm': 'binaural beats calm relaxation 432hz mindfulness',
+    'anxious': 'binaural beats anxiety relief slow tempo 432hz',
+    'focus': 'binaural beats focus concentration alpha waves 432hz'
+}
+
+# Dataset emotion labels -> mood keys
+EMOTION_LABELS = {
+    'happy': ['happy', 'uplifting', 'joy', 'positive'],
+    'sad': ['sad', 'melancholy', 'blue'],
+    'angry': ['angry', 'anger', 'irritated'],
+    'calm': ['calm', 'relaxed', 'relaxation', 'peaceful'],
+    'anxious': ['anxious', 'anxiety', 'tense'],
+    'focus': ['focus', 'concentration', 'study', 'attention']
+}
+
+Track = namedtuple('Track', [
+    'subdir', 'filename', 'name_lower', 'brainwave', 'frequency', 'type',
+    'solfeggio_frequency', 'label', 'length_hint'
+])
+
+
+def parse_track_info(filename):
+    """
+    Parse dataset filenames such as Alpha_12_Hz.mp3, Alpha_10_Hz_Isochronic_Pulses.mp3
+    or Alpha_12_Hz_Solfeggio_396_Hz.mp3 into track metadata.
+    """
+    try:
+        base = os.path.splitext(filename)[0]
+        parts = base.split('_')
+        info = {
+            'brainwave': None,
+            'frequency': None,
+            'type': 'pure',  # pure|isochronic|solfeggio
+            'solfeggio_frequency': None,
+            'label': filename,
+            'length_hint': 'short'  # long for solfeggio (15m), others are usually short
+        }
+        if parts:
+            bw = parts[0].lower()
+            if bw in BRAINWAVE_ORDER:
+                info['brainwave'] = bw
+        # Find main Hz
+        for i, p in enumerate(parts):
+            if p.lower() == 'hz' and i > 0:
+                try:
+                    info['frequency'] = float(parts[i-1])
+                except Exception:
+                    pass
+        name_l = filename.lower()
+        if 'isochronic_pulses' in name_l:
+            info['type'] = 'isochronic'
+        if 'solfeggio' in name_l:
+            info['type'] = 'solfeggio'
+            info['length_hint'] = 'long'
+            # Extract solfeggio frequency: ..._Solfeggio_396_Hz
+            lowered = [p.lower() for p in parts]
+            idx = lowered.index('solfeggio') if 'solfeggio' in lowered else -1
+            if idx != -1 and idx + 2 < len(parts) and lowered[idx+2] == 'hz':
+                try:
+                    info['solfeggio_frequency'] = float(parts[idx+1])
+                except Exception:
+                    pass
+        # Build label
+        bw_label = (info['brainwave'] or '').capitalize()
+        freq_label = f"{int(info['frequency']) if info['frequency'] and info['frequency'].is_integer() else info['frequency']} Hz" if info['frequency'] else ''
+        suffix = ''
+        if info['type'] == 'isochronic':
+            suffix = ' (Isochronic)'
+        elif info['type'] == 'solfeggio':
+            sf = f" {int(info['solfeggio_frequency']) if info['solfeggio_frequency'] and float(info['solfeggio_frequency']).is_integer() else info['solfeggio_frequency']} Hz" if info['solfeggio_frequency'] else ''
+            suffix = f" (Solfeggio{sf})"
+        pretty = ' '.join([s for s in [bw_label, freq_label] if s]).strip() + suffix
+        info['label'] = pretty or filename
+        return info
+    except Exception:
+        return {
+            'brainwave': None,
+            'frequency': None,
+            'type': 'pure',
+            'solfeggio_frequency': None,
+            'label': filename,
+            'length_hint': 'short'
+        }
+
+
+def _sort_key(track, relevance, sort_method):
+    if sort_method == 'relevance':
+        return (-relevance, track.label)
+    elif sort_method == 'frequency_asc':
+        return (track.frequency or 1e9, track.label)
+    elif sort_method == 'frequency_desc':
+        return (-(track.frequency or 0), track.label)
+    elif sort_method == 'duration':
+        # Solfeggio tracks are typically longer
+        return (TYPE_RANK.get(track.type, 2), track.label)
+    elif sort_method == 'brainwave':
+        return (BRAINWAVE_ORDER.get(track.brainwave, 5), track.frequency or 0)
+    # Default: relevance first, then type, then brainwave, then frequency
+    return (-relevance, TYPE_RANK.get(track.type, 2), track.brainwave or 'zzzz', track.frequency or 1e9)
+
+
+def _metadata_rows(path):
+    """Rows of the dataset metadata file as dicts (CSV, or a JSON list of tracks)."""
+    if path.lower().endswith('.csv'):
+        with open(path, 'r', encoding='utf-8') as fh:
+            return list(csv.DictReader(fh))
+    with open(path, 'r', encoding='utf-8') as fh:
+        data = json.load(fh)
+    items = data if isinstance(data, list) else data.get('tracks') or data.get('data') or []
+    return [item for item in items if isinstance(item, dict)]
+
+
+def build_mood_music_map(metadata_path=None):
+    """Default mood -> YouTube query map, enriched from the dataset metadata file if present."""
+    mood_map = {mood: {'query': query, 'videos': []} for mood, query in MOOD_MUSIC_QUERIES.items()}
+    if metadata_path:
+        try:
+            for row in _metadata_rows(metadata_path):
+                # Dataset may have columns like: title, artist, emotion, youtube_id, tags
+                emotion = (row.get('emotion') or row.get('mood') or '').strip().lower()
+                youtube_id = (row.get('youtube_id') or row.get('video_id') or row.get('youtube') or '').strip()
+                title = (row.get('title') or row.get('name') or '').strip()
+                if not emotion:
+                    continue
+                for mood_key, labels in EMOTION_LABELS.items():
+                    if any(label in emotion for label in labels):
+                        if youtube_id:
+                            mood_map[mood_key]['videos'].append({'id': youtube_id, 'title': title})
+                        else:
+                            # If no direct video id, append title to query suggestions
+                            mood_map[mood_key]['query'] = mood_map[mood_key]['query'] + ' ' + title
+                        break
+        except Exception as e:
+            # Fail gracefully — keep default mapping and log
+            logger.debug(f"Failed to load local binaural-beats dataset: {e}")
+
+    # Deduplicate video lists by id
+    for entry in mood_map.values():
+        seen = set()
+        deduped = []
+        for item in entry['videos']:
+            if item['id'] and item['id'] not in seen:
+                seen.add(item['id'])
+                deduped.append(item)
+        entry['videos'] = deduped
+    return mood_map
+
+
+class TrackCatalog:
+    """Immutable snapshot of the dataset: parsed tracks plus lookup indexes."""
+
+    def __init__(self, base_dir, signature=None):
+        self.base_dir = base_dir
+        self.signature = signature
+        self.built_at = time.time()
+
+        tracks = []
+        for sub in AUDIO_SUBDIRS:
+            d = os.path.join(base_dir, sub)
+            if not os.path.isdir(d):
+                continue
+            try:
+                names = sorted(os.listdir(d))
+            except OSError as e:
+                logger.debug(f"Failed to scan directory {d}: {e}")
+                continue
+            for fn in names:
+                name_l = fn.lower()
+                if not name_l.endswith(AUDIO_EXTENSIONS):
+                    continue
+                meta = parse_track_info(fn)
+                tracks.append(Track(sub, fn, name_l, meta['brainwave'], meta['frequency'], meta['type'],
+                                    meta['solfeggio_frequency'], meta['label'], meta['length_hint']))
+        if SYNTH_LISTED:
+            tracks.extend(_synthesized_tracks())
+        self.tracks = tuple(tracks)
+
+        by_brainwave, by_type = {}, {}
+        for i, track in enumerate(self.tracks):
+            if track.brainwave:
+                by_brainwave.setdefault(track.brainwave, []).append(i)
+            by_type.setdefault(track.type, []).append(i)
+        self.by_brainwave = {k: tuple(v) for k, v in by_brainwave.items()}
+        self.by_type = {k: frozenset(v) for k, v in by_type.items()}
+
+        # Sorted (frequency, index) pairs for range queries
+        freq_pairs = sorted((t.frequency, i) for i, t in enumerate(self.tracks) if t.frequency)
+        self.frequencies = [f for f, _ in freq_pairs]
+        self.frequency_order = [i for _, i in freq_pairs]
+        self.no_frequency = frozenset(i for i, t in enumerate(self.tracks) if not t.frequency)
+
+        self.metadata_path = _find_metadata_file(base_dir)
+        self.mood_music = build_mood_music_map(self.metadata_path)
+
+        # Per-snapshot memo of (mood, sort_by) -> ordered track indexes, known moods only
+        self._ranked = {}
+
+    def in_frequency_range(self, low, high):
+        """Indexes of tracks with low <= frequency <= high (None means unbounded)."""
+        lo = 0 if low is None else bisect_left(self.frequencies, low)
+        hi = len(self.frequencies) if high is None else bisect_right(self.frequencies, high)
+        return self.frequency_order[lo:hi]
+
+    def _mood_candidates(self, mood):
+        config = MOOD_KEYWORDS.get(mood, {
+            'keywords': [mood],
+            'brainwaves': [],
+            'freq_range': (0.0, 1000.0),
+            'priority_freq': []
+        })
+        keywords = config['keywords']
+        candidates = set(self.in_frequency_range(*config['freq_range']))
+        for bw in config['brainwaves']:
+            candidates.update(self.by_brainwave.get(bw, ()))
+        candidates.update(i for i, t in enumerate(self.tracks) if any(kw in t.name_lower for kw in keywords))
+
+        relevance = {}
+        for i in candidates:
+            track = self.tracks[i]
+            score = 0
+            if track.brainwave and track.brainwave in config['brainwaves']:
+                score += 10
+            if track.frequency and track.frequency in config['priority_freq']:
+                score += 5
+            if any(kw in track.name_lower for kw in keywords[:3]):  # Prioritize first 3 keywords
+                score += 3
+            relevance[i] = score
+        return relevance
+
+    def ranked(self, mood, sort_by='default'):
+        """(track index, relevance score) pairs matching `mood`, ordered by `sort_by`."""
+        if sort_by not in SORT_METHODS:
+            sort_by = 'default'
+        key = (mood, sort_by)
+        cached = self._ranked.get(key)
+        if cached is not None:
+            return cached
+        relevance = self._mood_candidates(mood)
+        result = tuple(sorted(relevance.items(), key=lambda item: _sort_key(self.tracks[item[0]], item[1], sort_by)))
+        if mood in MOOD_KEYWORDS:
+            self._ranked[key] = result
+        return result
+
+    def search(self, mood, min_frequency=None, max_frequency=None, track_type=None, sort_by='default'):
+        """Tracks for `mood` after optional frequency/type filters: [(Track, relevance), ...]."""
+        allowed = None
+        if min_frequency is not None or max_frequency is not None:
+            # Tracks without a parsed frequency are never excluded by the range
+            allowed = set(self.in_frequency_range(min_frequency, max_frequency)) | self.no_frequency
+        if track_type and track_type != 'all':
+            of_type = self.by_type.get(track_type, frozenset())
+            allowed = of_type if allowed is None else allowed & of_type
+        return [(self.tracks[i], score) for i, score in self.ranked(mood, sort_by) if allowed is None or i in allowed]
+
+    def find_local(self, mood, subdir='audio'):
+        """First track in `subdir` whose filename contains `mood`, or None."""
+        for track in self.tracks:
+            if track.subdir == subdir and mood in track.name_lower:
+                return track
+        return None
+
+    def path(self, track):
+        return os.path.join(self.base_dir, track.subdir, track.filename)
+
+    def file_tracks(self):
+        """Tracks backed by a dataset file (synthesized presets have none on disk)."""
+        return [track for track in self.tracks if track.subdir != SYNTH_SUBDIR]
+
+    def mood_music_map(self):
+        """Fresh copy of the dataset-enriched /api/mood-music map."""
+        return copy.deepcopy(self.mood_music)
+
+    def stats(self):
+        return {
+            'tracks': len(self.tracks),
+            'brainwaves': {k: len(v) for k, v in self.by_brainwave.items()},
+            'types': {k: len(v) for k, v in self.by_type.items()},
+            'metadata_file': os.path.basename(self.metadata_path) if self.metadata_path else None,
+            'built_at': self.built_at
+        }
+
+
+def _synthesized_tracks():
+    """Tracks for the binaural_synth presets, described by their dataset-style filenames."""
+    tracks = []
+    for fn, spec in PRESETS_BY_FILENAME.items():
+        meta = parse_track_info(fn)
+        tracks.append(Track(SYNTH_SUBDIR, fn, fn.lower(), meta['brainwave'], meta['frequency'], meta['type'],
+                            meta['solfeggio_frequency'], f"Synthesized {meta['label']}",
+                            'long' if spec.duration >= 300 else 'short'))
+    return tracks
+
+
+def _find_metadata_file(base_dir):
+    for fn in METADATA_FILES:
+        path = os.path.join(base_dir, fn)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _signature(base_dir):
+    """mtimes that change whenever a track or metadata file is added, removed or rewritten."""
+    paths = [base_dir] + [os.path.join(base_dir, sub) for sub in AUDIO_SUBDIRS]
+    paths += [os.path.join(base_dir, fn) for fn in METADATA_FILES]
+    return tuple(_mtime(p) for p in paths)
+
+
+_catalog = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_catalog(base_dir=DATASET_DIR, force=False):
+    """Current catalog, rebuilt if the dataset changed since it was built."""
+    global _catalog, _checked_at
+    now = time.monotonic()
+    catalog = _catalog
+    if catalog is not None and not force and catalog.base_dir == base_dir and now - _checked_at < CATALOG_CHECK_INTERVAL:
+        return catalog
+    with _lock:
+        signature = _signature(base_dir)
+        _checked_at = now
+        if force or _catalog is None or _catalog.base_dir != base_dir or _catalog.signature != signature:
+            _catalog = TrackCatalog(base_dir, signature)
+            logger.info(f"Built audio track catalog: {len(_catalog.tracks)} tracks from {base_dir}")
+        return _catalog
@@ -0,0 +1,310 @@
+"""
+Binaural, isochronic and solfeggio-layered tone synthesis with a render cache.
+
+`render_blocks` generates a track block by block with NumPy, phase-continuous
+across blocks (every sample is computed from its absolute time), so /synth
+can stream a WAV while it is being generated: the header is written first
+with the final length, then SYNTH_BLOCK_SECONDS of PCM at a time. The stream
+is teed into the render cache, a directory of WAV files named by a hash of
+the normalized spec; a repeated request is a plain file response (with byte
+ranges and a strong ETag) and costs no synthesis. The cache is bounded to
+SYNTH_CACHE_MAX_MB, evicting the least recently served renders.
+
+SYNTH_PRESETS are listed by the audio track catalog under the `synth`
+subdirectory. Their filenames follow the dataset's naming
+(Alpha_10_Hz_Solfeggio_528_Hz.wav), so parse_track_info gives them the same
+brainwave, type and label metadata as the shipped MP3s. They are the only
+specs /synth renders for anonymous clients.
+"""
+import hashlib
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+import numpy as np
+from flask import current_app, request, send_file, url_for
+
+from media import VERSION_LENGTH, set_caching
+
+logger = logging.getLogger(__name__)
+
+SYNTH_CACHE_DIR = os.environ.get(
+    "SYNTH_CACHE_DIR",
+    os.path.join(os.path.abspath(os.path.dirname(__file__)), 'instance', 'synth_cache')
+)
+SYNTH_CACHE_MAX_MB = int(os.environ.get("SYNTH_CACHE_MAX_MB", "1024"))
+SYNTH_MAX_SECONDS = int(os.environ.get("SYNTH_MAX_SECONDS", "900"))
+SYNTH_MAX_RENDERS = int(os.environ.get("SYNTH_MAX_RENDERS", "4"))
+
+# Bump when the synthesis changes so old renders are not served
+SYNTH_VERSION = 1
+SAMPLE_RATE = 22050
+CHANNELS = 2
+SAMPLE_WIDTH = 2
+SYNTH_BLOCK_SECONDS = 1
+AMPLITUDE = 0.5
+SOLFEGGIO_LEVEL = 0.3
+FADE_SECONDS = 2.0
+
+TRACK_TYPES = ('binaural', 'isochronic', 'solfeggio')
+DEFAULT_CARRIER = 200.0
+DEFAULT_DURATION = 600
+SYNTH_SUBDIR = 'synth'
+
+# Upper beat frequency of each brainwave band, for preset filenames
+BRAINWAVE_BANDS = (('delta', 4.0), ('theta', 8.0), ('alpha', 13.0), ('beta', 30.0), ('gamma', float('inf')))
+
+SynthSpec = namedtuple('SynthSpec', ['type', 'carrier', 'beat', 'duration', 'solfeggio'])
+
+
+def _number(value, name, low, high, default=None):
+    if value is None or value == '':
+        if default is None:
+            raise ValueError(f"Missing {name}")
+        return default
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name}")
+    if not low <= number <= high:
+        raise ValueError(f"{name} must be between {low:g} and {high:g}")
+    return number
+
+
+def make_spec(track_type, carrier=None, beat=None, duration=None, solfeggio=None):
+    """Validated, normalized SynthSpec from request values; raises ValueError."""
+    if track_type not in TRACK_TYPES:
+        raise ValueError(f"Unknown track type {track_type!r}")
+    carrier = round(_number(carrier, 'carrier', 40, 1000, DEFAULT_CARRIER), 2)
+    beat = round(_number(beat, 'beat', 0.5, 100), 2)
+    if track_type != 'isochronic' and carrier - beat / 2 < 20:
+        raise ValueError("carrier is too low for this beat frequency")
+    duration = int(_number(duration, 'duration', 1, SYNTH_MAX_SECONDS, DEFAULT_DURATION))
+    if track_type == 'solfeggio':
+        solfeggio = round(_number(solfeggio, 'solfeggio', 100, 1000), 2)
+    else:
+        solfeggio = None
+    return SynthSpec(track_type, carrier, beat, duration, solfeggio)
+
+
+def render_key(spec):
+    """Content address of a render: everything that determines its samples."""
+    payload = json.dumps([SYNTH_VERSION, SAMPLE_RATE, *spec])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def frame_count(spec):
+    return spec.duration * SAMPLE_RATE
+
+
+def wav_header(frames):
+    """44-byte RIFF header for `frames` of 16-bit stereo PCM."""
+    data_size = frames * CHANNELS * SAMPLE_WIDTH
+    return b'RIFF' + struct.pack('<I', 36 + data_size) + b'WAVE' + b'fmt ' + struct.pack(
+        '<IHHIIHH', 16, 1, CHANNELS, SAMPLE_RATE, SAMPLE_RATE * CHANNELS * SAMPLE_WIDTH,
+        CHANNELS * SAMPLE_WIDTH, SAMPLE_WIDTH * 8
+    ) + b'data' + struct.pack('<I', data_size)
+
+
+def _tone(frequency, t):
+    return np.sin(2 * np.pi * frequency * t)
+
+
+def synthesize(spec, start, count):
+    """Float samples (count, 2) of the track from frame `start`."""
+    t = (start + np.arange(count)) / SAMPLE_RATE
+    if spec.type == 'isochronic':
+        # Carrier pulsed on and off at the beat frequency with a raised-cosine gate
+        mono = _tone(spec.carrier, t) * (0.5 - 0.5 * np.cos(2 * np.pi * spec.beat * t))
+        left = right = mono
+    else:
+        # Each ear gets the carrier offset by half the beat; the brain perceives the difference
+        left = _tone(spec.carrier - spec.beat / 2, t)
+        right = _tone(spec.carrier + spec.beat / 2, t)
+        if spec.type == 'solfeggio':
+            layer = SOLFEGGIO_LEVEL * _tone(spec.solfeggio, t)
+            left = (left + layer) / (1 + SOLFEGGIO_LEVEL)
+            right = (right + layer) / (1 + SOLFEGGIO_LEVEL)
+    samples = np.stack((left, right), axis=1) * AMPLITUDE
+
+    total = frame_count(spec)
+    fade = min(FADE_SECONDS * SAMPLE_RATE, total / 2)
+    position = start + np.arange(count)
+    envelope = np.minimum(1.0, np.minimum(position + 1, total - position) / fade)
+    return samples * envelope[:, np.newaxis]
+
+
+def render_blocks(spec, block_seconds=SYNTH_BLOCK_SECONDS):
+    """WAV bytes of the track: the header, then interleaved int16 PCM blocks."""
+    yield wav_header(frame_count(spec))
+    total = frame_count(spec)
+    block = int(block_seconds * SAMPLE_RATE)
+    for start in range(0, total, block):
+        samples = synthesize(spec, start, min(block, total - start))
+        yield (samples * 32767).astype('<i2').tobytes()
+
+
+class RenderCache:
+    """Directory of renders named by render_key, evicted least recently served first."""
+
+    def __init__(self, directory=SYNTH_CACHE_DIR, max_bytes=SYNTH_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.wav')
+
+    def lookup(self, key):
+        """Path of a cached render, marked as just used; None on a miss."""
+        path = self.path(key)
+        try:
+            # atime is the LRU clock; mtime stays the render time (Last-Modified)
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except OSError:
+            return None
+        return path
+
+    def temp_path(self, key):
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f'{key}.{uuid.uuid4().hex}.tmp')
+
+    def store(self, temp_path, key):
+        """Publish a completed render and evict old ones beyond the size bound."""
+        os.replace(temp_path, self.path(key))
+        self.evict()
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith('.wav'):
+                        st = entry.stat()
+                        entries.append((st.st_atime, st.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    removed += 1
+                except OSError:
+                    pass
+            if removed:
+                logger.info(f"Evicted {removed} synthesized renders from {self.directory}")
+            return removed
+
+    def stats(self):
+        files = size = 0
+        if os.path.isdir(self.directory):
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith('.wav'):
+                        files += 1
+                        size += entry.stat().st_size
+        return {'renders': files, 'bytes': size, 'max_bytes': self.max_bytes}
+
+
+render_cache = RenderCache()
+_render_slots = threading.BoundedSemaphore(max(1, SYNTH_MAX_RENDERS))
+
+
+class RendererBusy(Exception):
+    """SYNTH_MAX_RENDERS renders are already streaming."""
+
+
+def _streaming_render(spec, key):
+    """Response streaming a render while teeing it into the cache."""
+    if not _render_slots.acquire(blocking=False):
+        raise RendererBusy()
+    temp_path = render_cache.temp_path(key)
+    state = {'complete': False}
+
+    def generate():
+        with open(temp_path, 'wb') as fh:
+            for block in render_blocks(spec):
+                fh.write(block)
+                yield block
+        render_cache.store(temp_path, key)
+        state['complete'] = True
+
+    def cleanup():
+        # Runs when the server closes the response, also if the client went away mid-stream
+        _render_slots.release()
+        if not state['complete']:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    response = current_app.response_class(generate(), mimetype='audio/wav')
+    response.headers['Content-Length'] = str(44 + frame_count(spec) * CHANNELS * SAMPLE_WIDTH)
+    response.call_on_close(cleanup)
+    return response
+
+
+def is_rendered(spec):
+    """True when `spec` is in the render cache, so serving it costs no synthesis."""
+    return render_cache.lookup(render_key(spec)) is not None
+
+
+def send_render(spec, version=None):
+    """
+    Response for a synthesized track: the cached render (with Range and
+    conditional handling) or a stream that renders it; `version` is the URL's `v`.
+    Raises RendererBusy when a render is needed but none may start.
+    """
+    key = render_key(spec)
+    path = render_cache.lookup(key)
+    if path is not None:
+        response = send_file(path, mimetype='audio/wav', conditional=True, etag=key, max_age=None)
+        response.accept_ranges = 'bytes'
+    elif request.if_none_match.contains(key):
+        # Renders are deterministic: a client holding this ETag has the content
+        response = current_app.response_class(status=304)
+    else:
+        response = _streaming_render(spec, key)
+        response.accept_ranges = 'none'
+    set_caching(response, key, version)
+    return response
+
+
+def track_filename(spec):
+    """Dataset-style filename for a spec, e.g. Theta_6_Hz_Solfeggio_528_Hz.wav."""
+    brainwave = next(name for name, upper in BRAINWAVE_BANDS if spec.beat < upper)
+    parts = [brainwave.capitalize(), f'{spec.beat:g}', 'Hz']
+    if spec.type == 'isochronic':
+        parts += ['Isochronic', 'Pulses']
+    elif spec.type == 'solfeggio':
+        parts += ['Solfeggio', f'{spec.solfeggio:g}', 'Hz']
+    return '_'.join(parts) + '.wav'
+
+
+def spec_params(spec):
+    """Query parameters of /synth/<type>.wav that reproduce `spec`."""
+    params = {'carrier': f'{spec.carrier:g}', 'beat': f'{spec.beat:g}', 'duration': spec.duration}
+    if spec.solfeggio is not None:
+        params['solfeggio'] = f'{spec.solfeggio:g}'
+    return params
+
+
+def track_url(spec):
+    """Versioned /synth URL of a spec; the version lets clients cache it as immutable."""
+    return url_for('synth_audio', track_type=spec.type, v=render_key(spec)[:VERSION_LENGTH], **spec_params(spec))
+
+
+SYNTH_PRESETS = tuple(make_spec(*preset) for preset in (
+    ('binaural', DEFAULT_CARRIER, 2), ('binaural', DEFAULT_CARRIER, 4), ('binaural', DEFAULT_CARRIER, 6),
+    ('binaural', DEFAULT_CARRIER, 10), ('binaural', DEFAULT_CARRIER, 15), ('binaural', DEFAULT_CARRIER, 40),
+    ('isochronic', DEFAULT_CARRIER, 6), ('isochronic', DEFAULT_CARRIER, 10),
+    ('solfeggio', DEFAULT_CARRIER, 4, DEFAULT_DURATION, 396), ('solfeggio', DEFAULT_CARRIER, 10, DEFAULT_DURATION, 528),
+))
+PRESETS_BY_FILENAME = {track_filename(spec): spec for spec in SYNTH_PRESETS}
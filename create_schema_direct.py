@@ -43,6 +43,8 @@ def create_database_schema():
                 category VARCHAR(50) DEFAULT 'general',
                 tags TEXT,
                 views INTEGER DEFAULT 0,
+                like_count INTEGER NOT NULL DEFAULT 0,
+                comment_count INTEGER NOT NULL DEFAULT 0,
                 is_featured BOOLEAN DEFAULT 0,
                 is_published BOOLEAN DEFAULT 1,
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
@@ -152,6 +154,8 @@ def create_database_schema():
                 streak INTEGER DEFAULT 0,
                 badges TEXT DEFAULT '[]',
                 last_activity DATE,
+                weekly_points INTEGER NOT NULL DEFAULT 0,
+                week_start DATE,
                 updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (user_id) REFERENCES users (id)
             )
@@ -183,9 +187,12 @@ def create_database_schema():
                 active_users INTEGER DEFAULT 0,
                 avg_wellness_score REAL,
                 avg_screen_time REAL,
+                day_screen_time REAL,
                 high_risk_users INTEGER DEFAULT 0,
                 engagement_rate REAL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                completion_rate REAL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
             )
         ''')
         
@@ -370,10 +377,90 @@ def create_database_schema():
             )
         ''')
         
+        # Create background_jobs table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS background_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_type VARCHAR(50) NOT NULL,
+                payload TEXT,
+                user_id INTEGER,
+                status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 5,
+                run_after DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                locked_at DATETIME,
+                last_error TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+
+        # Per-user activity totals and streaks (kept in sync by models.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_activity_stats (
+                user_id INTEGER NOT NULL,
+                activity VARCHAR(20) NOT NULL,
+                total_sessions INTEGER NOT NULL DEFAULT 0,
+                total_minutes INTEGER NOT NULL DEFAULT 0,
+                current_streak INTEGER NOT NULL DEFAULT 0,
+                last_activity_date DATE,
+                PRIMARY KEY (user_id, activity),
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+            )
+        ''')
+
+        # Keyword index over users.institution (kept in sync by models.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS institution_tokens (
+                token VARCHAR(100) NOT NULL,
+                user_id INTEGER NOT NULL,
+                PRIMARY KEY (token, user_id),
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+            )
+        ''')
+
+        # Create journal_entries table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS journal_entries (
+                id VARCHAR(36) PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                title VARCHAR(100) NOT NULL,
+                content TEXT NOT NULL,
+                sentiment VARCHAR(20),
+                ai_suggestions TEXT,
+                created_at DATETIME NOT NULL,
+                updated_at DATETIME,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+
+        # Create voice_logs table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS voice_logs (
+                id VARCHAR(36) PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                filename VARCHAR(255) NOT NULL,
+                file_path VARCHAR(500),
+                audio_features TEXT,
+                emotion VARCHAR(50),
+                emotion_confidence FLOAT,
+                emotion_timeline TEXT,
+                transcript TEXT,
+                ai_analysis TEXT,
+                created_at DATETIME NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+        
         # Create indexes for better performance
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_email ON users(email)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_role ON users(role)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_institution ON users(institution)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS ix_institution_tokens_user_id ON institution_tokens(user_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_blog_feed ON blog_posts(is_published, created_at, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_journal_user_created ON journal_entries(user_id, created_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_voice_log_user_created ON voice_logs(user_id, created_at)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_assessment_user_id ON assessments(user_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_assessment_type ON assessments(assessment_type)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_detox_user_id ON digital_detox_logs(user_id)')
@@ -385,6 +472,10 @@ def create_database_schema():
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_mood_user_id ON mood_logs(user_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_music_user_id ON music_therapy_logs(user_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_notification_recipient_id ON notifications(recipient_id)')
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS uq_institutional_analytics_day ON institutional_analytics(institution, date)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_job_status_run_after ON background_jobs(status, run_after)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS ix_background_jobs_job_type ON background_jobs(job_type)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS ix_background_jobs_user_id ON background_jobs(user_id)')
         
         conn.commit()
         conn.close()
@@ -0,0 +1,162 @@
+"""
+Vectorized voice emotion classifier.
+
+The previous `classify_emotion` applied if/elif thresholds to a recording's
+mean pitch, energy and zero-crossing rate, and its label was then replaced
+by the Gemini analysis anyway. Here the same thresholds become smooth
+memberships scored with NumPy over whole arrays at once, so one call
+classifies every analysis frame of a clip, or the stored summary features of
+a batch of voice logs.
+
+Frame probabilities are averaged over non-silent frames into an overall label
+with a confidence (its mean probability) and into a per-segment timeline of
+VOICE_EMOTION_SEGMENT_SECONDS segments. VOICE_EMOTION_MODE decides when the
+LLM analysis still runs: 'hybrid' (default) only when the local confidence is
+below VOICE_LOCAL_CONFIDENCE, 'local' never, 'llm' always.
+"""
+import logging
+import os
+from collections import namedtuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VOICE_EMOTION_MODE = os.environ.get("VOICE_EMOTION_MODE", "hybrid").lower()
+VOICE_LOCAL_CONFIDENCE = float(os.environ.get("VOICE_LOCAL_CONFIDENCE", "0.6"))
+VOICE_EMOTION_SEGMENT_SECONDS = float(os.environ.get("VOICE_EMOTION_SEGMENT_SECONDS", "5"))
+
+EMOTIONS = ('happy', 'sad', 'stressed', 'calm', 'neutral')
+SILENCE_RMS = 0.01
+
+# Threshold, transition width
+HIGH_PITCH = (200.0, 8.0)
+LOW_PITCH = (150.0, 8.0)
+HIGH_ENERGY = (0.1, 0.005)
+LOW_ENERGY = (0.05, 0.005)
+HIGH_ZCR = (0.1, 0.005)
+
+EmotionResult = namedtuple('EmotionResult', ['emotion', 'confidence', 'timeline'])
+
+
+def _above(values, threshold):
+    centre, width = threshold
+    return 1.0 / (1.0 + np.exp(-(values - centre) / width))
+
+
+def score(pitch, energy, zcr):
+    """
+    Emotion probabilities, shape `(..., len(EMOTIONS))`, for arrays of equal shape.
+
+    Missing pitch (NaN: unvoiced frame or no pitch detected) rules out the
+    pitch-based emotions; such entries can still score as stressed or neutral.
+    """
+    pitch = np.asarray(pitch, dtype=np.float64)
+    energy = np.asarray(energy, dtype=np.float64)
+    zcr = np.asarray(zcr, dtype=np.float64)
+    voiced = ~np.isnan(pitch)
+    pitch = np.where(voiced, pitch, 0.0)
+
+    high_pitch = _above(pitch, HIGH_PITCH)
+    low_pitch = 1.0 - _above(pitch, LOW_PITCH)
+    high_energy = _above(energy, HIGH_ENERGY)
+    low_energy = 1.0 - _above(energy, LOW_ENERGY)
+
+    happy = voiced * high_pitch * high_energy
+    sad = voiced * low_pitch * low_energy
+    stressed = _above(zcr, HIGH_ZCR)
+    calm = voiced * (1.0 - high_pitch) * (1.0 - low_pitch) * (1.0 - high_energy) * (1.0 - low_energy)
+    # Neutral is whatever none of the rules claims
+    neutral = (1.0 - happy) * (1.0 - sad) * (1.0 - stressed) * (1.0 - calm)
+
+    scores = np.stack((happy, sad, stressed, calm, neutral), axis=-1)
+    return scores / scores.sum(axis=-1, keepdims=True)
+
+
+def _label(probabilities):
+    best = int(np.argmax(probabilities))
+    return EMOTIONS[best], float(probabilities[best])
+
+
+class EmotionTimeline:
+    """Accumulates frame probabilities per segment; works for a whole clip or chunk by chunk."""
+
+    def __init__(self, frame_seconds, segment_seconds=VOICE_EMOTION_SEGMENT_SECONDS):
+        self.frame_seconds = frame_seconds
+        self.segment_seconds = segment_seconds
+        self.frames = 0
+        self._sums = np.zeros((0, len(EMOTIONS)))
+        self._counts = np.zeros(0)
+
+    def add(self, pitch, energy, zcr):
+        """Score the next frames of the clip (all arrays one value per frame)."""
+        energy = np.asarray(energy, dtype=np.float64)
+        start = self.frames
+        self.frames += energy.size
+        keep = energy >= SILENCE_RMS
+        if not keep.any():
+            return
+        probabilities = score(np.asarray(pitch)[keep], energy[keep], np.asarray(zcr)[keep])
+        segments = ((start + np.flatnonzero(keep)) * self.frame_seconds // self.segment_seconds).astype(int)
+        size = int(segments.max()) + 1
+        if size > len(self._counts):
+            self._sums = np.vstack((self._sums, np.zeros((size - len(self._counts), len(EMOTIONS)))))
+            self._counts = np.concatenate((self._counts, np.zeros(size - len(self._counts))))
+        np.add.at(self._sums, segments, probabilities)
+        np.add.at(self._counts, segments, 1)
+
+    def result(self):
+        """EmotionResult over all non-silent frames; neutral with zero confidence for a silent clip."""
+        total = self._counts.sum()
+        if not total:
+            return EmotionResult('neutral', 0.0, [])
+        emotion, confidence = _label(self._sums.sum(axis=0) / total)
+        timeline = []
+        for index in np.flatnonzero(self._counts):
+            segment_emotion, segment_confidence = _label(self._sums[index] / self._counts[index])
+            timeline.append({
+                'start': round(index * self.segment_seconds, 2),
+                'end': round(min((index + 1) * self.segment_seconds, self.frames * self.frame_seconds), 2),
+                'emotion': segment_emotion,
+                'confidence': round(segment_confidence, 3)
+            })
+        return EmotionResult(emotion, round(confidence, 3), timeline)
+
+
+def classify_frames(pitch, energy, zcr, frame_seconds, segment_seconds=VOICE_EMOTION_SEGMENT_SECONDS):
+    """Classify a clip from per-frame pitch (NaN when unvoiced), RMS energy and ZCR."""
+    timeline = EmotionTimeline(frame_seconds, segment_seconds)
+    timeline.add(pitch, energy, zcr)
+    return timeline.result()
+
+
+def _summary_arrays(features_list):
+    def column(key):
+        return np.array([f.get(key) if f.get(key) is not None else np.nan for f in features_list], dtype=np.float64)
+    return column('mean_pitch'), np.nan_to_num(column('mean_energy')), np.nan_to_num(column('mean_zcr'))
+
+
+def classify_summaries(features_list):
+    """(emotion, confidence) for each stored audio_features dict, scored in one pass."""
+    if not features_list:
+        return []
+    probabilities = score(*_summary_arrays(features_list))
+    return [(emotion, round(confidence, 3)) for emotion, confidence in map(_label, probabilities)]
+
+
+def classify_voice_logs(voice_logs):
+    """Set emotion and emotion_confidence on VoiceLog rows with features; returns how many were classified."""
+    voice_logs = [log for log in voice_logs if log.audio_features]
+    for log, (emotion, confidence) in zip(voice_logs, classify_summaries([log.audio_features for log in voice_logs])):
+        log.emotion = emotion
+        log.emotion_confidence = confidence
+    return len(voice_logs)
+
+
+def needs_llm(confidence):
+    """Whether the Gemini analysis should run for a clip classified locally with `confidence`."""
+    if VOICE_EMOTION_MODE == 'local':
+        return False
+    if VOICE_EMOTION_MODE == 'llm' or confidence is None:
+        return True
+    return confidence < VOICE_LOCAL_CONFIDENCE
@@ -0,0 +1,137 @@
+"""
+Background job handlers that fill in AI fields after the row has been saved.
+
+Each handler runs inside a job_queue worker with an app context; database
+changes are committed by the queue together with the job status. The Gemini
+call itself is offloaded so green workers never block the eventlet hub.
+"""
+import json
+import logging
+
+import ai.service as ai_service
+from ai.executor import offload
+from extensions import db
+import emotion_classifier
+import voice_analysis
+from job_queue import register_job, enqueue
+from models import Assessment, DigitalDetoxLog, JournalEntry, VoiceLog
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FALLBACK_SUGGESTION = "Thank you for sharing your thoughts. Consider discussing these feelings with a trusted friend or mental health professional."
+
+
+def enqueue_assessment_insights(assessment):
+    return enqueue('assessment_insights', {'assessment_id': assessment.id}, user_id=assessment.user_id)
+
+
+def enqueue_detox_insights(log):
+    return enqueue('digital_detox_insights', {'log_id': log.id}, user_id=log.user_id)
+
+
+def enqueue_journal_insights(user_id, entry):
+    return enqueue('journal_insights', {
+        'user_id': user_id,
+        'entry_id': entry.id,
+        'sentiment': entry.sentiment or 'Neutral'
+    }, user_id=user_id)
+
+
+def enqueue_voice_analysis(user_id, voice_log):
+    return enqueue('voice_emotion_analysis', {'user_id': user_id, 'voice_log_id': voice_log.id}, user_id=user_id)
+
+
+def enqueue_voice_features(user_id, voice_log):
+    return enqueue('voice_features', {'voice_log_id': voice_log.id}, user_id=user_id)
+
+
+@register_job('assessment_insights')
+def assessment_insights_job(payload):
+    assessment = db.session.get(Assessment, payload['assessment_id'])
+    if assessment is None:
+        return None
+    insights = offload(
+        ai_service.generate_assessment_insights,
+        assessment_type=assessment.assessment_type,
+        score=assessment.score,
+        responses=assessment.responses or [],
+        raise_on_error=True
+    )
+    assessment.ai_insights = json.dumps(insights)
+    return {'assessment_id': assessment.id, 'ai_insights': insights}
+
+
+@register_job('digital_detox_insights')
+def digital_detox_insights_job(payload):
+    log = db.session.get(DigitalDetoxLog, payload['log_id'])
+    if log is None:
+        return None
+    analysis = offload(ai_service.generate_digital_detox_insights, {
+        'screen_time': log.screen_time_hours,
+        'academic_score': log.academic_score,
+        'social_interactions': log.social_interactions
+    }, raise_on_error=True)
+
+    suggestion = analysis.get('ai_suggestion') or analysis.get('analysis') or 'No suggestion available'
+    recommendations = analysis.get('recommendations') or []
+    if recommendations:
+        suggestion = suggestion + '\n' + '\n'.join(f"- {rec}" for rec in recommendations)
+    log.ai_score = str(analysis.get('ai_score') or analysis.get('score') or 'N/A')[:20]
+    log.ai_suggestion = suggestion
+    return {'log_id': log.id, 'ai_score': log.ai_score, 'ai_suggestion': log.ai_suggestion}
+
+
+@register_job('journal_insights')
+def journal_insights_job(payload):
+    entry = db.session.get(JournalEntry, payload['entry_id'])
+    if entry is None:
+        return None
+    suggestions = offload(
+        ai_service.generate_journal_insights,
+        entry.title, entry.content, payload.get('sentiment', 'Neutral'),
+        raise_on_error=True
+    ).strip()[:800]
+    if len(suggestions) < 50:  # Too short, probably error
+        suggestions = JOURNAL_FALLBACK_SUGGESTION
+    entry.ai_suggestions = suggestions
+    return {'entry_id': entry.id, 'ai_suggestions': suggestions}
+
+
+# Waits up to VOICE_ANALYSIS_TIMEOUT on the process pool, so it runs on its own
+# workers (one per pool process) instead of holding the shared ones
+@register_job('voice_features', workers=max(1, voice_analysis.VOICE_ANALYSIS_WORKERS))
+def voice_features_job(payload):
+    voice_log = db.session.get(VoiceLog, payload['voice_log_id'])
+    if voice_log is None:
+        return None
+    features, emotion = voice_analysis.analyze(voice_log.file_path)
+    logger.info(f"Voice log {voice_log.id}: {features.get('duration', 0):.1f}s of audio analysed in "
+                f"{features.get('analysis_cpu_seconds', 0):.2f}s CPU")
+    voice_log.audio_features = features
+    voice_log.set_emotion(emotion)
+    # The AI analysis reads the features, so it is queued once they are stored,
+    # and only when the local classifier is not confident enough
+    ai_pending = emotion_classifier.needs_llm(emotion.confidence)
+    if ai_pending:
+        enqueue_voice_analysis(voice_log.user_id, voice_log)
+    return {
+        'voice_log_id': voice_log.id,
+        'emotion': voice_log.emotion,
+        'emotion_confidence': voice_log.emotion_confidence,
+        'audio_features': features,
+        'ai_pending': ai_pending
+    }
+
+
+@register_job('voice_emotion_analysis')
+def voice_emotion_analysis_job(payload):
+    voice_log = db.session.get(VoiceLog, payload['voice_log_id'])
+    if voice_log is None:
+        return None
+    analysis = offload(
+        ai_service.analyze_voice_emotion,
+        voice_log.transcript or '', voice_log.audio_features or {},
+        raise_on_error=True
+    )
+    voice_log.ai_analysis = analysis
+    return {'voice_log_id': voice_log.id, 'ai_analysis': analysis}
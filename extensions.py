@@ -5,6 +5,7 @@ from flask_migrate import Migrate
 from flask_session import Session
 from flask_compress import Compress
 from flask_wtf.csrf import CSRFProtect
+from flask_caching import Cache
 
 # Initialize extensions
 db = SQLAlchemy()
@@ -12,6 +13,7 @@ migrate = Migrate()
 flask_session = Session()
 compress = Compress()
 csrf = CSRFProtect()
+cache = Cache()
 
 def init_extensions(app):
     """Initialize Flask extensions in the correct order."""
@@ -32,5 +34,14 @@ def init_extensions(app):
     # Initialize security features - CSRF is initialized in app.py
     # csrf.init_app(app)  # Already initialized in app.py
     
+    # Response/data cache; SimpleCache is per process, so multi-worker deployments
+    # should point CACHE_TYPE at FileSystemCache (CACHE_DIR) or RedisCache (CACHE_REDIS_URL)
+    app.config.setdefault('CACHE_TYPE', os.environ.get('CACHE_TYPE', 'SimpleCache'))
+    app.config.setdefault('CACHE_DEFAULT_TIMEOUT', int(os.environ.get('CACHE_DEFAULT_TIMEOUT', '300')))
+    app.config.setdefault('CACHE_DIR', os.environ.get('CACHE_DIR', os.path.join(app.root_path, 'instance', 'flask_cache')))
+    if os.environ.get('CACHE_REDIS_URL'):
+        app.config.setdefault('CACHE_REDIS_URL', os.environ['CACHE_REDIS_URL'])
+    cache.init_app(app)
+    
     # Initialize compression last
     compress.init_app(app)
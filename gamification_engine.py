@@ -1,31 +1,93 @@
+"""
+Gamification points and streaks.
+
+`award_points` applies an award as one atomic UPDATE ... RETURNING on the
+user's gamification row: the new points, streak and last activity day are
+computed by the database from the row's current values, so awards from
+concurrent requests (several tabs or devices) all land instead of the last
+read-modify-write winning. A user's first award inserts an empty row with
+ON CONFLICT DO NOTHING on the unique user_id index, so concurrent first
+awards share one row, and then applies the same UPDATE. The row lock is
+held from that statement to the caller's commit, so callers award last,
+right before committing; the award commits or rolls back together with the
+activity it is for. Points also count towards the week's total
+(weekly_points, reset when week_start moves on), and the resulting totals
+feed the leaderboards once committed.
+"""
+from collections import namedtuple
 from datetime import datetime, timezone, timedelta
+
+from sqlalchemy import case, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
 from models import Gamification
 from extensions import db
+from leaderboard import record_award, week_start
+
+GamificationState = namedtuple('GamificationState', ['points', 'streak', 'last_activity', 'weekly_points', 'week_start'])
+
+
+def _award_statement(user_id, points, today):
+    last = Gamification.last_activity
+    week = week_start(today)
+    # Every SET expression sees the row's previous values
+    return update(Gamification).where(Gamification.user_id == user_id).values(
+        points=db.func.coalesce(Gamification.points, 0) + points,
+        streak=case(
+            (last >= today, db.func.coalesce(Gamification.streak, 1)),
+            (last == today - timedelta(days=1), db.func.coalesce(Gamification.streak, 0) + 1),
+            else_=1  # first activity, or a gap
+        ),
+        last_activity=case((last > today, last), else_=today),
+        weekly_points=case(
+            (Gamification.week_start >= week, db.func.coalesce(Gamification.weekly_points, 0) + points),
+            else_=points
+        ),
+        week_start=case((Gamification.week_start > week, Gamification.week_start), else_=week)
+    )
+
+
+def _apply(user_id, points, today):
+    statement = _award_statement(user_id, points, today)
+    columns = (Gamification.points, Gamification.streak, Gamification.last_activity,
+               Gamification.weekly_points, Gamification.week_start)
+    if db.session.get_bind().dialect.update_returning:
+        return db.session.execute(statement.returning(*columns)).first()
+    if db.session.execute(statement).rowcount == 0:
+        return None
+    # The UPDATE holds the row lock, so this reads the values it wrote
+    return db.session.execute(select(*columns).where(Gamification.user_id == user_id).limit(1)).first()
+
+
+def _create_row(user_id):
+    """Insert an empty gamification row for the user unless one exists."""
+    values = {'user_id': user_id, 'points': 0, 'streak': 0, 'weekly_points': 0}
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        dialect_insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        db.session.execute(dialect_insert(Gamification).values(**values)
+                           .on_conflict_do_nothing(index_elements=['user_id']))
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(Gamification).values(**values))
+    except IntegrityError:
+        pass  # created by a concurrent award
+
 
-def award_points(user_id, points, activity_type):
-    """Awards points to a user and updates their gamification stats."""
-    gamification = Gamification.query.filter_by(user_id=user_id).first()
-    if not gamification:
-        gamification = Gamification(user_id=user_id, points=0, streak=0)
-        db.session.add(gamification)
-
-    gamification.points += points
-    
-    # Update streak logic
-    today = datetime.now(timezone.utc).date()
-    if gamification.last_activity:
-        # Ensure last_activity is a date object
-        last_activity_date = gamification.last_activity
-        if isinstance(last_activity_date, datetime):
-            last_activity_date = last_activity_date.date()
-
-        if last_activity_date == today - timedelta(days=1):
-            gamification.streak += 1
-        elif last_activity_date < today:
-            gamification.streak = 1 # Reset streak if there was a gap
-    else:
-        gamification.streak = 1 # First activity
-
-    gamification.last_activity = today
-
-    return gamification
+def award_points(user_id, points, activity_type, today=None):
+    """
+    Atomically add `points` to a user's total and advance their daily streak;
+    returns the resulting GamificationState. Does not commit.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    row = _apply(user_id, points, today)
+    if row is None:
+        # No gamification row yet: create an empty one (or find the one a
+        # concurrent first award just created) and apply the award to it
+        _create_row(user_id)
+        row = _apply(user_id, points, today)
+    state = GamificationState(*row)
+    record_award(user_id, state)
+    return state
@@ -0,0 +1,227 @@
+"""
+Local background job queue backed by the `background_jobs` table.
+
+Routes commit their row immediately and enqueue follow-up work (typically AI
+enrichment) instead of blocking the response on it. Worker tasks started with
+`start_workers` poll the table, claim jobs with a conditional UPDATE so several
+workers/processes never run the same job, retry failures with exponential
+backoff and move jobs that exhaust their attempts to the 'dead' status, which
+is listed by the dead-letter endpoints in routes/jobs.py.
+
+Handlers are registered with `@register_job('type')`, receive the job payload
+and may return a dict that is pushed to the job owner's `user_<id>` SocketIO
+room as a `job_complete` event. `@register_job('type', workers=n)` gives a
+slow job type its own `n` workers; the shared workers skip it, so a burst of
+those jobs never delays the others.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from extensions import db
+from models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", "2"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_SECONDS = float(os.environ.get("JOB_RETRY_BASE_SECONDS", "10"))
+JOB_RETRY_MAX_SECONDS = float(os.environ.get("JOB_RETRY_MAX_SECONDS", "1800"))
+# Jobs stuck in 'running' longer than this (e.g. worker killed mid-job) are requeued
+JOB_STALE_SECONDS = int(os.environ.get("JOB_STALE_SECONDS", "600"))
+
+_handlers = {}
+# job type -> number of workers that run only that type
+_dedicated = {}
+_wakeup = threading.Event()
+_started = False
+
+
+def register_job(job_type, workers=None):
+    """Decorator registering a handler function for `job_type`, optionally run by its own `workers`."""
+    def decorator(fn):
+        _handlers[job_type] = fn
+        if workers:
+            _dedicated[job_type] = workers
+        return fn
+    return decorator
+
+
+def enqueue(job_type, payload=None, user_id=None, max_attempts=JOB_MAX_ATTEMPTS, delay=0):
+    """
+    Add a job to the current session.
+
+    The job is committed together with the caller's own changes, so it never
+    runs for a row that was rolled back.
+    """
+    job = BackgroundJob(
+        job_type=job_type,
+        payload=payload or {},
+        user_id=user_id,
+        max_attempts=max_attempts,
+        run_after=datetime.utcnow() + timedelta(seconds=delay)
+    )
+    db.session.add(job)
+    _wakeup.set()
+    return job
+
+
+def retry_delay(attempts):
+    """Exponential backoff: base, 2*base, 4*base ... capped at JOB_RETRY_MAX_SECONDS."""
+    return min(JOB_RETRY_BASE_SECONDS * (2 ** max(0, attempts - 1)), JOB_RETRY_MAX_SECONDS)
+
+
+def _claim(job_id):
+    now = datetime.utcnow()
+    claimed = BackgroundJob.query.filter_by(id=job_id, status='pending').update(
+        {'status': 'running', 'attempts': BackgroundJob.attempts + 1, 'locked_at': now, 'updated_at': now},
+        synchronize_session=False
+    )
+    db.session.commit()
+    return claimed == 1
+
+
+def requeue_stale_jobs():
+    """Return jobs left 'running' by a crashed worker to the pending queue."""
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+    count = BackgroundJob.query.filter(
+        BackgroundJob.status == 'running',
+        BackgroundJob.locked_at < cutoff
+    ).update({'status': 'pending', 'locked_at': None}, synchronize_session=False)
+    db.session.commit()
+    if count:
+        logger.warning(f"Requeued {count} stale background jobs")
+    return count
+
+
+def run_job(job, socketio=None):
+    """Execute one claimed job and record success, retry or dead-letter."""
+    handler = _handlers.get(job.job_type)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job type '{job.job_type}'")
+        result = handler(job.payload or {})
+        job.status = 'done'
+        job.last_error = None
+        job.locked_at = None
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(BackgroundJob, job.id)
+        job.last_error = f"{type(e).__name__}: {e}"
+        job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = 'dead'
+            logger.error(f"Background job {job.id} ({job.job_type}) moved to dead-letter after {job.attempts} attempts: {e}")
+        else:
+            job.status = 'pending'
+            job.run_after = datetime.utcnow() + timedelta(seconds=retry_delay(job.attempts))
+            logger.warning(f"Background job {job.id} ({job.job_type}) failed, retry {job.attempts}/{job.max_attempts} at {job.run_after}: {e}")
+        db.session.commit()
+        return False
+
+    if socketio is not None and job.user_id is not None:
+        try:
+            socketio.emit('job_complete', {
+                'job_id': job.id,
+                'job_type': job.job_type,
+                'result': result or {}
+            }, room=f'user_{job.user_id}')
+        except Exception as e:
+            logger.warning(f"Failed to push job {job.id} result to user {job.user_id}: {e}")
+    return True
+
+
+def process_due_jobs(socketio=None, limit=10, job_types=None, exclude_types=None):
+    """
+    Claim and run up to `limit` due jobs; returns the number processed.
+
+    `job_types` restricts the worker to those types, `exclude_types` skips them.
+    """
+    query = BackgroundJob.query.with_entities(BackgroundJob.id).filter(
+        BackgroundJob.status == 'pending',
+        BackgroundJob.run_after <= datetime.utcnow()
+    )
+    if job_types:
+        query = query.filter(BackgroundJob.job_type.in_(job_types))
+    if exclude_types:
+        query = query.filter(BackgroundJob.job_type.notin_(exclude_types))
+    due_ids = [row.id for row in query.order_by(BackgroundJob.run_after).limit(limit).all()]
+
+    processed = 0
+    for job_id in due_ids:
+        if not _claim(job_id):
+            continue  # another worker got it first
+        job = db.session.get(BackgroundJob, job_id)
+        run_job(job, socketio)
+        processed += 1
+    return processed
+
+
+def _idle(sleep):
+    # Sleep in short slices through the async-mode aware `sleep` so a green worker
+    # never blocks the hub, waking early when a job is enqueued in this process
+    waited = 0.0
+    while waited < JOB_POLL_INTERVAL and not _wakeup.is_set():
+        sleep(0.25)
+        waited += 0.25
+    _wakeup.clear()
+
+
+def _worker_loop(app, socketio, worker_id, job_types=None, exclude_types=None):
+    sleep = socketio.sleep if socketio is not None else time.sleep
+    logger.info(f"Background job worker {worker_id} started" + (f" for {', '.join(job_types)}" if job_types else ""))
+    while True:
+        processed = 0
+        try:
+            with app.app_context():
+                processed = process_due_jobs(socketio, job_types=job_types, exclude_types=exclude_types)
+                db.session.remove()
+        except Exception:
+            logger.exception(f"Background job worker {worker_id} error")
+        if processed:
+            sleep(0)
+        else:
+            _idle(sleep)
+
+
+def start_workers(app, socketio=None, count=JOB_WORKERS):
+    """
+    Start `count` shared worker tasks plus the dedicated workers of job types
+    registered with `workers=` (green threads under eventlet, OS threads otherwise).
+
+    Call from the serving process (e.g. on first request), not at import time:
+    gunicorn --preload imports the app in the master before forking workers.
+    Returns True only on the call that actually started the workers.
+    """
+    global _started
+    if _started or count <= 0:
+        return False
+    _started = True
+
+    with app.app_context():
+        requeue_stale_jobs()
+
+    dedicated = tuple(_dedicated)
+    workers = [(f"{worker_id}", None, dedicated) for worker_id in range(count)]
+    for job_type, n in _dedicated.items():
+        workers += [(f"{job_type}-{i}", (job_type,), None) for i in range(n)]
+    for worker_id, job_types, exclude_types in workers:
+        if socketio is not None:
+            socketio.start_background_task(_worker_loop, app, socketio, worker_id, job_types, exclude_types)
+        else:
+            threading.Thread(target=_worker_loop, args=(app, None, worker_id, job_types, exclude_types),
+                             daemon=True).start()
+    return True
+
+
+def queue_stats(user_ids=None):
+    """Job counts by status for health checks, optionally only jobs of `user_ids` (a list or subquery)."""
+    query = db.session.query(BackgroundJob.status, db.func.count(BackgroundJob.id))
+    if user_ids is not None:
+        query = query.filter(BackgroundJob.user_id.in_(user_ids))
+    rows = query.group_by(BackgroundJob.status).all()
+    return {status: count for status, count in rows}
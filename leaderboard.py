@@ -0,0 +1,212 @@
+"""
+Institution leaderboards, weekly and all-time.
+
+Each board is a RankIndex: its users' scores in a SortedList ordered by score
+descending, so top-N is a slice and a user's rank is one bisect, both
+O(log n), instead of sorting the gamification table per request. The boards
+are built from the database at startup (`leaderboards.load()`) and updated by
+award_points: the totals an award produced are queued on the session and
+applied once it commits, so rolled-back awards never show. Institution and
+role changes of users are picked up the same way.
+
+The index lives in the serving process (the app runs a single eventlet
+worker); points awarded by other processes show after the next load.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sortedcontainers import SortedList
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import Gamification, User
+
+logger = logging.getLogger(__name__)
+
+PERIODS = ('weekly', 'all_time')
+PENDING_KEY = 'leaderboard_updates'
+
+
+def week_start(day):
+    """The Monday of `day`'s week."""
+    return day - timedelta(days=day.weekday())
+
+
+def _today():
+    # award_points dates activity in UTC
+    return datetime.now(timezone.utc).date()
+
+
+class RankIndex:
+    """Scores of one board, ordered for O(log n) rank and top-N queries."""
+
+    def __init__(self):
+        self._order = SortedList()  # (-score, user_id)
+        self._scores = {}
+
+    def __len__(self):
+        return len(self._scores)
+
+    def set(self, user_id, score):
+        """Place a user at `score`; users with no points are left off the board."""
+        self.discard(user_id)
+        if score and score > 0:
+            self._order.add((-score, user_id))
+            self._scores[user_id] = score
+
+    def discard(self, user_id):
+        score = self._scores.pop(user_id, None)
+        if score is not None:
+            self._order.remove((-score, user_id))
+
+    def score(self, user_id):
+        return self._scores.get(user_id)
+
+    def rank(self, user_id):
+        """1-based rank (tied scores share one), or None for a user not on the board."""
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return self._order.bisect_left((-score,)) + 1
+
+    def top(self, n):
+        """(rank, user_id, score) of the first `n` users, ties broken by user id."""
+        entries = []
+        for position, (negated, user_id) in enumerate(self._order.islice(0, n)):
+            rank = entries[-1][0] if entries and entries[-1][2] == -negated else position + 1
+            entries.append((rank, user_id, -negated))
+        return entries
+
+
+class Leaderboards:
+    """Weekly and all-time RankIndex per institution, for patients with points."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._boards = {}
+        self._members = {}  # user_id -> (institution, points, weekly_points, week_start)
+        self._week = None
+
+    def _board(self, institution, period):
+        board = self._boards.get((institution, period))
+        if board is None:
+            board = self._boards[(institution, period)] = RankIndex()
+        return board
+
+    def _roll_week(self, today):
+        # Weekly boards restart on Monday: only points of the new week count
+        week = week_start(today)
+        if week == self._week:
+            return
+        self._week = week
+        for key in [key for key in self._boards if key[1] == 'weekly']:
+            self._boards[key] = RankIndex()
+        for user_id, (institution, _, weekly_points, member_week) in self._members.items():
+            if member_week == week:
+                self._board(institution, 'weekly').set(user_id, weekly_points)
+
+    def _remove(self, user_id):
+        member = self._members.pop(user_id, None)
+        if member is not None:
+            for period in PERIODS:
+                self._board(member[0], period).discard(user_id)
+
+    def _place(self, user_id, institution, points, weekly_points, member_week):
+        old = self._members.get(user_id)
+        if old is not None:
+            # Commits can be applied out of order; totals only grow
+            points = max(points or 0, old[1] or 0)
+            if old[3] is not None and (member_week is None or (old[3], old[2]) > (member_week, weekly_points)):
+                weekly_points, member_week = old[2], old[3]
+            if old[0] != institution:
+                self._remove(user_id)
+        self._members[user_id] = (institution, points, weekly_points, member_week)
+        self._board(institution, 'all_time').set(user_id, points)
+        self._board(institution, 'weekly').set(user_id, weekly_points if member_week == self._week else 0)
+
+    def load(self, today=None):
+        """Rebuild every board from the gamification table; returns the number of ranked users."""
+        query = db.session.query(
+            Gamification.user_id, Gamification.points, Gamification.weekly_points,
+            Gamification.week_start, User.institution
+        ).join(User, User.id == Gamification.user_id).filter(User.role == 'patient')
+        with self._lock:
+            self._boards, self._members, self._week = {}, {}, None
+            self._roll_week(today or _today())
+            for user_id, points, weekly_points, member_week, institution in query.yield_per(5000):
+                self._place(user_id, institution, points, weekly_points, member_week)
+            return len(self._members)
+
+    def apply(self, updates, today=None):
+        """Apply committed ('score', ...) and ('member', ...) updates queued by the hooks below."""
+        with self._lock:
+            self._roll_week(today or _today())
+            for kind, user_id, institution, role, *scores in updates:
+                if role != 'patient':
+                    self._remove(user_id)
+                elif kind == 'score':
+                    self._place(user_id, institution, *scores)
+                elif user_id in self._members:
+                    _, points, weekly_points, member_week = self._members[user_id]
+                    self._place(user_id, institution, points, weekly_points, member_week)
+
+    def top(self, institution, period='all_time', n=10, today=None):
+        with self._lock:
+            self._roll_week(today or _today())
+            return self._board(institution, period).top(n)
+
+    def standing(self, user_id, period='all_time', today=None):
+        """(rank, score, board size) of a user on their institution's board, or None if unranked."""
+        with self._lock:
+            self._roll_week(today or _today())
+            member = self._members.get(user_id)
+            if member is None:
+                return None
+            board = self._board(member[0], period)
+            rank = board.rank(user_id)
+            return (rank, board.score(user_id), len(board)) if rank is not None else None
+
+
+leaderboards = Leaderboards()
+
+
+def record_award(user_id, state):
+    """Queue a user's post-award totals (a GamificationState) for the boards, applied on commit."""
+    user = db.session.query(User.institution, User.role).filter(User.id == user_id).first()
+    if user is not None:
+        db.session.info.setdefault(PENDING_KEY, []).append(
+            ('score', user_id, user.institution, user.role, state.points, state.weekly_points, state.week_start)
+        )
+
+
+@event.listens_for(User, 'after_update')
+def _queue_member_change(mapper, connection, target):
+    attrs = db.inspect(target).attrs
+    if attrs.institution.history.has_changes() or attrs.role.history.has_changes():
+        session_ = db.inspect(target).session
+        if session_ is not None:
+            session_.info.setdefault(PENDING_KEY, []).append(('member', target.id, target.institution, target.role))
+
+
+@event.listens_for(User, 'after_delete')
+def _queue_member_removal(mapper, connection, target):
+    session_ = db.inspect(target).session
+    if session_ is not None:
+        session_.info.setdefault(PENDING_KEY, []).append(('member', target.id, None, None))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_committed(session_):
+    updates = session_.info.pop(PENDING_KEY, None)
+    if updates:
+        try:
+            leaderboards.apply(updates)
+        except Exception as e:
+            logger.warning(f"Leaderboard update failed, boards are stale until the next load: {e}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session_):
+    session_.info.pop(PENDING_KEY, None)
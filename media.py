@@ -0,0 +1,178 @@
+"""
+Serving of the binaural-beats dataset tracks played on the music page.
+
+`send_media` answers Range requests with 206 Partial Content (so scrubbing a
+15 minute solfeggio track fetches only what is played), conditional requests
+with 304, and tags every response with a strong ETag: the BLAKE2 hash of the
+file's content. Hashes are computed once per file version (size + mtime) and
+kept in the MEDIA_HASH_MANIFEST JSON file, so they survive restarts;
+`python -m scripts.hash_media` fills it ahead of time.
+
+Track URLs handed out by /api/mood-audio carry `?v=<hash prefix>` once the
+hash is known. A request whose `v` matches the current content is cacheable
+for a year as `immutable`; other requests must revalidate (`no-cache`), which
+costs a 304 when nothing changed.
+
+With MEDIA_OFFLOAD set, the body is left to a fronting proxy: `x-accel` sends
+`X-Accel-Redirect: MEDIA_ACCEL_PREFIX<track path>` for an nginx `internal`
+location aliased to the dataset directory, `x-sendfile` sends the absolute
+path in `X-Sendfile` (Apache mod_xsendfile, lighttpd). The proxy then serves
+ranges itself; the app still answers If-None-Match with 304.
+"""
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import threading
+from urllib.parse import quote
+
+from flask import current_app, request, send_file
+
+logger = logging.getLogger(__name__)
+
+MEDIA_OFFLOAD = os.environ.get("MEDIA_OFFLOAD", "").lower()
+MEDIA_ACCEL_PREFIX = os.environ.get("MEDIA_ACCEL_PREFIX", "/internal-audio/")
+MEDIA_HASH_MANIFEST = os.environ.get(
+    "MEDIA_HASH_MANIFEST",
+    os.path.join(os.path.abspath(os.path.dirname(__file__)), 'instance', 'media_hashes.json')
+)
+MEDIA_MAX_AGE = 365 * 24 * 3600
+VERSION_LENGTH = 16
+HASH_CHUNK = 1024 * 1024
+
+
+def hash_file(path):
+    """Hex BLAKE2b-128 digest of a file's content."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(HASH_CHUNK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+class ContentHashes:
+    """Content hash per file, recomputed only when the file's size or mtime changes."""
+
+    def __init__(self, manifest_path=MEDIA_HASH_MANIFEST):
+        self.manifest_path = manifest_path
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as fh:
+                    self._entries = json.load(fh)
+            except FileNotFoundError:
+                self._entries = {}
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable media hash manifest {self.manifest_path}: {e}")
+                self._entries = {}
+        return self._entries
+
+    def known(self, path):
+        """The stored hash if it is still current, without reading the file; None otherwise."""
+        try:
+            key = _stat_key(path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._load().get(path)
+        if entry and entry[:2] == key:
+            return entry[2]
+        return None
+
+    def get(self, path):
+        """Hash of `path`, computed (off the eventlet hub) and stored if not current."""
+        digest = self.known(path)
+        if digest is not None:
+            return digest
+        from ai.executor import offload
+
+        key = _stat_key(path)
+        digest = offload(hash_file, path)
+        with self._lock:
+            self._load()[path] = key + [digest]
+            self._save()
+        return digest
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+            tmp_path = f"{self.manifest_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as fh:
+                json.dump(self._entries, fh)
+            os.replace(tmp_path, self.manifest_path)
+        except OSError as e:
+            # Hashes stay in memory and are recomputed after a restart
+            logger.warning(f"Could not write media hash manifest {self.manifest_path}: {e}")
+
+    def prune(self, keep):
+        """Forget hashes of files not in `keep`; returns how many were dropped."""
+        keep = set(keep)
+        with self._lock:
+            entries = self._load()
+            stale = [path for path in entries if path not in keep]
+            for path in stale:
+                del entries[path]
+            if stale:
+                self._save()
+        return len(stale)
+
+
+content_hashes = ContentHashes()
+
+
+def track_version(path):
+    """URL version token (`v`) for a track whose hash is known, else None."""
+    digest = content_hashes.known(path)
+    return digest[:VERSION_LENGTH] if digest else None
+
+
+def set_caching(response, digest, version):
+    """ETag `digest`; immutable caching when the URL's `version` is current, else revalidation."""
+    response.set_etag(digest)
+    if version and version == digest[:VERSION_LENGTH]:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = MEDIA_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
+
+
+def _offloaded_response(path, relpath):
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    response = current_app.response_class(mimetype=mimetype)
+    if MEDIA_OFFLOAD == 'x-accel':
+        response.headers['X-Accel-Redirect'] = MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + quote(relpath)
+    else:
+        response.headers['X-Sendfile'] = path
+    return response
+
+
+def send_media(path, relpath, version=None):
+    """
+    Response for the dataset file at `path` (`relpath` inside the dataset),
+    handling Range and conditional requests; `version` is the URL's `v`.
+    """
+    digest = content_hashes.get(path)
+    if MEDIA_OFFLOAD in ('x-accel', 'x-sendfile'):
+        response = _offloaded_response(path, relpath)
+        response.last_modified = os.path.getmtime(path)
+        set_caching(response, digest, version)
+        return response.make_conditional(request)
+    # send_file answers Range with 206 (416 when unsatisfiable), If-Range,
+    # If-None-Match and If-Modified-Since with 304 against the ETag given here
+    response = send_file(path, conditional=True, etag=digest, max_age=None)
+    # Advertised on full responses too: browsers only seek media by range when they see it
+    response.accept_ranges = 'bytes'
+    set_caching(response, digest, version)
+    return response
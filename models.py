@@ -1,10 +1,13 @@
 """Database models for the Mindful Horizon application."""
-from datetime import datetime, timedelta
-from sqlalchemy import func
+from datetime import date, datetime, timedelta
+from sqlalchemy import event, func, select, union, case, cast, or_, Float
 from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import aliased, joinedload
+from sqlalchemy.ext.hybrid import hybrid_property
 from werkzeug.security import generate_password_hash, check_password_hash
 from extensions import db
 import logging
+import uuid
 
 # Module logger
 logger = logging.getLogger(__name__)
@@ -54,6 +57,67 @@ class User(db.Model):
         return f'<User {self.email}>'
 
 
+def institution_tokens(institution):
+    """Normalized keywords of an institution name (lowercased, whitespace split)."""
+    return sorted(set((institution or '').lower().split()))
+
+
+class InstitutionToken(db.Model):
+    """Keyword index over users' institution names: token -> user ids."""
+    __tablename__ = 'institution_tokens'
+
+    token = db.Column(db.String(100), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True, index=True)
+
+
+def _write_institution_tokens(connection, user):
+    table = InstitutionToken.__table__
+    connection.execute(table.delete().where(table.c.user_id == user.id))
+    tokens = institution_tokens(user.institution)
+    if tokens:
+        connection.execute(table.insert(), [{'token': token, 'user_id': user.id} for token in tokens])
+
+
+@event.listens_for(User, 'after_insert')
+def _index_institution_on_insert(mapper, connection, target):
+    _write_institution_tokens(connection, target)
+
+
+@event.listens_for(User, 'after_update')
+def _index_institution_on_update(mapper, connection, target):
+    if db.inspect(target).attrs.institution.history.has_changes():
+        _write_institution_tokens(connection, target)
+
+
+@event.listens_for(User, 'after_delete')
+def _unindex_institution_on_delete(mapper, connection, target):
+    table = InstitutionToken.__table__
+    connection.execute(table.delete().where(table.c.user_id == target.id))
+
+
+def rebuild_institution_tokens(batch_size=5000):
+    """Rebuild the institution token index from users (for bulk loads that bypass ORM events)."""
+    table = InstitutionToken.__table__
+    db.session.execute(table.delete())
+    rows = []
+    for user_id, institution in db.session.query(User.id, User.institution).filter(User.institution.isnot(None)).yield_per(batch_size):
+        rows.extend({'token': token, 'user_id': user_id} for token in institution_tokens(institution))
+        if len(rows) >= batch_size:
+            db.session.execute(table.insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(table.insert(), rows)
+    db.session.commit()
+
+
+def sync_institution_tokens():
+    """Populate the token index on first run against an existing database."""
+    if db.session.query(InstitutionToken.user_id).first() is None and \
+            db.session.query(User.id).filter(User.institution.isnot(None), User.institution != '').first() is not None:
+        logger.info("Building institution token index")
+        rebuild_institution_tokens()
+
+
 # BlogPost model for blog system (enhanced with relationships)
 class BlogPost(db.Model):
     """Blog post model for storing blog entries."""
@@ -65,6 +129,9 @@ class BlogPost(db.Model):
     category = db.Column(db.String(50), default='general')
     tags = db.Column(db.Text, nullable=True)  # Comma-separated tags
     views = db.Column(db.Integer, default=0)
+    # Denormalized counters, updated in the same transaction as the like/comment row
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     is_featured = db.Column(db.Boolean, default=False)
     is_published = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -74,25 +141,52 @@ class BlogPost(db.Model):
     author = db.relationship('User', backref='blog_posts')
     likes = db.relationship('BlogLike', backref='post', lazy='dynamic', cascade='all, delete-orphan')
     comments = db.relationship('BlogComment', backref='post', lazy='dynamic', cascade='all, delete-orphan')
-    
-    @property
-    def like_count(self):
-        """Get total number of likes for this post"""
-        return self.likes.count()
-    
-    @property
-    def comment_count(self):
-        """Get total number of comments for this post"""
-        return self.comments.count()
+
+    # Keyset pagination of the published feed on (created_at, id)
+    __table_args__ = (db.Index('idx_blog_feed', 'is_published', 'created_at', 'id'),)
     
     def is_liked_by(self, user_id):
         """Check if a user has liked this post"""
         return self.likes.filter_by(user_id=user_id).first() is not None
     
-    @property
+    @hybrid_property
     def engagement_score(self):
         """Calculate engagement score based on likes, comments, and views"""
-        return (self.like_count * 2) + (self.comment_count * 3) + (self.views * 0.1)
+        return ((self.like_count or 0) * 2) + ((self.comment_count or 0) * 3) + ((self.views or 0) * 0.1)
+
+    @engagement_score.expression
+    def engagement_score(cls):
+        return (cls.like_count * 2) + (cls.comment_count * 3) + (func.coalesce(cls.views, 0) * 0.1)
+
+    def to_dict(self):
+        """Plain-data copy for caching; keeps the attribute names the templates use."""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'content': self.content,
+            'author_id': self.author_id,
+            'author': {'id': self.author.id, 'name': self.author.name} if self.author else None,
+            'category': self.category,
+            'tags': self.tags,
+            'views': self.views or 0,
+            'like_count': self.like_count or 0,
+            'comment_count': self.comment_count or 0,
+            'engagement_score': self.engagement_score,
+            'is_published': self.is_published,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+
+    @classmethod
+    def bump_counters(cls, post_id, likes=0, comments=0):
+        """Atomically adjust the like/comment counters in the current transaction."""
+        values = {}
+        if likes:
+            values[cls.like_count] = cls.like_count + likes
+        if comments:
+            values[cls.comment_count] = cls.comment_count + comments
+        if values:
+            cls.query.filter_by(id=post_id).update(values, synchronize_session=False)
     
     def __repr__(self):
         return f'<BlogPost {self.title}>'
@@ -210,6 +304,8 @@ class RPMData(db.Model):
 class Gamification(db.Model):
     """Gamification model for storing user gamification data."""
     __tablename__ = 'gamification'
+    # One row per user; award_points relies on it to create the row race-free
+    __table_args__ = (db.Index('ux_gamification_user_id', 'user_id', unique=True),)
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -217,6 +313,9 @@ class Gamification(db.Model):
     streak = db.Column(db.Integer, default=0)
     badges = db.Column(db.JSON, default=list)  # List of earned badges
     last_activity = db.Column(db.Date, nullable=True)
+    # Points earned in the week starting on week_start (a Monday), for the weekly leaderboard
+    weekly_points = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    week_start = db.Column(db.Date, nullable=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class ClinicalNote(db.Model):
@@ -243,9 +342,31 @@ class InstitutionalAnalytics(db.Model):
     active_users = db.Column(db.Integer, default=0)
     avg_wellness_score = db.Column(db.Float, nullable=True)
     avg_screen_time = db.Column(db.Float, nullable=True)
+    # Mean screen time of that day's detox logs alone (avg_screen_time covers the 7-day risk window)
+    day_screen_time = db.Column(db.Float, nullable=True)
     high_risk_users = db.Column(db.Integer, default=0)
     engagement_rate = db.Column(db.Float, nullable=True)
+    completion_rate = db.Column(db.Float, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # One rollup row per institution per day (written by analytics_rollup)
+    __table_args__ = (
+        db.Index('uq_institutional_analytics_day', 'institution', 'date', unique=True),
+    )
+
+    def to_dict(self):
+        return {
+            'date': self.date.isoformat(),
+            'total_users': self.total_users,
+            'active_users': self.active_users,
+            'avg_wellness_score': self.avg_wellness_score,
+            'avg_screen_time': self.avg_screen_time,
+            'day_screen_time': self.day_screen_time,
+            'high_risk_users': self.high_risk_users,
+            'engagement_rate': self.engagement_rate,
+            'completion_rate': self.completion_rate
+        }
 
 class Appointment(db.Model):
     """Appointment model for storing user appointments."""
@@ -376,6 +497,155 @@ class MusicTherapyLog(db.Model):
         return f'<MusicTherapyLog {self.mood} - {self.label or self.filename}>'
 
 
+class UserActivityStats(db.Model):
+    """Running totals and day streak per user and activity, maintained as logs are inserted."""
+    __tablename__ = 'user_activity_stats'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    activity = db.Column(db.String(20), primary_key=True)  # breathing, yoga, music, medication
+    total_sessions = db.Column(db.Integer, nullable=False, default=0)
+    total_minutes = db.Column(db.Integer, nullable=False, default=0)
+    # Consecutive days with activity, ending at last_activity_date
+    current_streak = db.Column(db.Integer, nullable=False, default=0)
+    last_activity_date = db.Column(db.Date, nullable=True)
+
+    @classmethod
+    def page_stats(cls, user_id, activity, today=None):
+        """Stats dict for the activity pages, read from one row; the streak only counts if it reaches today."""
+        today = today or date.today()
+        row = db.session.get(cls, (user_id, activity))
+        sessions = row.total_sessions if row else 0
+        minutes = row.total_minutes if row else 0
+        return {
+            'total_sessions': sessions,
+            'total_minutes': minutes,
+            'streak': row.current_streak if row and row.last_activity_date == today else 0,
+            'avg_duration': round(minutes / sessions, 1) if sessions else 0
+        }
+
+
+# Activity -> (log model, timestamp attribute, minutes attribute or None)
+ACTIVITY_LOGS = {
+    'breathing': (BreathingExerciseLog, 'created_at', 'duration_minutes'),
+    'yoga': (YogaLog, 'created_at', 'duration_minutes'),
+    'music': (MusicTherapyLog, 'created_at', 'duration_minutes'),
+    'medication': (MedicationLog, 'taken_at', None),
+}
+
+
+def _day_number(day, dialect_name):
+    """Days since a fixed epoch for a DATE expression, so consecutive days differ by 1."""
+    if dialect_name == 'sqlite':
+        return func.julianday(day)
+    return func.extract('epoch', day) / 86400
+
+
+def _as_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def compute_activity_stats(activity, user_id=None, connection=None):
+    """
+    Activity stats computed from the logs in SQL: COUNT/SUM per user and the
+    latest run of consecutive days (gaps and islands: over a user's distinct
+    days in descending order, day number + row number is constant within a run).
+    Returns {user_id: column values}; all users unless `user_id` is given.
+    """
+    model, time_attr, minutes_attr = ACTIVITY_LOGS[activity]
+    executor = connection if connection is not None else db.session
+    dialect_name = (connection.dialect if connection is not None else db.engine.dialect).name
+    filters = [model.user_id == user_id] if user_id is not None else []
+    minutes = func.coalesce(func.sum(getattr(model, minutes_attr)), 0) if minutes_attr else db.literal(0)
+
+    totals = select(model.user_id, func.count(model.id), minutes).where(*filters).group_by(model.user_id)
+    stats = {
+        uid: {'total_sessions': sessions, 'total_minutes': int(total_minutes),
+              'current_streak': 0, 'last_activity_date': None}
+        for uid, sessions, total_minutes in executor.execute(totals)
+    }
+
+    days = select(model.user_id.label('user_id'), func.date(getattr(model, time_attr)).label('day')) \
+        .where(*filters).distinct().subquery()
+    islands = select(
+        days.c.user_id, days.c.day,
+        (_day_number(days.c.day, dialect_name) +
+         func.row_number().over(partition_by=days.c.user_id, order_by=days.c.day.desc())).label('island')
+    ).subquery()
+    runs = select(islands.c.user_id, func.count().label('length'), func.max(islands.c.day).label('last_day')) \
+        .group_by(islands.c.user_id, islands.c.island)
+    for uid, length, last_day in executor.execute(runs):
+        last_day = _as_date(last_day)
+        entry = stats.get(uid)
+        if entry is not None and (entry['last_activity_date'] is None or last_day > entry['last_activity_date']):
+            entry['current_streak'] = length
+            entry['last_activity_date'] = last_day
+    return stats
+
+
+def _bump_activity_stats(connection, user_id, activity, minutes, day):
+    table = UserActivityStats.__table__
+    c = table.c
+    advances = or_(c.last_activity_date.is_(None), c.last_activity_date < day)
+    # One atomic UPDATE; every SET expression sees the row's previous values.
+    # A backdated log only adds to the totals (rebuild_activity_stats redoes its streak)
+    bump = table.update().where(c.user_id == user_id, c.activity == activity).values(
+        total_sessions=c.total_sessions + 1,
+        total_minutes=c.total_minutes + minutes,
+        current_streak=case(
+            (c.last_activity_date == day - timedelta(days=1), c.current_streak + 1),
+            (advances, 1),
+            else_=c.current_streak
+        ),
+        last_activity_date=case((advances, day), else_=c.last_activity_date)
+    )
+    if connection.execute(bump).rowcount:
+        return
+    # First log of this kind for the user. Lock the user (NO KEY UPDATE, so the
+    # log inserts' foreign key locks don't conflict) so concurrent first logs
+    # create one row between them, then retry before inserting
+    connection.execute(select(User.id).where(User.id == user_id).with_for_update(key_share=True))
+    if connection.execute(bump).rowcount:
+        return
+    # Build the row from the logs, which include this one
+    values = compute_activity_stats(activity, user_id, connection).get(user_id)
+    if values:
+        connection.execute(table.insert().values(user_id=user_id, activity=activity, **values))
+
+
+def _activity_listener(activity, time_attr, minutes_attr):
+    def record(mapper, connection, target):
+        when = getattr(target, time_attr) or datetime.utcnow()
+        minutes = (getattr(target, minutes_attr) or 0) if minutes_attr else 0
+        _bump_activity_stats(connection, target.user_id, activity, minutes, when.date())
+    return record
+
+
+for _activity, (_model, _time_attr, _minutes_attr) in ACTIVITY_LOGS.items():
+    event.listen(_model, 'after_insert', _activity_listener(_activity, _time_attr, _minutes_attr))
+
+
+def rebuild_activity_stats():
+    """Recompute every user's activity stats from the logs (for bulk loads that bypass ORM events)."""
+    table = UserActivityStats.__table__
+    db.session.execute(table.delete())
+    rows = []
+    for activity in ACTIVITY_LOGS:
+        for user_id, values in compute_activity_stats(activity).items():
+            rows.append({'user_id': user_id, 'activity': activity, **values})
+    if rows:
+        db.session.execute(table.insert(), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def sync_activity_stats():
+    """Populate the activity stats on first run against an existing database."""
+    if db.session.query(UserActivityStats.user_id).first() is None and any(
+            db.session.query(model.id).first() is not None for model, _, _ in ACTIVITY_LOGS.values()):
+        logger.info("Building user activity stats")
+        rebuild_activity_stats()
+
+
 class ProgressRecommendation(db.Model):
     """Model for storing AI-generated progress recommendations."""
     __tablename__ = 'progress_recommendations'
@@ -407,12 +677,14 @@ class Prescription(db.Model):
 class BinauralTrack(db.Model):
     """Optional table for storing binaural beats dataset tracks."""
     __tablename__ = 'binaural_tracks'
+    # Lets the dataset importer insert with ON CONFLICT DO NOTHING (NULLs never conflict)
+    __table_args__ = (db.Index('ux_binaural_tracks_youtube_id', 'youtube_id', unique=True),)
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(300), nullable=False)
     artist = db.Column(db.String(200), nullable=True)
     emotion = db.Column(db.String(100), nullable=True, index=True)
-    youtube_id = db.Column(db.String(100), nullable=True, index=True)
+    youtube_id = db.Column(db.String(100), nullable=True)
     tags = db.Column(db.JSON, nullable=True)
     source_file = db.Column(db.String(255), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -468,6 +740,198 @@ class Notification(db.Model):
         return f'<Notification {self.type} to {self.recipient_id}>'
 
 
+class BackgroundJob(db.Model):
+    """Deferred job (e.g. AI enrichment of a saved row) processed by job_queue workers."""
+    __tablename__ = 'background_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False, index=True)
+    payload = db.Column(db.JSON, nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'running', 'done', 'dead'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_job_status_run_after', 'status', 'run_after'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'payload': self.payload,
+            'user_id': self.user_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_after': self.run_after.isoformat() if self.run_after else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<BackgroundJob {self.id} {self.job_type} {self.status}>'
+
+
+def _new_uuid():
+    return str(uuid.uuid4())
+
+
+class JournalEntry(db.Model):
+    """Patient journal entry; ai_suggestions is filled in by a background job."""
+    __tablename__ = 'journal_entries'
+
+    id = db.Column(db.String(36), primary_key=True, default=_new_uuid)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    title = db.Column(db.String(100), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    sentiment = db.Column(db.String(20), nullable=True)
+    ai_suggestions = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_journal_user_created', 'user_id', 'created_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'content': self.content,
+            'sentiment': self.sentiment,
+            'ai_suggestions': self.ai_suggestions,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<JournalEntry {self.id} for user {self.user_id}>'
+
+
+class VoiceLog(db.Model):
+    """Uploaded voice recording with extracted audio features; ai_analysis is filled in by a background job."""
+    __tablename__ = 'voice_logs'
+
+    id = db.Column(db.String(36), primary_key=True, default=_new_uuid)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(500), nullable=True)
+    audio_features = db.Column(db.JSON, nullable=True)
+    emotion = db.Column(db.String(50), nullable=True)
+    emotion_confidence = db.Column(db.Float, nullable=True)  # local classifier, 0-1
+    emotion_timeline = db.Column(db.JSON, nullable=True)  # [{'start', 'end', 'emotion', 'confidence'}]
+    transcript = db.Column(db.Text, nullable=True)
+    ai_analysis = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_voice_log_user_created', 'user_id', 'created_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'audio_features': self.audio_features or {},
+            'emotion': self.emotion,
+            'emotion_confidence': self.emotion_confidence,
+            'emotion_timeline': self.emotion_timeline or [],
+            'ai_analysis': self.ai_analysis,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+    def set_emotion(self, result):
+        """Store an emotion_classifier.EmotionResult."""
+        self.emotion = result.emotion
+        self.emotion_confidence = result.confidence
+        self.emotion_timeline = result.timeline
+
+    def __repr__(self):
+        return f'<VoiceLog {self.id} for user {self.user_id}>'
+
+
+# Blog feed helpers
+BLOG_FEED_PAGE_SIZE = 20
+
+USER_LOG_PAGE_SIZE = 20
+
+def _encode_feed_cursor(row):
+    return f"{row.created_at.isoformat()}_{row.id}"
+
+def _decode_feed_cursor(cursor, id_type=int):
+    try:
+        created_at, row_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(created_at), id_type(row_id)
+    except (AttributeError, ValueError):
+        return None
+
+def get_blog_feed(before=None, limit=BLOG_FEED_PAGE_SIZE):
+    """
+    One page of published posts, newest first, with authors loaded.
+
+    Keyset pagination: `before` is the cursor of the last post on the previous
+    page. Returns (posts, next_cursor); next_cursor is None on the last page.
+    """
+    query = BlogPost.query.options(joinedload(BlogPost.author)).filter(BlogPost.is_published.is_(True))
+    position = _decode_feed_cursor(before) if before else None
+    if position:
+        created_at, post_id = position
+        query = query.filter(or_(
+            BlogPost.created_at < created_at,
+            db.and_(BlogPost.created_at == created_at, BlogPost.id < post_id)
+        ))
+    posts = query.order_by(BlogPost.created_at.desc(), BlogPost.id.desc()).limit(limit + 1).all()
+    next_cursor = _encode_feed_cursor(posts[limit - 1]) if len(posts) > limit else None
+    return posts[:limit], next_cursor
+
+def get_user_log_page(model, user_id, before=None, limit=USER_LOG_PAGE_SIZE):
+    """
+    One page of a user's JournalEntry/VoiceLog rows, newest first.
+
+    Same keyset scheme as get_blog_feed, served by the (user_id, created_at)
+    index. Returns (rows, next_cursor).
+    """
+    query = model.query.filter(model.user_id == user_id)
+    position = _decode_feed_cursor(before, id_type=str) if before else None
+    if position:
+        created_at, row_id = position
+        query = query.filter(or_(
+            model.created_at < created_at,
+            db.and_(model.created_at == created_at, model.id < row_id)
+        ))
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+    next_cursor = _encode_feed_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def get_blog_insights():
+    """Community totals from the counter columns plus the most engaging published post."""
+    total_posts, total_likes, total_comments = db.session.query(
+        func.count(BlogPost.id),
+        func.coalesce(func.sum(BlogPost.like_count), 0),
+        func.coalesce(func.sum(BlogPost.comment_count), 0)
+    ).one()
+    total_views = db.session.query(func.coalesce(func.sum(BlogPost.views), 0)).filter(
+        BlogPost.is_published.is_(True)
+    ).scalar()
+    most_popular_post = BlogPost.query.options(joinedload(BlogPost.author)).filter(
+        BlogPost.is_published.is_(True)
+    ).order_by(BlogPost.engagement_score.desc(), BlogPost.id.desc()).first()
+    return {
+        'total_posts': total_posts,
+        'total_likes': total_likes,
+        'total_comments': total_comments,
+        'total_views': total_views,
+        'most_popular_post': most_popular_post
+    }
+
 # Helper functions for analytics
 def get_user_wellness_trend(user_id, days=30):
     """Get wellness trend for a specific user over the last N days"""
@@ -490,12 +954,136 @@ def get_user_wellness_trend(user_id, days=30):
         'assessments': assessments
     }
 
-def get_institutional_summary(institution, db, days_active=7, days_risk=7, days_assessments=30):
-    """Get summary statistics for an institution"""
-    users = User.query.filter_by(institution=institution, role='patient').all()
-    user_ids = [u.id for u in users]
+def latest_per_user_subquery(model, user_ids, order_by, user_column=None):
+    """
+    Subquery of `model` rows for `user_ids` numbered per user by `order_by`.
+
+    Rows with rn == 1 are each user's latest; ties are broken by id.
+    `user_ids` may be a list or an id subquery.
+    """
+    user_column = user_column if user_column is not None else model.user_id
+    rn = func.row_number().over(partition_by=user_column, order_by=(order_by, model.id.desc())).label('rn')
+    return db.session.query(model, rn).filter(user_column.in_(user_ids)).subquery()
+
+def latest_per_user(model, user_ids, order_by, user_column=None):
+    """Batch-load the latest `model` row for each of `user_ids` in one query: {user_id: row}."""
+    if isinstance(user_ids, (list, tuple, set)):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+    user_column = user_column if user_column is not None else model.user_id
+    latest = latest_per_user_subquery(model, user_ids, order_by, user_column)
+    rows = db.session.query(aliased(model, latest)).filter(latest.c.rn == 1).all()
+    return {getattr(row, user_column.key): row for row in rows}
+
+def _activity_user_ids(since, include_music=True, until=None):
+    """UNION of user ids with any logged activity on or after `since` (and before `until`)."""
+    since_dt = datetime.combine(since, datetime.min.time())
+    until_dt = datetime.combine(until, datetime.min.time()) if until else None
+    sources = [
+        (DigitalDetoxLog.user_id, DigitalDetoxLog.date, since, until),
+        (Assessment.user_id, Assessment.created_at, since_dt, until_dt),
+        (MedicationLog.user_id, MedicationLog.taken_at, since_dt, until_dt),
+        (BreathingExerciseLog.user_id, BreathingExerciseLog.created_at, since_dt, until_dt),
+        (YogaLog.user_id, YogaLog.created_at, since_dt, until_dt),
+    ]
+    if include_music:
+        sources.append((MusicTherapyLog.user_id, MusicTherapyLog.created_at, since_dt, until_dt))
+
+    selects = []
+    for user_id, column, start, end in sources:
+        query = select(user_id).where(column >= start)
+        if end is not None:
+            query = query.where(column < end)
+        selects.append(query)
+    return union(*selects).subquery()
+
+
+def _wellness_score_expr():
+    """Per-assessment wellness on a 0-10 scale (NULL for unscored types)."""
+    score = cast(Assessment.score, Float)
+    return case(
+        # Invert score: lower assessment score = higher wellness
+        (Assessment.assessment_type == 'GAD-7', (1 - score / 21) * 10),
+        (Assessment.assessment_type == 'PHQ-9', (1 - score / 27) * 10),
+        # Scale mood (1-5) to 1-10
+        (Assessment.assessment_type == 'Daily Mood', score * 2),
+        else_=None
+    )
+
+
+def _institutional_summary_query(institution, days_active, days_risk, days_assessments, include_music=True, as_of=None):
+    today = as_of or datetime.now().date()
+    # Historical summaries only count rows up to the end of `as_of`
+    until = today + timedelta(days=1) if as_of else None
+    until_dt = datetime.combine(until, datetime.min.time()) if until else None
+    active_start_date = today - timedelta(days=days_active)
+    risk_start_date = today - timedelta(days=days_risk)
+    assessment_start_date = today - timedelta(days=days_assessments)
+
+    patient_ids = select(User.id).where(User.institution == institution, User.role == 'patient')
+    if until_dt:
+        patient_ids = patient_ids.where(or_(User.created_at.is_(None), User.created_at < until_dt))
+    activity = _activity_user_ids(active_start_date, include_music, until)
+
+    detox_window = [DigitalDetoxLog.user_id.in_(patient_ids), DigitalDetoxLog.date >= risk_start_date]
+    assessment_window = [
+        Assessment.user_id.in_(patient_ids),
+        Assessment.created_at >= datetime.combine(assessment_start_date, datetime.min.time()),
+        Assessment.score.isnot(None)
+    ]
+    # Assuming provider_id in Appointment refers to the institution's providers
+    appointment_window = [Appointment.provider_id.in_(patient_ids), Appointment.date >= active_start_date]
+    if until:
+        detox_window.append(DigitalDetoxLog.date < until)
+        assessment_window.append(Assessment.created_at < until_dt)
+        appointment_window.append(Appointment.date < until)
+
+    # High-risk users: average screen time above 8 hours over the risk window
+    high_risk = select(DigitalDetoxLog.user_id).where(*detox_window).group_by(
+        DigitalDetoxLog.user_id
+    ).having(func.avg(DigitalDetoxLog.screen_time_hours) > 8).subquery()
+
+    return select(
+        select(func.count()).select_from(patient_ids.subquery()).scalar_subquery().label('total_users'),
+        select(func.count(func.distinct(activity.c.user_id))).where(
+            activity.c.user_id.in_(patient_ids)
+        ).scalar_subquery().label('active_users'),
+        select(func.avg(DigitalDetoxLog.screen_time_hours)).where(*detox_window).scalar_subquery().label('avg_screen_time'),
+        select(func.count()).select_from(high_risk).scalar_subquery().label('high_risk_users'),
+        select(func.avg(_wellness_score_expr())).where(*assessment_window).scalar_subquery().label('avg_wellness_score'),
+        select(func.count()).where(*appointment_window).scalar_subquery().label('appointments'),
+        select(func.count().filter(Appointment.status == 'completed')).where(
+            *appointment_window
+        ).scalar_subquery().label('completed_appointments')
+    )
+
 
-    if not user_ids:
+def get_institutional_summary(institution, db, days_active=7, days_risk=7, days_assessments=30, as_of=None):
+    """
+    Get summary statistics for an institution.
+
+    Computed as one aggregate statement over subqueries (patients of the
+    institution, a UNION of activity sources, CASE-based wellness scoring), so no
+    ORM objects or id lists are loaded into Python. Pass `as_of` (a date) to get
+    the summary as it stood at the end of that day.
+    """
+    try:
+        row = db.session.execute(
+            _institutional_summary_query(institution, days_active, days_risk, days_assessments, as_of=as_of)
+        ).one()
+    except OperationalError as e:
+        # If the music_therapy_logs table doesn't exist (e.g., migrations not applied),
+        # treat it as zero activity instead of crashing the provider dashboard.
+        logger.warning(f"Database table missing or inaccessible when querying music therapy logs: {e}")
+        db.session.rollback()
+        row = db.session.execute(
+            _institutional_summary_query(institution, days_active, days_risk, days_assessments,
+                                         include_music=False, as_of=as_of)
+        ).one()
+
+    total_users = row.total_users or 0
+    if not total_users:
         return {
             'total_users': 0,
             'active_users': 0,
@@ -508,128 +1096,22 @@ def get_institutional_summary(institution, db, days_active=7, days_risk=7, days_
             'satisfaction_score': 0.0
         }
 
-    # Define timeframes
-    active_start_date = datetime.now().date() - timedelta(days=days_active)
-    risk_start_date = datetime.now().date() - timedelta(days=days_risk)
-    assessment_start_date = datetime.now().date() - timedelta(days=days_assessments)
-
-    # --- Active Users and Engagement Rate ---
-    # Consider various activities for engagement
-    active_detox_users = db.session.query(DigitalDetoxLog.user_id).filter(
-        DigitalDetoxLog.user_id.in_(user_ids),
-        DigitalDetoxLog.date >= active_start_date
-    ).distinct().all()
-    active_assessment_users = db.session.query(Assessment.user_id).filter(
-        Assessment.user_id.in_(user_ids),
-        Assessment.created_at >= datetime.combine(active_start_date, datetime.min.time())
-    ).distinct().all()
-    active_medication_users = db.session.query(MedicationLog.user_id).filter(
-        MedicationLog.user_id.in_(user_ids),
-        MedicationLog.taken_at >= datetime.combine(active_start_date, datetime.min.time())
-    ).distinct().all()
-    active_breathing_users = db.session.query(BreathingExerciseLog.user_id).filter(
-        BreathingExerciseLog.user_id.in_(user_ids),
-        BreathingExerciseLog.created_at >= datetime.combine(active_start_date, datetime.min.time())
-    ).distinct().all()
-    active_yoga_users = db.session.query(YogaLog.user_id).filter(
-        YogaLog.user_id.in_(user_ids),
-        YogaLog.created_at >= datetime.combine(active_start_date, datetime.min.time())
-    ).distinct().all()
-    try:
-        active_music_users = db.session.query(MusicTherapyLog.user_id).filter(
-            MusicTherapyLog.user_id.in_(user_ids),
-            MusicTherapyLog.created_at >= datetime.combine(active_start_date, datetime.min.time())
-        ).distinct().all()
-    except OperationalError as e:
-        # If the music_therapy_logs table doesn't exist (e.g., migrations not applied),
-        # treat as zero activity instead of crashing the provider dashboard.
-        logger.warning(f"Database table missing or inaccessible when querying music therapy logs: {e}")
-        active_music_users = []
-
-    all_active_user_ids = set()
-    for result in active_detox_users + active_assessment_users + active_medication_users + active_breathing_users + active_yoga_users + active_music_users:
-        all_active_user_ids.add(result[0])
-
-    active_users_count = len(all_active_user_ids)
-    engagement_rate = round((active_users_count / len(users)) * 100, 1) if users else 0.0
-
-    # --- Average Screen Time ---
-    avg_screen_time = db.session.query(func.avg(DigitalDetoxLog.screen_time_hours)).filter(
-        DigitalDetoxLog.user_id.in_(user_ids),
-        DigitalDetoxLog.date >= risk_start_date
-    ).scalar() or 0.0
-
-    # --- High-Risk Users (screen time > 8 hours average, or low mood score) ---
-    # Efficiently calculate average screen time for each user
-    user_avg_screen_times = db.session.query(
-        DigitalDetoxLog.user_id,
-        func.avg(DigitalDetoxLog.screen_time_hours)
-    ).filter(
-        DigitalDetoxLog.user_id.in_(user_ids),
-        DigitalDetoxLog.date >= risk_start_date
-    ).group_by(DigitalDetoxLog.user_id).all()
-
-    high_risk_count = 0
-    for user_id, avg_st in user_avg_screen_times:
-        if avg_st and avg_st > 8:
-            high_risk_count += 1
-        # Add other risk factors here, e.g., low mood score from RPMData
-        # For example:
-        # latest_rpm = RPMData.query.filter_by(user_id=user_id).order_by(RPMData.date.desc()).first()
-        # if latest_rpm and latest_rpm.mood_score and latest_rpm.mood_score < 4:
-        #     high_risk_count += 1
-
-    # --- Average Wellness Score (based on recent assessments) ---
-    recent_assessments = Assessment.query.filter(
-        Assessment.user_id.in_(user_ids),
-        Assessment.created_at >= datetime.combine(assessment_start_date, datetime.min.time())
-    ).all()
-
-    total_wellness_score = 0
-    scored_assessments_count = 0
-    for assessment in recent_assessments:
-        # Assuming a simple mapping for GAD-7/PHQ-9 to a 1-10 wellness scale
-        # This is a simplified example; a more robust calculation might be needed
-        if assessment.assessment_type in ['GAD-7', 'PHQ-9'] and assessment.score is not None:
-            # Invert score: lower assessment score = higher wellness
-            max_score = 21 if assessment.assessment_type == 'GAD-7' else 27
-            wellness_contribution = (1 - (assessment.score / max_score)) * 10 # Scale to 0-10
-            total_wellness_score += wellness_contribution
-            scored_assessments_count += 1
-        elif assessment.assessment_type == 'Daily Mood' and assessment.score is not None:
-            total_wellness_score += assessment.score * 2 # Scale mood (1-5) to 1-10
-            scored_assessments_count += 1
-
-    avg_wellness_score = round(total_wellness_score / scored_assessments_count, 1) if scored_assessments_count > 0 else 0.0
-
-    # --- Average Session Duration and Completion Rate (Appointments) ---
-    all_appointments = Appointment.query.filter(
-        Appointment.provider_id.in_(user_ids), # Assuming provider_id in Appointment refers to the institution's providers
-        Appointment.date >= active_start_date
-    ).all()
-
-    total_session_duration = 0 # Placeholder, as Appointment model doesn't have duration
-    completed_appointments = 0
-    for appt in all_appointments:
-        # Placeholder for duration, assuming an average session length if not stored
-        total_session_duration += 45 # Assuming 45 minutes per session
-        if appt.status == 'completed': # Assuming a 'completed' status for appointments
-            completed_appointments += 1
-
-    avg_session_duration = round(total_session_duration / len(all_appointments), 1) if all_appointments else 0.0
-    completion_rate = round((completed_appointments / len(all_appointments)) * 100, 1) if all_appointments else 0.0
+    appointments = row.appointments or 0
+    # Appointment model doesn't store duration; assume 45 minutes per session
+    avg_session_duration = 45.0 if appointments else 0.0
+    completion_rate = round((row.completed_appointments / appointments) * 100, 1) if appointments else 0.0
 
     # --- Patient Satisfaction Score (Placeholder) ---
     # This would typically come from a separate feedback/survey model
     satisfaction_score = 4.2 # Placeholder for now
 
     return {
-        'total_users': len(users),
-        'active_users': active_users_count,
-        'avg_screen_time': round(avg_screen_time, 1),
-        'high_risk_users': high_risk_count,
-        'engagement_rate': engagement_rate,
-        'avg_wellness_score': avg_wellness_score,
+        'total_users': total_users,
+        'active_users': row.active_users or 0,
+        'avg_screen_time': round(row.avg_screen_time or 0.0, 1),
+        'high_risk_users': row.high_risk_users or 0,
+        'engagement_rate': round((row.active_users / total_users) * 100, 1),
+        'avg_wellness_score': round(row.avg_wellness_score, 1) if row.avg_wellness_score is not None else 0.0,
         'avg_session_duration': avg_session_duration,
         'completion_rate': completion_rate,
         'satisfaction_score': satisfaction_score
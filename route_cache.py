@@ -0,0 +1,191 @@
+"""
+Response/data caching for hot read endpoints on top of the Flask-Caching
+instance in extensions.py.
+
+Keys are explicit about scope: `scope='global'` entries are shared by every
+user, `scope='user'` entries include the session user id. Extra key parts
+(`vary`) cover things like the institution or a data-file mtime.
+
+Entries carry tags. Each tag has a version token stored in the same cache
+backend, and an entry is a hit only while all of its tags still have the
+versions it was stored with. `invalidate('blog')` therefore drops every entry
+tagged 'blog' in every process sharing the backend, without enumerating keys.
+Model writes invalidate tags automatically: objects flushed in a session are
+mapped to tags by TAGGERS and the tags are bumped after the commit.
+
+The backend is configured with CACHE_TYPE (SimpleCache is per process; use
+FileSystemCache with CACHE_DIR, or RedisCache with CACHE_REDIS_URL, when
+running several workers).
+"""
+import hashlib
+import json
+import logging
+import uuid
+from functools import wraps
+
+from flask import request, session, current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from extensions import cache
+from models import BlogPost, BlogLike, BlogComment, BlogInsight, BinauralTrack, InstitutionalAnalytics
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'rc:'
+TAG_PREFIX = 'rc-tag:'
+
+
+def _tag_key(tag):
+    return f"{TAG_PREFIX}{tag}"
+
+
+def _new_version():
+    return uuid.uuid4().hex[:12]
+
+
+def tag_versions(tags):
+    """Current version token per tag, creating tokens for tags seen for the first time."""
+    tags = sorted(set(tags))
+    if not tags:
+        return {}
+    versions = dict(zip(tags, cache.get_many(*[_tag_key(t) for t in tags])))
+    for tag, version in versions.items():
+        if version is None:
+            # Never reuse a token, even if the old one was evicted
+            versions[tag] = _new_version()
+            cache.set(_tag_key(tag), versions[tag], timeout=0)
+    return versions
+
+
+def invalidate(*tags):
+    """Expire every entry carrying any of `tags`."""
+    for tag in set(tags):
+        cache.set(_tag_key(tag), _new_version(), timeout=0)
+
+
+def make_key(name, scope='global', vary=()):
+    """Cache key for `name`; scope is 'global' or 'user' (keyed by the session user id)."""
+    if scope == 'user':
+        owner = f"user:{session.get('user_id', 'anon')}"
+    elif scope == 'global':
+        owner = 'global'
+    else:
+        raise ValueError(f"Unknown cache scope: {scope}")
+    digest = hashlib.sha1(json.dumps(list(vary), sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return f"{KEY_PREFIX}{name}:{owner}:{digest}"
+
+
+def _get(key):
+    entry = cache.get(key)
+    if not entry:
+        return None
+    stored_versions, value = entry
+    if stored_versions and tag_versions(stored_versions) != stored_versions:
+        return None
+    return value
+
+
+def _set(key, value, versions, timeout=None):
+    cache.set(key, (versions, value), timeout=timeout)
+
+
+def get_or_set(name, builder, scope='global', vary=(), tags=(), timeout=None):
+    """
+    Cached result of `builder()`; the value must be picklable (plain data, not ORM objects).
+
+    Tag versions are read before building, so a write that lands while the value
+    is being built makes the stored entry stale instead of hiding the write.
+    """
+    try:
+        key = make_key(name, scope, vary)
+        value = _get(key)
+        if value is not None:
+            return value
+        versions = tag_versions(tags)
+    except Exception as e:
+        logger.warning(f"Cache lookup failed for {name}: {e}")
+        return builder()
+    value = builder()
+    try:
+        _set(key, value, versions, timeout)
+    except Exception as e:
+        logger.warning(f"Cache store failed for {name}: {e}")
+    return value
+
+
+def _request_vary():
+    parts = [request.view_args or {}, sorted(request.args.items(multi=True))]
+    if request.method != 'GET':
+        parts.append(request.get_json(silent=True))
+    return parts
+
+
+def cached_json(name, scope='global', tags=(), timeout=None, vary=None):
+    """
+    Cache a JSON view's successful (200) responses.
+
+    The key covers the view args, query string and, for non-GET requests, the
+    JSON body; `vary` is an optional callable adding more key parts.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                key = make_key(name, scope, _request_vary() + list(vary() if vary else ()))
+                hit = _get(key)
+                versions = tag_versions(tags) if hit is None else None
+            except Exception as e:
+                logger.warning(f"Cache lookup failed for {name}: {e}")
+                return view(*args, **kwargs)
+            if hit is not None:
+                body, mimetype = hit
+                response = current_app.response_class(body, status=200, mimetype=mimetype)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.direct_passthrough:
+                try:
+                    _set(key, (response.get_data(), response.mimetype), versions, timeout)
+                except Exception as e:
+                    logger.warning(f"Cache store failed for {name}: {e}")
+                response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+# Model -> tags invalidated when an instance is inserted, updated or deleted
+TAGGERS = {
+    BlogPost: lambda obj: ('blog', f'blog_post:{obj.id}'),
+    BlogLike: lambda obj: ('blog', f'blog_post:{obj.post_id}'),
+    BlogComment: lambda obj: ('blog', f'blog_post:{obj.post_id}'),
+    BlogInsight: lambda obj: ('analytics',),
+    InstitutionalAnalytics: lambda obj: (f'analytics:{obj.institution}',),
+    BinauralTrack: lambda obj: ('binaural_tracks',),
+}
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_tags(session_, flush_context):
+    tags = session_.info.setdefault('route_cache_tags', set())
+    for obj in list(session_.new) + list(session_.dirty) + list(session_.deleted):
+        tagger = TAGGERS.get(type(obj))
+        if tagger is not None:
+            tags.update(tagger(obj))
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session_):
+    tags = session_.info.pop('route_cache_tags', None)
+    if tags and has_app_context() and cache in current_app.extensions.get('cache', {}):
+        try:
+            invalidate(*tags)
+        except Exception as e:
+            logger.warning(f"Cache invalidation failed for {sorted(tags)}: {e}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session_):
+    session_.info.pop('route_cache_tags', None)
@@ -7,6 +7,9 @@ from .blog import blog_bp
 from .assessment import bp as assessment_bp
 from .mood import bp as mood_bp
 from .chat import bp as chat_bp
+from .jobs import bp as jobs_bp
+from .series import bp as series_bp
+from .leaderboard import bp as leaderboard_bp
 
 # List of all blueprints for easy registration
 all_blueprints = [
@@ -17,5 +20,8 @@ all_blueprints = [
     blog_bp,
     assessment_bp,
     mood_bp,
-    chat_bp
+    chat_bp,
+    jobs_bp,
+    series_bp,
+    leaderboard_bp
 ]
\ No newline at end of file
@@ -1,37 +1,40 @@
 from flask import Blueprint, render_template, session, redirect, url_for, flash, request, jsonify
-from models import BlogPost, BlogComment, BlogLike, db, User
+from models import BlogPost, BlogComment, BlogLike, db, User, get_blog_feed, get_blog_insights
 from decorators import login_required
+from view_counter import view_counter
+from route_cache import get_or_set
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
 
 blog_bp = Blueprint('blog', __name__, url_prefix='/blog')
 
+BLOG_PAGE_CACHE_SECONDS = 60
+
+def load_blog_page(before=None):
+    """Feed page and community insights as plain data, cached globally and dropped on any blog write."""
+    def build():
+        posts, next_cursor = get_blog_feed(before=before)
+        insights = get_blog_insights()
+        if insights['most_popular_post'] is not None:
+            insights['most_popular_post'] = insights['most_popular_post'].to_dict()
+        return {'posts': [post.to_dict() for post in posts], 'next_cursor': next_cursor, 'insights': insights}
+    return get_or_set('blog_page', build, vary=[before], tags=('blog',), timeout=BLOG_PAGE_CACHE_SECONDS)
+
 @blog_bp.route('/')
 def blog_list():
+    before = request.args.get('before')
     try:
-        posts = BlogPost.query.filter_by(is_published=True).order_by(BlogPost.created_at.desc()).all()
-        # Get blog insights for display
-        insights = {
-            'total_posts': BlogPost.query.count(),
-            'total_likes': 0,
-            'total_comments': 0,
-            'total_views': sum([post.views for post in posts]) if posts else 0,
-            'most_popular_post': None
-        }
-        if posts:
-            insights['most_popular_post'] = max(posts, key=lambda p: p.views) if posts else None
+        page = load_blog_page(before)
     except SQLAlchemyError as e:
-        posts = []
-        insights = None
-    return render_template('blog_list.html', posts=posts, insights=insights)
+        page = {'posts': [], 'next_cursor': None, 'insights': None}
+    return render_template('blog_list.html', before=before, **page)
 
 @blog_bp.route('/<int:post_id>')
 def blog_detail(post_id):
     post = BlogPost.query.get_or_404(post_id)
     
-    # Increment view count
-    post.views += 1
-    db.session.commit()
+    # Count the view in memory; it is written by the periodic bulk flush
+    view_counter.hit(post_id)
     
     # Get comments for this post
     comments = BlogComment.query.filter_by(post_id=post_id).order_by(BlogComment.created_at.asc()).all()
@@ -46,6 +49,7 @@ def blog_detail(post_id):
     
     return render_template('blog_detail.html', 
                          post=post, 
+                         view_count=(post.views or 0) + view_counter.pending(post_id),
                          comments=comments, 
                          user_has_liked=user_has_liked)
 
@@ -124,15 +128,17 @@ def blog_like(post_id):
     try:
         if existing_like:
             db.session.delete(existing_like)
+            BlogPost.bump_counters(post_id, likes=-1)
             liked = False
         else:
             new_like = BlogLike(user_id=user_id, post_id=post_id)
             db.session.add(new_like)
+            BlogPost.bump_counters(post_id, likes=1)
             liked = True
         
         db.session.commit()
         
-        like_count = BlogLike.query.filter_by(post_id=post_id).count()
+        like_count = post.like_count
         
         return jsonify({
             'success': True,
@@ -170,9 +176,10 @@ def blog_comment(post_id):
             content=content
         )
         db.session.add(new_comment)
+        BlogPost.bump_counters(post_id, comments=1)
         db.session.commit()
         
-        comment_count = BlogComment.query.filter_by(post_id=post_id).count()
+        comment_count = post.comment_count
         
         user = User.query.get(user_id)
         
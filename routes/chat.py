@@ -1,8 +1,8 @@
 from flask import Blueprint, request, jsonify, current_app
 from ai.service import ask_with_severity
+from ai.executor import run_coroutine
 from appointment import create_appointment_stub
 from models import Notification, User
-import asyncio
 
 bp = Blueprint('chat_api', __name__, url_prefix='/api')
 
@@ -19,8 +19,8 @@ def chat_handler():
         payload = request.get_json(force=True)
         text = payload.get('message','')
         user_id = payload.get('user_id')
-        # call ask_with_severity (it's async wrapper but here run synchronously)
-        resp = asyncio.run(ask_with_severity(text, user_id=user_id))
+        # run ask_with_severity on the shared AI loop instead of a new loop per request
+        resp = run_coroutine(ask_with_severity(text, user_id=user_id))
         out = {
             "ok": True,
             "reply": resp.get('reply'),
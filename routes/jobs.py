@@ -0,0 +1,60 @@
+from flask import Blueprint, request, jsonify, session
+from decorators import login_required, role_required
+from extensions import db
+from models import BackgroundJob, User
+from datetime import datetime
+import job_queue
+
+bp = Blueprint('jobs_api', __name__, url_prefix='/api/jobs')
+
+def _institution_patient_ids():
+    """Ids of the patients of the session provider's institution; jobs are only shown for these."""
+    institution = session.get('user_institution', 'Sample University')
+    return db.session.query(User.id).filter(User.role == 'patient', User.institution == institution)
+
+@bp.route('/dead-letter', methods=['GET'])
+@login_required
+@role_required('provider')
+def dead_letter_jobs():
+    """List background jobs of the provider's institution's patients that exhausted their retries."""
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    job_type = request.args.get('job_type')
+    patient_ids = _institution_patient_ids()
+
+    query = BackgroundJob.query.filter_by(status='dead').filter(BackgroundJob.user_id.in_(patient_ids))
+    if job_type:
+        query = query.filter_by(job_type=job_type)
+    jobs = query.order_by(BackgroundJob.updated_at.desc()).limit(limit).all()
+
+    return jsonify({
+        'success': True,
+        'jobs': [job.to_dict() for job in jobs],
+        'counts': job_queue.queue_stats(patient_ids)
+    })
+
+@bp.route('/stats', methods=['GET'])
+@login_required
+@role_required('provider')
+def job_stats():
+    """Background job counts by status for the provider's institution's patients."""
+    return jsonify({'success': True, 'counts': job_queue.queue_stats(_institution_patient_ids())})
+
+@bp.route('/<int:job_id>/retry', methods=['POST'])
+@login_required
+@role_required('provider')
+def retry_job(job_id):
+    """Requeue a dead-lettered job with a fresh set of attempts."""
+    job = BackgroundJob.query.filter(
+        BackgroundJob.id == job_id, BackgroundJob.user_id.in_(_institution_patient_ids())
+    ).first()
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    if job.status != 'dead':
+        return jsonify({'success': False, 'message': f'Job is {job.status}, only dead jobs can be retried'}), 400
+
+    job.status = 'pending'
+    job.attempts = 0
+    job.run_after = datetime.utcnow()
+    job.locked_at = None
+    db.session.commit()
+    return jsonify({'success': True, 'job': job.to_dict()})
@@ -0,0 +1,42 @@
+from flask import Blueprint, request, jsonify, session
+from decorators import api_login_required
+from leaderboard import leaderboards, PERIODS
+from models import User
+
+bp = Blueprint('leaderboard', __name__, url_prefix='/api')
+
+MAX_LIMIT = 100
+
+@bp.route('/leaderboard', methods=['GET'])
+@api_login_required
+def get_leaderboard():
+    """
+    Top users of the session user's institution by points, for
+    period=weekly or all_time, with the session user's own standing.
+    """
+    period = request.args.get('period', 'all_time')
+    if period not in PERIODS:
+        return jsonify({'ok': False, 'error': f"period must be one of {', '.join(PERIODS)}"}), 400
+    limit = max(1, min(request.args.get('limit', 10, type=int), MAX_LIMIT))
+
+    user_id = session['user_id']
+    institution = session.get('user_institution')
+    if request.args.get('institution', institution) != institution:
+        # Other institutions' boards (names and points) are never readable
+        return jsonify({'ok': False, 'error': 'Insufficient permissions'}), 403
+
+    entries = leaderboards.top(institution, period, limit)
+    # Only first names are shown to other users
+    names = dict(User.query.with_entities(User.id, User.name).filter(User.id.in_([e[1] for e in entries])).all()) if entries else {}
+    standing = leaderboards.standing(user_id, period)
+
+    return jsonify({
+        'ok': True,
+        'institution': institution,
+        'period': period,
+        'entries': [
+            {'rank': rank, 'name': (names.get(uid) or '').split(' ')[0], 'points': points, 'is_me': uid == user_id}
+            for rank, uid, points in entries
+        ],
+        'me': {'rank': standing[0], 'points': standing[1], 'of': standing[2]} if standing else None
+    })
@@ -1,18 +1,19 @@
 from flask import Blueprint, render_template, session, redirect, url_for, flash, request, jsonify
 from models import (User, Gamification, DigitalDetoxLog, Assessment, Goal, Medication, 
                 MedicationLog, BreathingExerciseLog, YogaLog, ProgressRecommendation, 
-                Prescription, MoodLog, RPMData, Appointment, db)
+                Prescription, MoodLog, RPMData, Appointment, JournalEntry, VoiceLog, UserActivityStats,
+                get_user_log_page, db)
 from decorators import patient_required, login_required
 from sqlalchemy.orm import joinedload
-from datetime import datetime, date, timedelta, timezone
+from datetime import datetime, date, timezone
 import json
+import os
 import ai.service as ai_service
+from enrichment_jobs import enqueue_assessment_insights, enqueue_journal_insights
+from route_cache import cached_json
 from gamification_engine import award_points
+from timeseries import assessment_series
 import logging
-import uuid
-
-# Import shared data storage instead of importing from app to avoid circular imports
-from shared_data import patient_journal_entries, patient_voice_logs_data
 
 # TextBlob for sentiment analysis
 try:
@@ -23,34 +24,6 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
-def get_ai_journal_suggestions(title, content):
-    """Get AI-powered suggestions for journal entries with optimized prompts."""
-    try:
-        # Simple sentiment check for context (optional, can be improved)
-        sentiment = "Neutral" 
-        if TEXTBLOB_AVAILABLE:
-             try:
-                 blob = TextBlob(content)
-                 if blob.sentiment.polarity > 0.1: sentiment = "Positive"
-                 elif blob.sentiment.polarity < -0.1: sentiment = "Negative"
-             except: pass
-
-        # Use the dedicated AI service function
-        suggestions = ai_service.generate_journal_insights(title, content, sentiment)
-
-        # Clean up and format the response for better readability
-        suggestions = suggestions.strip()[:800]  # Limit length
-
-        # Ensure we have meaningful content
-        if len(suggestions) < 50:  # Too short, probably error
-            suggestions = "Thank you for sharing your thoughts. Consider discussing these feelings with a trusted friend or mental health professional."
-
-        return suggestions
-
-    except Exception as e:
-        logger.warning(f"AI suggestion generation failed: {e}")
-        return "Thank you for sharing your thoughts. Consider discussing these feelings with a trusted friend or mental health professional."
-
 # Create the patient blueprint with the name 'patient' and URL prefix
 patient_bp = Blueprint('patient', __name__, url_prefix='/patient')
 
@@ -214,8 +187,8 @@ def log_medication():
         if not existing_log:
             new_log = MedicationLog(user_id=user_id, medication_id=medication_id)
             db.session.add(new_log)
-            db.session.commit()
             award_points(user_id, 10, 'log_medication')
+            db.session.commit()
             return jsonify({'success': True, 'message': 'Medication logged successfully!'})
         else:
             return jsonify({'success': False, 'message': 'Medication already logged for today.'})
@@ -243,8 +216,8 @@ def breathing():
                     created_at=datetime.now(timezone.utc)
                 )
                 db.session.add(new_log)
-                db.session.commit()
                 award_points(user_id, 20, 'breathing_exercise')
+                db.session.commit()
                 flash(f'Your {exercise_name} session has been logged!', 'success')
             except ValueError:
                 flash('Invalid duration. Please enter a number.', 'error')
@@ -252,25 +225,7 @@ def breathing():
 
     recent_logs = BreathingExerciseLog.query.filter_by(user_id=user_id).order_by(BreathingExerciseLog.created_at.desc()).limit(10).all()
     
-    all_logs = BreathingExerciseLog.query.filter_by(user_id=user_id).all()
-    total_sessions = len(all_logs)
-    total_minutes = sum(log.duration_minutes for log in all_logs)
-    
-    streak = 0
-    if all_logs:
-        dates = sorted([log.created_at.date() for log in all_logs], reverse=True)
-        current_date = date.today()
-        for i, log_date in enumerate(dates):
-            if log_date == current_date - timedelta(days=i):
-                streak += 1
-            else:
-                break
-    
-    stats = {
-        'total_sessions': total_sessions,
-        'total_minutes': total_minutes,
-        'streak': streak
-    }
+    stats = UserActivityStats.page_stats(user_id, 'breathing')
     
     return render_template('breathing.html', 
                          user_name=session['user_name'],
@@ -298,8 +253,8 @@ def yoga():
                     created_at=datetime.now(timezone.utc)
                 )
                 db.session.add(new_log)
-                db.session.commit()
                 award_points(user_id, 20, 'yoga_session')
+                db.session.commit()
                 flash(f'Your {session_name} session has been logged!', 'success')
             except ValueError:
                 flash('Invalid duration. Please enter a number.', 'error')
@@ -307,27 +262,7 @@ def yoga():
 
     recent_logs = YogaLog.query.filter_by(user_id=user_id).order_by(YogaLog.created_at.desc()).limit(10).all()
     
-    all_logs = YogaLog.query.filter_by(user_id=user_id).all()
-    total_sessions = len(all_logs)
-    total_minutes = sum(log.duration_minutes for log in all_logs)
-    avg_duration = round(total_minutes / total_sessions, 1) if total_sessions > 0 else 0
-    
-    streak = 0
-    if all_logs:
-        dates = sorted([log.created_at.date() for log in all_logs], reverse=True)
-        current_date = date.today()
-        for i, log_date in enumerate(dates):
-            if log_date == current_date - timedelta(days=i):
-                streak += 1
-            else:
-                break
-    
-    stats = {
-        'total_sessions': total_sessions,
-        'total_minutes': total_minutes,
-        'streak': streak,
-        'avg_duration': avg_duration
-    }
+    stats = UserActivityStats.page_stats(user_id, 'yoga')
     
     return render_template('yoga.html', 
                          user_name=session['user_name'],
@@ -385,31 +320,29 @@ def progress():
             goals = Goal.query.filter_by(user_id=user_id).all()
             logger.info(f"Found {len(goals)} goals")
             
-            assessments = Assessment.query.filter_by(user_id=user_id).order_by(Assessment.created_at.desc()).all()
-            logger.info(f"Found {len(assessments)} assessments")
-            
+            latest = Assessment.query.filter_by(user_id=user_id).order_by(Assessment.created_at.desc())
+            latest_assessment = latest.first()
+            latest_gad7 = latest.filter_by(assessment_type='GAD-7').first()
+            latest_phq9 = latest.filter_by(assessment_type='PHQ-9').first()
+            latest_mood = latest.filter_by(assessment_type='Daily Mood').first()
+
             achievements = [goal.title for goal in goals if goal.status == 'completed']
             logger.info(f"Found {len(achievements)} completed goals")
             
         except Exception as e:
             logger.error(f"Error fetching goals or assessments: {str(e)}", exc_info=True)
             return "An error occurred while fetching your data. Please try again later.", 500
-        
-        latest_gad7 = next((a for a in assessments if a.assessment_type == 'GAD-7'), None)
-        latest_phq9 = next((a for a in assessments if a.assessment_type == 'PHQ-9'), None)
-        latest_mood = next((a for a in assessments if a.assessment_type == 'Daily Mood'), None)
 
-        mood_assessments = sorted([a for a in assessments if a.assessment_type == 'Daily Mood'], key=lambda x: x.created_at)[-30:]
+        mood_assessments = latest.filter_by(assessment_type='Daily Mood').limit(30).all()[::-1]
         mood_data = [{'date': m.created_at.strftime('%Y-%m-%d'), 'score': m.score} for m in mood_assessments]
-        
-        gad7_assessments = sorted([a for a in assessments if a.assessment_type == 'GAD-7'], key=lambda x: x.created_at)
-        phq9_assessments = sorted([a for a in assessments if a.assessment_type == 'PHQ-9'], key=lambda x: x.created_at)
 
-        assessment_chart_labels = sorted(list(set([a.created_at.strftime('%Y-%m-%d') for a in gad7_assessments + phq9_assessments])))
-        assessment_chart_gad7_data = [next((a.score for a in gad7_assessments if a.created_at.strftime('%Y-%m-%d') == date), None) for date in assessment_chart_labels]
-        assessment_chart_phq9_data = [next((a.score for a in phq9_assessments if a.created_at.strftime('%Y-%m-%d') == date), None) for date in assessment_chart_labels]
+        # Last GAD-7 / PHQ-9 score of each day, bucketed in SQL
+        chart = assessment_series(user_id)
+        assessment_chart_labels = chart.labels
+        assessment_chart_gad7_data = chart.series['GAD-7']
+        assessment_chart_phq9_data = chart.series['PHQ-9']
 
-        days_since_assessment = (datetime.now(assessments[0].created_at.tzinfo) - assessments[0].created_at).days if assessments and assessments[0].created_at else 'N/A'
+        days_since_assessment = (datetime.now(latest_assessment.created_at.tzinfo) - latest_assessment.created_at).days if latest_assessment and latest_assessment.created_at else 'N/A'
         
         user_data_for_ai = {
             'gad7_score': latest_gad7.score if latest_gad7 else 0,  # Default to 0 instead of 'N/A' for calculations
@@ -524,9 +457,16 @@ def goals():
     goals = Goal.query.filter_by(user_id=user_id).all()
     return render_template('goals.html', user_name=session['user_name'], goals=goals)
 
+def _questions_file_mtime():
+    try:
+        return os.path.getmtime(os.path.join(os.getcwd(), 'static', 'questions.json'))
+    except OSError:
+        return None
+
 @patient_bp.route('/api/assessment/questions/<assessment_type>')
 @login_required
 @patient_required
+@cached_json('assessment_questions', vary=lambda: [_questions_file_mtime()])
 def get_assessment_questions(assessment_type):
     try:
         questions_file_path = os.path.join(os.getcwd(), 'static', 'questions.json')
@@ -614,30 +554,13 @@ def api_save_assessment():
             'message': 'Missing required fields: assessment_type and score are required'
         }), 400
 
-    ai_insights = {}
-    ai_insights_generated_successfully = True
-    try:
-        ai_insights = ai_service.generate_assessment_insights(
-            assessment_type=assessment_type,
-            score=score,
-            responses=responses
-        )
-    except Exception as e:
-        ai_insights_generated_successfully = False
-        ai_insights = {
-            'summary': 'AI insights are currently unavailable. Please try again later.',
-            'recommendations': [],
-            'resources': []
-        }
-
     try:
         assessment = Assessment(
             user_id=user_id,
             assessment_type=assessment_type.upper(),
             score=score,
             responses=responses,
-            contextual_responses=contextual_responses,
-            ai_insights=json.dumps(ai_insights) if ai_insights else None
+            contextual_responses=contextual_responses
         )
         
         db.session.add(assessment)
@@ -652,7 +575,10 @@ def api_save_assessment():
             }), 400
 
         user.last_assessment_at = datetime.now(timezone.utc)
-        
+
+        # Insights are generated in the background and pushed to the user's room
+        db.session.flush()
+        insights_job = enqueue_assessment_insights(assessment)
         db.session.commit()
         
         return jsonify({
@@ -661,16 +587,17 @@ def api_save_assessment():
             'assessment_id': assessment.id,
             'points_earned': 20,
             'total_points': gamification.points,
-            'ai_insights': ai_insights,
-            'ai_insights_generated': ai_insights_generated_successfully
+            'ai_insights': None,
+            'ai_insights_generated': False,
+            'ai_insights_pending': True,
+            'insights_job_id': insights_job.id
         })
         
     except Exception as e:
         db.session.rollback()
         return jsonify({
             'success': False,
-            'message': f'Failed to save assessment: {str(e)}',
-            'insights': ai_insights if 'ai_insights' in locals() else None
+            'message': f'Failed to save assessment: {str(e)}'
         }), 500
 
 @patient_bp.route('/my-prescriptions')
@@ -683,6 +610,20 @@ def my_prescriptions():
                            user_name=session['user_name'],
                            prescriptions=prescriptions)
 
+@patient_bp.route('/api/assessment/<int:assessment_id>/insights')
+@login_required
+@patient_required
+def assessment_insights(assessment_id):
+    """AI insights of one of the user's assessments; polled while the background job runs."""
+    assessment = Assessment.query.filter_by(id=assessment_id, user_id=session['user_id']).first()
+    if assessment is None:
+        return jsonify({'success': False, 'message': 'Assessment not found'}), 404
+    try:
+        insights = json.loads(assessment.ai_insights) if assessment.ai_insights else None
+    except (TypeError, ValueError):
+        insights = None
+    return jsonify({'success': True, 'pending': insights is None, 'ai_insights': insights})
+
 @patient_bp.route('/api/progress', methods=['GET'])
 def get_progress():
     try:
@@ -772,10 +713,9 @@ def log_digital_detox():
         )
 
         db.session.add(new_log)
-        db.session.commit()
-
         # Award points for logging
         award_points(user_id, 15, 'digital_detox_log')
+        db.session.commit()
 
         return jsonify({
             'success': True,
@@ -841,38 +781,34 @@ def patient_journal():
                 logger.warning(f"Sentiment analysis failed: {e}")
                 sentiment_result = 'Neutral'
 
-        # Get AI suggestions for the journal entry
-        ai_suggestions = get_ai_journal_suggestions(title, content)
-
-        # Create journal entry
-        journal_entry = {
-            'id': str(uuid.uuid4()),
-            'title': title,
-            'content': content,
-            'sentiment': sentiment_result,
-            'ai_suggestions': ai_suggestions,
-            'created_at': datetime.now(),
-            'updated_at': datetime.now()
-        }
-
-        # Initialize user's journal entries if not exists
-        if user_id not in patient_journal_entries:
-            patient_journal_entries[user_id] = []
-
-        patient_journal_entries[user_id].append(journal_entry)
+        # Create journal entry; AI suggestions are filled in by a background job
+        journal_entry = JournalEntry(
+            user_id=user_id,
+            title=title,
+            content=content,
+            sentiment=sentiment_result
+        )
+        db.session.add(journal_entry)
+        db.session.flush()
 
         # Award points for journaling
         award_points(user_id, 15, 'journal_entry')
 
+        enqueue_journal_insights(user_id, journal_entry)
+        db.session.commit()
+
         flash('Journal entry saved successfully!', 'success')
         return redirect(url_for('patient.patient_journal'))
 
-    # GET request - display journal entries
-    user_entries = patient_journal_entries.get(user_id, [])
+    # GET request - display one page of journal entries, newest first
+    before = request.args.get('before')
+    user_entries, next_cursor = get_user_log_page(JournalEntry, user_id, before=before)
 
     return render_template('patient_journal.html',
                          user_name=session['user_name'],
-                         journal_entries=user_entries)
+                         journal_entries=user_entries,
+                         before=before,
+                         next_cursor=next_cursor)
 
 @patient_bp.route('/api/save-mood', methods=['POST'])
 @patient_required
@@ -909,27 +845,6 @@ def save_mood():
         else:
             rpm_data.mood_score = mood
         
-        # Update gamification points
-        gamification = Gamification.query.filter_by(user_id=user_id).first()
-        if not gamification:
-            gamification = Gamification(user_id=user_id, points=0, streak=0)
-            db.session.add(gamification)
-            
-        # Add points for mood check-in
-        gamification.points += 10
-        
-        # Check for streak
-        if gamification.last_activity:
-            last_activity = gamification.last_activity.date() if hasattr(gamification.last_activity, 'date') else gamification.last_activity
-            if last_activity == today - timedelta(days=1):
-                gamification.streak += 1
-            elif last_activity < today - timedelta(days=1):
-                gamification.streak = 1
-        else:
-            gamification.streak = 1
-        
-        gamification.last_activity = today
-
         # Update user's last assessment time
         user = db.session.get(User, user_id)
         if not user:
@@ -939,6 +854,9 @@ def save_mood():
             }), 400
 
         user.last_assessment_at = datetime.utcnow()
+
+        # Add points for mood check-in; awarded last so the row lock is held briefly
+        gamification = award_points(user_id, 10, 'mood_checkin', today=today)
         
         db.session.commit()
         
@@ -964,11 +882,14 @@ def patient_voice_logs():
     """Voice logs page for patients."""
     try:
         user_id = session['user_id']
-        user_logs = patient_voice_logs_data.get(user_id, [])
-        
+        before = request.args.get('before')
+        user_logs, next_cursor = get_user_log_page(VoiceLog, user_id, before=before)
+
         return render_template('patient_voice_logs.html',
                              user_name=session.get('user_name', 'User'),
-                             voice_logs=user_logs)
+                             voice_logs=user_logs,
+                             before=before,
+                             next_cursor=next_cursor)
     except Exception as e:
         logger.error(f"Error in patient_voice_logs: {str(e)}")
         flash('An error occurred while loading the voice logs.', 'error')
@@ -1,13 +1,17 @@
 from flask import Blueprint, render_template, session, redirect, url_for, flash, request, jsonify
 from models import (User, Gamification, DigitalDetoxLog, Assessment, Goal, Medication, 
                 MedicationLog, BreathingExerciseLog, YogaLog, ProgressRecommendation, 
-                Prescription, MoodLog, RPMData, Appointment, ClinicalNote, BlogInsight, db, get_institutional_summary)
+                Prescription, MoodLog, RPMData, Appointment, ClinicalNote, BlogInsight, InstitutionToken,
+                db, get_institutional_summary, institution_tokens, latest_per_user, latest_per_user_subquery)
 from decorators import login_required, role_required
 from sqlalchemy.orm import joinedload
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, func, case
 from datetime import datetime, date, timedelta
 import json
-from ai import ask as ai_service
+import ai.service as ai_service
+from analytics_rollup import get_rollup_series, day_screen_time
+from timeseries import assessment_series, summary_series
+from route_cache import get_or_set
 
 provider_bp = Blueprint('provider', __name__, url_prefix='/provider')
 
@@ -17,80 +21,100 @@ def normalize_institution_name(institution_name):
         return ''
     return institution_name.lower().strip()
 
+CASELOAD_PAGE_SIZE = 25
+ANALYTICS_CACHE_SECONDS = 300
+INACTIVE_TASK_LIMIT = 20
+
+def _matching_patient_ids(institution):
+    """Ids of patients whose institution shares a keyword with `institution` (via the token index)."""
+    tokens = institution_tokens(institution)
+    if tokens:
+        conditions = [User.id.in_(
+            db.session.query(InstitutionToken.user_id).filter(InstitutionToken.token.in_(tokens))
+        )]
+    else:
+        conditions = [User.institution == institution]
+    if institution == 'Sample University':
+        # Include patients with no institution if provider is using default
+        conditions.append(or_(User.institution.is_(None), User.institution == ''))
+    return db.session.query(User.id).filter(User.role == 'patient', or_(*conditions))
+
+def _risk_level_expr(latest_detox):
+    return case(
+        (or_(latest_detox.c.screen_time_hours > 8, latest_detox.c.ai_score == 'Needs Improvement'), 'High'),
+        (or_(latest_detox.c.screen_time_hours > 6, latest_detox.c.ai_score == 'Good'), 'Medium'),
+        else_='Low'
+    )
+
+def _caseload_query(institution):
+    """
+    Matching patients joined to only their latest detox log and latest clinical note.
+
+    Latest rows are picked with ROW_NUMBER() window functions restricted to the
+    matching patients, so no other logs or notes are loaded.
+    """
+    patient_ids = _matching_patient_ids(institution)
+
+    latest_detox = latest_per_user_subquery(DigitalDetoxLog, patient_ids, DigitalDetoxLog.date.desc())
+    latest_note = latest_per_user_subquery(ClinicalNote, patient_ids, ClinicalNote.session_date.desc(),
+                                           user_column=ClinicalNote.patient_id)
+
+    query = db.session.query(
+        User.id,
+        User.name,
+        User.email,
+        _risk_level_expr(latest_detox).label('risk_level'),
+        latest_detox.c.date.label('detox_date'),
+        latest_detox.c.ai_score,
+        latest_note.c.session_date
+    ).outerjoin(
+        latest_detox, and_(latest_detox.c.user_id == User.id, latest_detox.c.rn == 1)
+    ).outerjoin(
+        latest_note, and_(latest_note.c.patient_id == User.id, latest_note.c.rn == 1)
+    ).filter(User.id.in_(patient_ids))
+    return query, latest_detox
+
+def _caseload_entry(row):
+    return {
+        'user_id': row.id,
+        'name': row.name,
+        'email': row.email,
+        'risk_level': row.risk_level,
+        'last_session': row.session_date.strftime('%Y-%m-%d') if row.session_date else 'No sessions',
+        'status': 'Active' if row.detox_date and row.detox_date >= date.today() - timedelta(days=7) else 'Inactive',
+        'digital_score': row.ai_score if row.ai_score else 'No data'
+    }
+
 @provider_bp.route('/dashboard')
 @login_required
 @role_required('provider')
 def provider_dashboard():
     institution = session.get('user_institution', 'Sample University')
 
-    # Normalize the provider's institution for better matching
-    normalized_provider_institution = normalize_institution_name(institution)
-
-    # More flexible institution matching for better patient-provider visibility
-    # Split institution name into keywords for partial matching
-    institution_keywords = set(normalized_provider_institution.split())
-
-    # Fetch all patients and filter them based on institution similarity
-    all_patients = User.query.options(
-        joinedload(User.digital_detox_logs),
-        joinedload(User.clinical_notes)
-    ).filter_by(role='patient').all()
-
-    # Filter patients based on institution similarity
-    patients = []
-    for patient in all_patients:
-        patient_institution = patient.institution or ''
-        normalized_patient_institution = normalize_institution_name(patient_institution)
-        patient_keywords = set(normalized_patient_institution.split())
-
-        # Check for similarity (partial match, case-insensitive)
-        if institution_keywords & patient_keywords:  # Intersection of keywords
-            patients.append(patient)
-        elif not patient_institution and institution == 'Sample University':
-            # Include patients with no institution if provider is using default
-            patients.append(patient)
-
-    # If no patients found with flexible matching, fall back to exact match for backward compatibility
-    if not patients:
-        patients = User.query.options(
-            joinedload(User.digital_detox_logs),
-            joinedload(User.clinical_notes)
-        ).filter_by(role='patient', institution=institution).all()
-
-    caseload_data = []
-    for patient in patients:
-        # Get latest detox and session from already loaded relationships (prevents N+1 queries)
-        latest_detox = patient.digital_detox_logs[0] if patient.digital_detox_logs else None
-        latest_session = patient.clinical_notes[0] if patient.clinical_notes else None
-
-        risk_level = 'Low'
-        if latest_detox:
-            if latest_detox.screen_time_hours > 8 or (latest_detox.ai_score and latest_detox.ai_score == 'Needs Improvement'):
-                risk_level = 'High'
-            elif latest_detox.screen_time_hours > 6 or (latest_detox.ai_score and latest_detox.ai_score == 'Good'):
-                risk_level = 'Medium'
-
-        caseload_data.append({
-            'user_id': patient.id,
-            'name': patient.name,
-            'email': patient.email,
-            'risk_level': risk_level,
-            'last_session': latest_session.session_date.strftime('%Y-%m-%d') if latest_session else 'No sessions',
-            'status': 'Active' if latest_detox and latest_detox.date >= date.today() - timedelta(days=7) else 'Inactive',
-            'digital_score': latest_detox.ai_score if latest_detox and latest_detox.ai_score else 'No data'
-        })
-    
-    # --- Apply client-side filters/search if provided ---
+    # --- Server-side filters/search and pagination ---
     search_q = request.args.get('q', '').strip()
     filter_risk = request.args.get('risk', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', CASELOAD_PAGE_SIZE, type=int), 1), 100)
 
-    filtered_caseload = caseload_data
+    caseload_query, latest_detox = _caseload_query(institution)
+    filtered_query = caseload_query
     if search_q:
-        q_lower = search_q.lower()
-        filtered_caseload = [c for c in filtered_caseload if q_lower in (c.get('name') or '').lower() or q_lower in (c.get('email') or '').lower()]
-
+        pattern = f"%{search_q}%"
+        filtered_query = filtered_query.filter(or_(User.name.ilike(pattern), User.email.ilike(pattern)))
     if filter_risk in ('High', 'Medium', 'Low'):
-        filtered_caseload = [c for c in filtered_caseload if c.get('risk_level') == filter_risk]
+        filtered_query = filtered_query.filter(_risk_level_expr(latest_detox) == filter_risk)
+
+    total = filtered_query.order_by(None).count()
+    rows = filtered_query.order_by(User.name.asc(), User.id.asc()).offset((page - 1) * per_page).limit(per_page).all()
+    filtered_caseload = [_caseload_entry(row) for row in rows]
+
+    pagination = {
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': max((total + per_page - 1) // per_page, 1)
+    }
 
     # --- Simple Tasks derivation (quick wins): overdue appointments and inactive follow-ups ---
     tasks = []
@@ -105,9 +129,11 @@ def provider_dashboard():
 
     # Also add patients with no recent activity (>7 days)
     try:
-        for c in caseload_data:
-            if c.get('status') == 'Inactive':
-                tasks.append({'title': f'Check-in with {c.get("name")}', 'patient_id': c.get('user_id'), 'due': '', 'type': 'followup'})
+        inactive = caseload_query.filter(
+            or_(latest_detox.c.date.is_(None), latest_detox.c.date < date.today() - timedelta(days=7))
+        ).order_by(User.name.asc()).limit(INACTIVE_TASK_LIMIT).all()
+        for row in inactive:
+            tasks.append({'title': f'Check-in with {row.name}', 'patient_id': row.id, 'due': '', 'type': 'followup'})
     except Exception:
         pass
 
@@ -130,6 +156,7 @@ def provider_dashboard():
                          institution=institution,
                          search_q=search_q,
                          filter_risk=filter_risk,
+                         pagination=pagination,
                          tasks=tasks)
 
 @provider_bp.route('/appointments/accept/<int:appointment_id>', methods=['POST'])
@@ -207,13 +234,19 @@ def provider_appointments():
     
     appointments = query.order_by(Appointment.date.asc(), Appointment.time.asc()).all()
     
+    # Latest health records for every patient in the set: three queries in total
+    patient_ids = {appt.user.id for appt in appointments if appt.user}
+    latest_assessments = latest_per_user(Assessment, patient_ids, Assessment.created_at.desc())
+    latest_detox_logs = latest_per_user(DigitalDetoxLog, patient_ids, DigitalDetoxLog.date.desc())
+    latest_rpm_data = latest_per_user(RPMData, patient_ids, RPMData.date.desc())
+
     appointments_data = []
     for appt in appointments:
         patient_health_data = None
         if appt.user:
-            latest_assessment = Assessment.query.filter_by(user_id=appt.user.id).order_by(Assessment.created_at.desc()).first()
-            latest_detox = DigitalDetoxLog.query.filter_by(user_id=appt.user.id).order_by(DigitalDetoxLog.date.desc()).first()
-            latest_rpm = RPMData.query.filter_by(user_id=appt.user.id).order_by(RPMData.date.desc()).first()
+            latest_assessment = latest_assessments.get(appt.user.id)
+            latest_detox = latest_detox_logs.get(appt.user.id)
+            latest_rpm = latest_rpm_data.get(appt.user.id)
             
             patient_health_data = {
                 'latest_assessment': {
@@ -305,92 +338,67 @@ def ai_documentation():
 def analytics():
     institution = session.get('user_institution', 'Sample University')
 
-    # Get institutional analytics data
-    institutional_data = get_institutional_summary(institution, db)
-
-    # Get recent blog insights
-    recent_blog_insights = BlogInsight.query.order_by(BlogInsight.created_at.desc()).limit(10).all()
-
-    # Get patient engagement trends
-    patients = User.query.filter_by(role='patient', institution=institution).all()
-    patient_ids = [p.id for p in patients]
-
-    # Get recent digital detox data for trends
-    recent_detox = DigitalDetoxLog.query.filter(
-        DigitalDetoxLog.user_id.in_(patient_ids),
-        DigitalDetoxLog.date >= datetime.now().date() - timedelta(days=30)
-    ).all()
-
-    # Calculate engagement metrics
-    active_patients = len(set([log.user_id for log in recent_detox]))
-    total_patients = len(patients)
-
-    # Get assessment completion rates
-    assessments_30_days = Assessment.query.filter(
-        Assessment.user_id.in_(patient_ids),
-        Assessment.created_at >= datetime.now() - timedelta(days=30)
-    ).count()
-
-    # Get gamification stats
-    gamification_stats = db.session.query(
-        func.avg(Gamification.points),
-        func.avg(Gamification.streak),
-        func.count(Gamification.id)
-    ).filter(Gamification.user_id.in_(patient_ids)).first()
-
-    # Get wellness trend data for charts
-    detox_trends = {}
-    for log in recent_detox:
-        date_str = log.date.strftime('%Y-%m-%d')
-        if date_str not in detox_trends:
-            detox_trends[date_str] = {'total_hours': 0, 'count': 0, 'ai_scores': []}
-        detox_trends[date_str]['total_hours'] += log.screen_time_hours
-        detox_trends[date_str]['count'] += 1
-        if log.ai_score:
-            detox_trends[date_str]['ai_scores'].append(log.ai_score)
-
-    # Calculate average daily screen time and wellness scores
-    chart_labels = sorted(detox_trends.keys())
-    screen_time_data = []
-    wellness_score_data = []
-
-    for date in chart_labels:
-        data = detox_trends[date]
-        avg_screen_time = data['total_hours'] / data['count'] if data['count'] > 0 else 0
-        screen_time_data.append(round(avg_screen_time, 1))
-
-        # Convert AI scores to numeric values for averaging
-        numeric_scores = []
-        for score in data['ai_scores']:
-            if score == 'Excellent':
-                numeric_scores.append(5)
-            elif score == 'Good':
-                numeric_scores.append(4)
-            elif score == 'Fair':
-                numeric_scores.append(3)
-            elif score == 'Needs Improvement':
-                numeric_scores.append(2)
-            elif score == 'Poor':
-                numeric_scores.append(1)
-
-        avg_wellness = sum(numeric_scores) / len(numeric_scores) if numeric_scores else 0
-        wellness_score_data.append(round(avg_wellness, 1))
-
-    analytics_data = {
-        'institution': institution,
-        'total_patients': total_patients,
-        'active_patients': active_patients,
-        'engagement_rate': round((active_patients / total_patients) * 100, 1) if total_patients > 0 else 0,
-        'assessments_30_days': assessments_30_days,
-        'avg_gamification_points': round(gamification_stats[0], 1) if gamification_stats[0] else 0,
-        'avg_streak': round(gamification_stats[1], 1) if gamification_stats[1] else 0,
-        'total_gamified_users': gamification_stats[2],
-        'chart_labels': chart_labels,
-        'screen_time_data': screen_time_data,
-        'wellness_score_data': wellness_score_data,
-        'blog_insights': recent_blog_insights,
-        'institutional_data': institutional_data
-    }
+    def build():
+        # Get institutional analytics data
+        institutional_data = get_institutional_summary(institution, db)
+
+        # Get recent blog insights
+        recent_blog_insights = BlogInsight.query.order_by(BlogInsight.created_at.desc()).limit(10).all()
+
+        patient_ids = db.session.query(User.id).filter_by(role='patient', institution=institution)
+        since = datetime.now() - timedelta(days=30)
+
+        # Engagement, assessment and gamification counts as aggregates over the patient subquery
+        total_patients = institutional_data['total_users']
+        active_patients = db.session.query(func.count(func.distinct(DigitalDetoxLog.user_id))).filter(
+            DigitalDetoxLog.user_id.in_(patient_ids),
+            DigitalDetoxLog.date >= since.date()
+        ).scalar() or 0
+        assessments_30_days = db.session.query(func.count(Assessment.id)).filter(
+            Assessment.user_id.in_(patient_ids),
+            Assessment.created_at >= since
+        ).scalar() or 0
+        gamification_stats = db.session.query(
+            func.avg(Gamification.points),
+            func.avg(Gamification.streak),
+            func.count(Gamification.id)
+        ).filter(Gamification.user_id.in_(patient_ids)).first()
+
+        # Trend charts: past days come from the daily rollups, only today is live.
+        # Screen time is each day's own mean, not the summary's 7-day window
+        rollups = get_rollup_series(institution, days=30)
+        chart_labels = [r.date.strftime('%Y-%m-%d') for r in rollups]
+        screen_time_data = [round(r.day_screen_time or 0, 1) for r in rollups]
+        wellness_score_data = [round(r.avg_wellness_score or 0, 1) for r in rollups]
+        chart_labels.append(date.today().strftime('%Y-%m-%d'))
+        screen_time_data.append(round(day_screen_time(institution, date.today()) or 0, 1))
+        wellness_score_data.append(institutional_data['avg_wellness_score'])
+
+        analytics_data = {
+            'institution': institution,
+            'total_patients': total_patients,
+            'active_patients': active_patients,
+            'engagement_rate': round((active_patients / total_patients) * 100, 1) if total_patients > 0 else 0,
+            'assessments_30_days': assessments_30_days,
+            'avg_gamification_points': round(gamification_stats[0], 1) if gamification_stats[0] else 0,
+            'avg_streak': round(gamification_stats[1], 1) if gamification_stats[1] else 0,
+            'total_gamified_users': gamification_stats[2],
+            'chart_labels': chart_labels,
+            'screen_time_data': screen_time_data,
+            'wellness_score_data': wellness_score_data,
+            'blog_insights': [{
+                'date': insight.date,
+                'total_posts': insight.total_posts,
+                'total_views': insight.total_views,
+                'engagement_rate': insight.engagement_rate or 0.0
+            } for insight in recent_blog_insights],
+            'institutional_data': institutional_data
+        }
+        return analytics_data
+
+    # Shared by every provider of the institution; dropped when its rollups or blog insights change
+    analytics_data = get_or_set('provider_analytics', build, vary=[institution, date.today()],
+                                tags=('analytics', f'analytics:{institution}'), timeout=ANALYTICS_CACHE_SECONDS)
 
     return render_template('analytics.html',
                          user_name=session['user_name'],
@@ -480,39 +488,13 @@ def wellness_report(user_id):
     
     recent_sessions = ClinicalNote.query.filter_by(patient_id=user_id).order_by(ClinicalNote.session_date.desc()).limit(10).all()
 
-    # Fetch RPM data for mood charting
-    rpm_logs = RPMData.query.filter_by(user_id=user_id).order_by(RPMData.date.asc()).limit(90).all()
-    mood_chart_labels = [log.date.strftime('%Y-%m-%d') for log in rpm_logs]
-    mood_chart_data = [log.mood_score if log.mood_score else 0 for log in rpm_logs]
-
-    # Fetch assessments for mental health charting
-    mental_health_assessments = Assessment.query.filter_by(user_id=user_id).order_by(Assessment.created_at.asc()).all()
-    mh_chart_labels = []
-    gad7_data = []
-    phq9_data = []
-
-    for assessment in mental_health_assessments:
-        date_str = assessment.created_at.strftime('%Y-%m-%d')
-        if date_str not in mh_chart_labels:
-            mh_chart_labels.append(date_str)
-            gad7_data.append(None) # Initialize with None
-            phq9_data.append(None) # Initialize with None
-
-        idx = mh_chart_labels.index(date_str)
-        if assessment.assessment_type == 'GAD-7':
-            gad7_data[idx] = assessment.score
-        elif assessment.assessment_type == 'PHQ-9':
-            phq9_data[idx] = assessment.score
-
-    # Filter out dates where both GAD-7 and PHQ-9 are None
-    filtered_mh_chart_labels = []
-    filtered_gad7_data = []
-    filtered_phq9_data = []
-    for i, label in enumerate(mh_chart_labels):
-        if gad7_data[i] is not None or phq9_data[i] is not None:
-            filtered_mh_chart_labels.append(label)
-            filtered_gad7_data.append(gad7_data[i])
-            filtered_phq9_data.append(phq9_data[i])
+    # Daily mean RPM mood over the last 90 days, bounded to CHART_MAX_POINTS
+    mood_chart = summary_series('rpm_mood', user_id, days=90)
+    mood_chart_labels = mood_chart['labels']
+    mood_chart_data = mood_chart['mean']
+
+    # Last GAD-7 / PHQ-9 score of each day that has one, bucketed in SQL
+    mh_chart = assessment_series(user_id)
 
     # Prepare patient data for AI goal suggestions
     patient_data_for_ai = {
@@ -540,9 +522,9 @@ def wellness_report(user_id):
                          recent_sessions=recent_sessions,
                          mood_chart_labels=mood_chart_labels,
                          mood_chart_data=mood_chart_data,
-                         mh_chart_labels=filtered_mh_chart_labels,
-                         gad7_data=filtered_gad7_data,
-                         phq9_data=filtered_phq9_data,
+                         mh_chart_labels=mh_chart.labels,
+                         gad7_data=mh_chart.series['GAD-7'],
+                         phq9_data=mh_chart.series['PHQ-9'],
                          ai_goal_suggestions=ai_goal_suggestions,
                          ai_medication_adherence_insights=ai_medication_adherence_insights,
                          datetime=datetime)
@@ -0,0 +1,53 @@
+import hashlib
+
+from flask import Blueprint, request, jsonify, session, current_app
+from decorators import api_login_required
+from extensions import db
+from models import User
+from routes.provider import _matching_patient_ids
+from timeseries import summary_series, CHART_MAX_POINTS, CHART_WINDOW_DAYS
+
+bp = Blueprint('series', __name__, url_prefix='/api')
+
+@bp.route('/series/<metric>', methods=['GET'])
+@api_login_required
+def get_series(metric):
+    """
+    Bucketed min/mean/max/count series of a metric for the session user
+    (providers may pass ?user_id= of a patient of their institution). Query args: period (hour, day, week,
+    month), points (LTTB target) and days (window, 0 for all history).
+    """
+    user_id = session['user_id']
+    if 'user_id' in request.args:
+        if session.get('user_role') != 'provider':
+            return jsonify({'ok': False, 'error': 'Insufficient permissions'}), 403
+        user_id = request.args.get('user_id', type=int)
+        if user_id is None:
+            return jsonify({'ok': False, 'error': 'user_id must be an integer'}), 400
+        institution = session.get('user_institution', 'Sample University')
+        in_caseload = db.session.query(
+            _matching_patient_ids(institution).filter(User.id == user_id).exists()
+        ).scalar()
+        if not in_caseload:
+            return jsonify({'ok': False, 'error': 'Patient not found'}), 404
+
+    try:
+        data = summary_series(
+            metric, user_id,
+            period=request.args.get('period', 'day'),
+            points=request.args.get('points', CHART_MAX_POINTS, type=int),
+            days=request.args.get('days', CHART_WINDOW_DAYS, type=int)
+        )
+    except ValueError as e:
+        return jsonify({'ok': False, 'error': str(e)}), 400
+    except Exception as e:
+        current_app.logger.exception("Series fetch failed")
+        return jsonify({'ok': False, 'error': str(e)}), 500
+
+    # The payload is bounded by `points`, so hashing it is cheap; an unchanged
+    # chart costs the client a 304 instead of the series
+    response = jsonify({'ok': True, **data})
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
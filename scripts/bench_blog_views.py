@@ -0,0 +1,140 @@
+"""
+Contention benchmark for blog post view counting.
+
+Usage:
+    python -m scripts.bench_blog_views [--readers 16] [--seconds 5] [--db /tmp/bench_blog_views.db]
+
+Runs `--readers` threads that each repeatedly load one hot post and its
+comments (what blog_detail does) against a scratch SQLite database, first with
+the previous synchronous `post.views += 1; commit()` per read, then with the
+write-behind view_counter. Reports reads/s, latency percentiles, failed reads
+(e.g. "database is locked") and views lost because the stored count is lower
+than the number of successful reads (the ORM read-modify-write of
+`views += 1` drops concurrent increments).
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+from flask import Flask
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from extensions import db
+from models import User, BlogPost, BlogComment
+from view_counter import ViewCounter
+
+
+def read_sync(post_id, counter):
+    post = db.session.get(BlogPost, post_id)
+    BlogComment.query.filter_by(post_id=post_id).order_by(BlogComment.created_at.asc()).all()
+    post.views += 1
+    db.session.commit()
+
+
+def read_write_behind(post_id, counter):
+    post = db.session.get(BlogPost, post_id)
+    BlogComment.query.filter_by(post_id=post_id).order_by(BlogComment.created_at.asc()).all()
+    counter.hit(post_id)
+    return (post.views or 0) + counter.pending(post_id)
+
+
+def run(app, post_id, read, readers, seconds, counter=None):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def reader():
+        local_latencies, local_errors = [], 0
+        with app.app_context():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    read(post_id, counter)
+                    local_latencies.append(time.perf_counter() - start)
+                except Exception:
+                    db.session.rollback()
+                    local_errors += 1
+                finally:
+                    db.session.remove()
+        with lock:
+            latencies.extend(local_latencies)
+            errors.append(local_errors)
+
+    flusher_stop = threading.Event()
+
+    def flusher():
+        # Stand-in for the periodic flush task, at a short interval for the benchmark
+        with app.app_context():
+            while not flusher_stop.wait(1.0):
+                counter.flush()
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    if counter is not None:
+        threads.append(threading.Thread(target=flusher))
+    for t in threads:
+        t.start()
+    for t in threads[:readers]:
+        t.join()
+    flusher_stop.set()
+    for t in threads[readers:]:
+        t.join()
+    if counter is not None:
+        with app.app_context():
+            counter.flush()
+    return sorted(latencies), sum(errors)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main(readers, seconds, db_path):
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    # Same busy timeout as a default sqlite3 connection; lock waits count as latency
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 5}}
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        author = User(email='author@bench.test', password_hash='x', name='Author', role='patient')
+        db.session.add(author)
+        db.session.commit()
+        author_id = author.id
+
+        results = {}
+        for label, read, counter in (
+            ('sync commit per read', read_sync, None),
+            ('write-behind counter', read_write_behind, ViewCounter(flush_hits=10**9)),
+        ):
+            post = BlogPost(title=label, content='Hot post', author_id=author_id, views=0)
+            db.session.add(post)
+            db.session.commit()
+            post_id = post.id
+            db.session.remove()
+
+            latencies, errors = run(app, post_id, read, readers, seconds, counter)
+            stored = db.session.get(BlogPost, post_id).views
+            results[label] = (latencies, errors, stored)
+
+    print(f"{readers} concurrent readers on one post for {seconds}s ({db_path})")
+    for label, (latencies, errors, stored) in results.items():
+        reads = len(latencies)
+        print(f"  {label:22s} reads/s={reads / seconds:8.1f}  p50={percentile(latencies, 50) * 1000:7.2f} ms  "
+              f"p95={percentile(latencies, 95) * 1000:7.2f} ms  p99={percentile(latencies, 99) * 1000:7.2f} ms  "
+              f"failed={errors}  stored_views={stored}  lost_views={reads - (stored or 0)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--readers', type=int, default=16, help='Concurrent reader threads')
+    parser.add_argument('--seconds', type=float, default=5, help='Duration of each run')
+    parser.add_argument('--db', default='/tmp/bench_blog_views.db', help='Scratch SQLite database path')
+    args = parser.parse_args()
+    main(args.readers, args.seconds, args.db)
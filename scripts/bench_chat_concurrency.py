@@ -0,0 +1,63 @@
+"""
+Benchmark concurrent chat throughput on a single eventlet worker.
+
+Usage:
+    python -m scripts.bench_chat_concurrency [--clients 20] [--latency 0.2]
+
+Simulates N chat sockets each sending one message while the AI call blocks for
+`--latency` seconds in native code (like a gRPC Gemini request, which does not
+yield to eventlet). Compares calling the AI inline, as `handle_chat_message` used
+to, against routing it through `ai.executor.offload`.
+"""
+import eventlet
+eventlet.monkey_patch()
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai.executor import offload
+
+_native_sleep = eventlet.patcher.original('time').sleep
+
+
+def fake_gemini_call(latency):
+    # Blocks the OS thread without yielding, like a C-level network call
+    _native_sleep(latency)
+    return 'ok'
+
+
+def run(clients, latency, use_offload):
+    pool = eventlet.GreenPool(clients)
+    latencies = []
+
+    def chat_message(submitted):
+        if use_offload:
+            offload(fake_gemini_call, latency)
+        else:
+            fake_gemini_call(latency)
+        latencies.append(time.perf_counter() - submitted)
+
+    start = time.perf_counter()
+    for _ in range(clients):
+        pool.spawn_n(chat_message, time.perf_counter())
+    pool.waitall()
+    elapsed = time.perf_counter() - start
+    return elapsed, max(latencies)
+
+
+def main(clients, latency):
+    print(f"{clients} concurrent chat messages, simulated AI latency {latency:.2f}s")
+    for label, use_offload in (('before (inline)', False), ('after (offload)', True)):
+        elapsed, worst = run(clients, latency, use_offload)
+        print(f"  {label:16s} wall={elapsed:6.2f}s  throughput={clients / elapsed:6.1f} msg/s  worst reply={worst:6.2f}s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=20, help='Number of concurrent chat messages')
+    parser.add_argument('--latency', type=float, default=0.2, help='Simulated AI latency in seconds')
+    args = parser.parse_args()
+    main(args.clients, args.latency)
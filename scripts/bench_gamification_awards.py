@@ -0,0 +1,117 @@
+"""
+Lost-update check for gamification point awards.
+
+Usage:
+    python -m scripts.bench_gamification_awards [--workers 16] [--awards 50] [--db /tmp/bench_gamification.db] [--url postgresql://...]
+
+Runs `--workers` threads that each award points `--awards` times to the same
+user, committing after every award (one request per award, as when a patient
+logs activities from several tabs or devices), against a scratch SQLite
+database or the database at `--url`. It does this first with the previous
+ORM read-modify-write (`gamification.points += points`), then with
+gamification_engine.award_points. For each run it reports awards/s, failed
+awards (e.g. "database is locked"), and lost updates: stored points below
+the sum of the successful awards.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import Flask
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from extensions import db
+from models import User, Gamification
+from gamification_engine import award_points
+
+POINTS = 10
+
+
+def award_read_modify_write(user_id):
+    """The inline update save_mood used to do."""
+    gamification = Gamification.query.filter_by(user_id=user_id).first()
+    gamification.points += POINTS
+    gamification.last_activity = datetime.now(timezone.utc).date()
+    db.session.commit()
+
+
+def award_atomic(user_id):
+    award_points(user_id, POINTS, 'bench')
+    db.session.commit()
+
+
+def run(app, user_id, award, workers, awards):
+    succeeded, failed = [], []
+    lock = threading.Lock()
+
+    def worker():
+        ok = errors = 0
+        with app.app_context():
+            for _ in range(awards):
+                try:
+                    award(user_id)
+                    ok += 1
+                except Exception:
+                    db.session.rollback()
+                    errors += 1
+                finally:
+                    db.session.remove()
+        with lock:
+            succeeded.append(ok)
+            failed.append(errors)
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(succeeded), sum(failed), time.perf_counter() - started
+
+
+def main(workers, awards, db_path, url):
+    if url is None and os.path.exists(db_path):
+        os.remove(db_path)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url or f'sqlite:///{db_path}'
+    if url is None:
+        # Same busy timeout as a default sqlite3 connection
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 5}}
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        results = {}
+        for label, award in (
+            ('read-modify-write', award_read_modify_write),
+            ('atomic UPDATE', award_atomic),
+        ):
+            user = User(email=f'bench-{time.time_ns()}@bench.test', password_hash='x', name=label, role='patient')
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(Gamification(user_id=user.id, points=0, streak=0))
+            db.session.commit()
+            user_id = user.id
+            db.session.remove()
+
+            succeeded, failed, elapsed = run(app, user_id, award, workers, awards)
+            stored = Gamification.query.filter_by(user_id=user_id).first().points
+            results[label] = (succeeded, failed, elapsed, stored)
+
+    print(f"{workers} concurrent workers x {awards} awards of {POINTS} points to one user ({app.config['SQLALCHEMY_DATABASE_URI']})")
+    for label, (succeeded, failed, elapsed, stored) in results.items():
+        print(f"  {label:18s} awards/s={succeeded / elapsed:8.1f}  failed={failed}  "
+              f"stored_points={stored}  lost_updates={(succeeded * POINTS - stored) // POINTS}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=16, help='Concurrent award threads')
+    parser.add_argument('--awards', type=int, default=50, help='Awards per thread')
+    parser.add_argument('--db', default='/tmp/bench_gamification.db', help='Scratch SQLite database path')
+    parser.add_argument('--url', default=None, help='Database URL to use instead of a scratch SQLite file')
+    args = parser.parse_args()
+    main(args.workers, args.awards, args.db, args.url)
@@ -0,0 +1,175 @@
+"""
+Benchmark get_institutional_summary on a synthetic large institution.
+
+Usage:
+    python -m scripts.bench_institutional_summary [--patients 50000] [--db /tmp/bench_institution.db]
+
+Builds a throwaway SQLite database with one institution of `--patients` patients
+and a week of detox, assessment, breathing, yoga, medication and appointment
+rows, then reports statement count and wall time for the previous ORM-based
+implementation (reproduced below) and the current aggregate-SQL one.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import event, insert
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from extensions import db
+from models import (User, DigitalDetoxLog, Assessment, Medication, MedicationLog, BreathingExerciseLog,
+                    YogaLog, MusicTherapyLog, Appointment, get_institutional_summary)
+
+INSTITUTION = 'Bench University'
+
+
+def legacy_summary(institution):
+    """Query pattern of the previous implementation: ORM rows and IN (...) id lists."""
+    users = User.query.filter_by(institution=institution, role='patient').all()
+    user_ids = [u.id for u in users]
+    since = datetime.now().date() - timedelta(days=7)
+    since_dt = datetime.combine(since, datetime.min.time())
+
+    active = set()
+    for model, column, start in (
+        (DigitalDetoxLog, DigitalDetoxLog.date, since),
+        (Assessment, Assessment.created_at, since_dt),
+        (MedicationLog, MedicationLog.taken_at, since_dt),
+        (BreathingExerciseLog, BreathingExerciseLog.created_at, since_dt),
+        (YogaLog, YogaLog.created_at, since_dt),
+        (MusicTherapyLog, MusicTherapyLog.created_at, since_dt),
+    ):
+        rows = db.session.query(model.user_id).filter(model.user_id.in_(user_ids), column >= start).distinct().all()
+        active.update(r[0] for r in rows)
+
+    avg_screen = db.session.query(db.func.avg(DigitalDetoxLog.screen_time_hours)).filter(
+        DigitalDetoxLog.user_id.in_(user_ids), DigitalDetoxLog.date >= since).scalar() or 0.0
+    per_user = db.session.query(DigitalDetoxLog.user_id, db.func.avg(DigitalDetoxLog.screen_time_hours)).filter(
+        DigitalDetoxLog.user_id.in_(user_ids), DigitalDetoxLog.date >= since).group_by(DigitalDetoxLog.user_id).all()
+    high_risk = sum(1 for _, avg in per_user if avg and avg > 8)
+
+    assessments = Assessment.query.filter(
+        Assessment.user_id.in_(user_ids), Assessment.created_at >= since_dt - timedelta(days=23)).all()
+    scores = []
+    for a in assessments:
+        if a.assessment_type in ('GAD-7', 'PHQ-9') and a.score is not None:
+            scores.append((1 - a.score / (21 if a.assessment_type == 'GAD-7' else 27)) * 10)
+        elif a.assessment_type == 'Daily Mood' and a.score is not None:
+            scores.append(a.score * 2)
+
+    appointments = Appointment.query.filter(Appointment.provider_id.in_(user_ids), Appointment.date >= since).all()
+    completed = sum(1 for a in appointments if a.status == 'completed')
+
+    return {
+        'total_users': len(users),
+        'active_users': len(active),
+        'avg_screen_time': round(avg_screen, 1),
+        'high_risk_users': high_risk,
+        'avg_wellness_score': round(sum(scores) / len(scores), 1) if scores else 0.0,
+        'completion_rate': round(completed / len(appointments) * 100, 1) if appointments else 0.0,
+    }
+
+
+def populate(patients, seed=7):
+    rng = random.Random(seed)
+    today = datetime.now().date()
+    now = datetime.now()
+
+    db.session.execute(insert(User), [
+        {'email': f'patient{i}@bench.test', 'password_hash': 'x', 'name': f'Patient {i}',
+         'role': 'patient', 'institution': INSTITUTION}
+        for i in range(patients)
+    ])
+    db.session.execute(insert(User), [
+        {'email': f'other{i}@bench.test', 'password_hash': 'x', 'name': f'Other {i}',
+         'role': 'patient', 'institution': 'Other College'}
+        for i in range(patients // 10)
+    ])
+    ids = [row[0] for row in db.session.query(User.id).filter_by(institution=INSTITUTION)]
+
+    db.session.execute(insert(DigitalDetoxLog), [
+        {'user_id': uid, 'date': today - timedelta(days=rng.randint(0, 13)),
+         'screen_time_hours': round(rng.uniform(1, 12), 1), 'academic_score': rng.randint(1, 10)}
+        for uid in ids for _ in range(2)
+    ])
+    db.session.execute(insert(Assessment), [
+        {'user_id': uid, 'assessment_type': rng.choice(['GAD-7', 'PHQ-9', 'Daily Mood']),
+         'score': rng.randint(1, 20), 'created_at': now - timedelta(days=rng.randint(0, 40))}
+        for uid in ids
+    ])
+    sample = rng.sample(ids, len(ids) // 4)
+    db.session.execute(insert(BreathingExerciseLog), [
+        {'user_id': uid, 'exercise_name': 'Box', 'duration_minutes': 5,
+         'created_at': now - timedelta(days=rng.randint(0, 13))}
+        for uid in sample
+    ])
+    db.session.execute(insert(YogaLog), [
+        {'user_id': uid, 'session_name': 'Flow', 'duration_minutes': 20, 'difficulty_level': 'Beginner',
+         'created_at': now - timedelta(days=rng.randint(0, 13))}
+        for uid in sample
+    ])
+    db.session.execute(insert(Medication), [{'user_id': ids[0], 'name': 'Bench'}])
+    med_id = db.session.query(Medication.id).scalar()
+    db.session.execute(insert(MedicationLog), [
+        {'medication_id': med_id, 'user_id': uid, 'taken_at': now - timedelta(days=rng.randint(0, 13))}
+        for uid in sample
+    ])
+    db.session.execute(insert(Appointment), [
+        {'user_id': uid, 'provider_id': rng.choice(ids), 'date': today - timedelta(days=rng.randint(0, 13)),
+         'time': '10:00', 'appointment_type': 'checkup', 'status': rng.choice(['completed', 'pending'])}
+        for uid in rng.sample(ids, len(ids) // 20)
+    ])
+    db.session.commit()
+
+
+def measure(fn):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    db.session.expunge_all()
+    start = time.perf_counter()
+    try:
+        result = fn()
+    except Exception as e:
+        result = f'failed: {type(e).__name__}: {str(e).splitlines()[0][:80]}'
+        db.session.rollback()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    return time.perf_counter() - start, len(statements), result
+
+
+def main(patients, db_path):
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        t0 = time.perf_counter()
+        populate(patients)
+        print(f"Populated {patients} patients in {time.perf_counter() - t0:.1f}s ({db_path})")
+
+        for label, fn in (
+            ('before (ORM + IN lists)', lambda: legacy_summary(INSTITUTION)),
+            ('after (aggregate SQL)', lambda: get_institutional_summary(INSTITUTION, db)),
+        ):
+            elapsed, statements, result = measure(fn)
+            print(f"  {label:24s} statements={statements:3d}  wall={elapsed * 1000:8.1f} ms")
+            print(f"    {result}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--patients', type=int, default=50000, help='Patients in the synthetic institution')
+    parser.add_argument('--db', default='/tmp/bench_institution.db', help='Scratch SQLite database path')
+    args = parser.parse_args()
+    main(args.patients, args.db)
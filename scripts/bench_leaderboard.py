@@ -0,0 +1,138 @@
+"""
+Leaderboard query cost at scale.
+
+Usage:
+    python -m scripts.bench_leaderboard [--users 100000] [--institutions 20] [--queries 2000] [--db /tmp/bench_leaderboard.db]
+
+Fills a scratch SQLite database with `--users` patients spread over
+`--institutions` institutions, each with random all-time and weekly points,
+builds the leaderboards from it and reports, per query,
+  * top-10 of an institution and one user's rank from the RankIndex,
+  * the same answered by SQL per request (ORDER BY points LIMIT 10, and
+    COUNT(*) of users with more points), and
+  * applying one committed award to the index.
+Ranks and top-10s of sampled users are compared between the two.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+from flask import Flask
+from sqlalchemy import func
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from extensions import db
+from models import User, Gamification
+from leaderboard import Leaderboards, week_start
+
+
+def populate(users, institutions, seed=0):
+    rng = random.Random(seed)
+    week = week_start(datetime.now(timezone.utc).date())
+    names = [f'Institution {i}' for i in range(institutions)]
+    user_rows = [
+        {'id': i, 'email': f'user{i}@bench.test', 'password_hash': 'x', 'name': f'User {i}',
+         'role': 'patient', 'institution': names[i % institutions]}
+        for i in range(1, users + 1)
+    ]
+    db.session.execute(User.__table__.insert(), user_rows)
+    gamification_rows = [
+        {'user_id': i, 'points': rng.randint(0, 20000), 'streak': 0,
+         'weekly_points': rng.randint(0, 500), 'week_start': week}
+        for i in range(1, users + 1)
+    ]
+    db.session.execute(Gamification.__table__.insert(), gamification_rows)
+    db.session.commit()
+    return names
+
+
+def sql_top(institution, n=10):
+    return db.session.query(Gamification.user_id, Gamification.points) \
+        .join(User, User.id == Gamification.user_id) \
+        .filter(User.institution == institution, User.role == 'patient', Gamification.points > 0) \
+        .order_by(Gamification.points.desc(), Gamification.user_id).limit(n).all()
+
+
+def sql_rank(user_id):
+    points, institution = db.session.query(Gamification.points, User.institution) \
+        .join(User, User.id == Gamification.user_id).filter(User.id == user_id).first()
+    ahead = db.session.query(func.count()).select_from(Gamification) \
+        .join(User, User.id == Gamification.user_id) \
+        .filter(User.institution == institution, User.role == 'patient', Gamification.points > points).scalar()
+    return ahead + 1, points
+
+
+def timed(fn, args_list):
+    durations = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations) * 1e6, max(durations) * 1e6
+
+
+def main(users, institutions, queries, db_path):
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        names = populate(users, institutions)
+        print(f"Populated {users} users in {institutions} institutions in {time.perf_counter() - start:.1f}s ({db_path})")
+
+        boards = Leaderboards()
+        start = time.perf_counter()
+        ranked = boards.load()
+        print(f"Built leaderboards for {ranked} users in {time.perf_counter() - start:.2f}s")
+
+        rng = random.Random(1)
+        sample_users = [(rng.randint(1, users),) for _ in range(queries)]
+        sample_institutions = [(rng.choice(names),) for _ in range(queries)]
+
+        mismatches = 0
+        for (user_id,) in sample_users[:200]:
+            rank, points = sql_rank(user_id)
+            standing = boards.standing(user_id)
+            if points > 0 and (standing is None or standing[:2] != (rank, points)):
+                mismatches += 1
+        for (institution,) in sample_institutions[:50]:
+            if [(uid, points) for _, uid, points in boards.top(institution)] != [tuple(r) for r in sql_top(institution)]:
+                mismatches += 1
+        print(f"Index vs SQL mismatches: {mismatches}")
+
+        sql_queries = min(queries, 200)
+        rows = [
+            ('top-10, index', timed(lambda inst: boards.top(inst, 'all_time', 10), sample_institutions)),
+            ('top-10, SQL', timed(sql_top, sample_institutions[:sql_queries])),
+            ('rank, index', timed(lambda uid: boards.standing(uid), sample_users)),
+            ('rank, SQL', timed(sql_rank, sample_users[:sql_queries])),
+            ('weekly rank, index', timed(lambda uid: boards.standing(uid, 'weekly'), sample_users)),
+        ]
+        week = week_start(datetime.now(timezone.utc).date())
+        updates = [
+            ([('score', uid, names[uid % institutions], 'patient', 20000 + i, 500 + i, week)],)
+            for i, (uid,) in enumerate(sample_users)
+        ]
+        rows.append(('apply award, index', timed(boards.apply, updates)))
+
+    print(f"{'query':20s} {'median':>12s} {'max':>12s}")
+    for label, (median, worst) in rows:
+        print(f"{label:20s} {median:9.1f} us {worst:9.1f} us")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=100000, help='Patients with gamification rows')
+    parser.add_argument('--institutions', type=int, default=20, help='Institutions the users are spread over')
+    parser.add_argument('--queries', type=int, default=2000, help='Queries timed per index operation (SQL: at most 200)')
+    parser.add_argument('--db', default='/tmp/bench_leaderboard.db', help='Scratch SQLite database path')
+    args = parser.parse_args()
+    main(args.users, args.institutions, args.queries, args.db)
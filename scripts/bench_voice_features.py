@@ -0,0 +1,120 @@
+"""
+CPU cost of voice log feature extraction.
+
+Usage:
+    python -m scripts.bench_voice_features [--files 8] [--seconds 30] [--workers 2] [--dir /tmp/bench_voice_features]
+
+Writes `--files` synthetic voice-like recordings (44.1 kHz, so resampling is
+included) and reports per-file CPU time for
+  * the previous inline extraction, where piptrack and spectral_centroid each
+    computed their own STFT, and
+  * voice_analysis.extract_features, which shares one STFT,
+then runs the shared-STFT version through a process pool of `--workers`
+processes and reports wall time against the summed per-file CPU time.
+Feature values of both versions are compared and the largest relative
+difference is printed.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from voice_analysis import extract_features, VOICE_MAX_SECONDS
+
+
+def inline_features(file_path):
+    """The extraction upload_voice used to run in the request handler."""
+    import librosa
+
+    started = time.process_time()
+    y, sr = librosa.load(file_path, duration=VOICE_MAX_SECONDS)
+    features = {'duration': len(y) / sr, 'sample_rate': sr}
+    pitches, magnitudes = librosa.piptrack(y=y, sr=sr)
+    pitch_values = pitches[pitches > 0]
+    if len(pitch_values) > 0:
+        features['mean_pitch'] = float(np.mean(pitch_values))
+        features['pitch_std'] = float(np.std(pitch_values))
+    rms = librosa.feature.rms(y=y)
+    features['mean_energy'] = float(np.mean(rms))
+    features['energy_std'] = float(np.std(rms))
+    zcr = librosa.feature.zero_crossing_rate(y)
+    features['mean_zcr'] = float(np.mean(zcr))
+    features['zcr_std'] = float(np.std(zcr))
+    spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr)
+    features['mean_spectral_centroid'] = float(np.mean(spectral_centroid))
+    features['spectral_centroid_std'] = float(np.std(spectral_centroid))
+    features['analysis_cpu_seconds'] = round(time.process_time() - started, 4)
+    return features
+
+
+def write_recordings(directory, count, seconds, sr=44100):
+    import soundfile
+
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sr)) / sr
+    paths = []
+    for i in range(count):
+        # Voiced harmonics with slow pitch drift and syllable-rate amplitude envelope
+        f0 = 110 + 40 * i / max(count - 1, 1) + 8 * np.sin(2 * np.pi * 0.3 * t)
+        phase = 2 * np.pi * np.cumsum(f0) / sr
+        voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t) ** 2
+        signal = 0.2 * voice * envelope + 0.01 * rng.standard_normal(t.size)
+        path = os.path.join(directory, f'voice_{i}.wav')
+        soundfile.write(path, signal.astype(np.float32), sr)
+        paths.append(path)
+    return paths
+
+
+def describe(label, cpu_times):
+    cpu_times = sorted(cpu_times)
+    p95 = cpu_times[min(len(cpu_times) - 1, int(len(cpu_times) * 0.95))]
+    print(f"  {label:28s} cpu/file mean={statistics.mean(cpu_times):6.3f}s  p95={p95:6.3f}s  total={sum(cpu_times):7.2f}s")
+
+
+def max_relative_difference(a, b):
+    worst = 0.0
+    for key, value in a.items():
+        if key == 'analysis_cpu_seconds' or key not in b:
+            continue
+        worst = max(worst, abs(value - b[key]) / max(abs(value), 1e-12))
+    return worst
+
+
+def main(count, seconds, workers, directory):
+    paths = write_recordings(directory, count, seconds)
+    print(f"{count} recordings of {seconds:.0f}s ({directory})")
+
+    # Warm up imports and numba compilation outside the measurements
+    inline_features(paths[0])
+    extract_features(paths[0])
+
+    inline = [inline_features(p) for p in paths]
+    shared = [extract_features(p)[0] for p in paths]
+    describe('per-feature spectra (old)', [f['analysis_cpu_seconds'] for f in inline])
+    describe('shared STFT', [f['analysis_cpu_seconds'] for f in shared])
+    print(f"  max relative feature difference: {max(max_relative_difference(a, b) for a, b in zip(inline, shared)):.2e}")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(extract_features, paths[:workers]))  # start and warm up the workers
+        started = time.perf_counter()
+        pooled = [features for features, _ in pool.map(extract_features, paths)]
+        wall = time.perf_counter() - started
+    cpu = sum(f['analysis_cpu_seconds'] for f in pooled)
+    print(f"  process pool ({workers} workers)      wall={wall:6.2f}s  cpu={cpu:6.2f}s  files/s={count / wall:5.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=8, help='Number of recordings')
+    parser.add_argument('--seconds', type=float, default=30, help='Length of each recording')
+    parser.add_argument('--workers', type=int, default=2, help='Process pool size')
+    parser.add_argument('--dir', default='/tmp/bench_voice_features', help='Scratch directory for the recordings')
+    args = parser.parse_args()
+    main(args.files, args.seconds, args.workers, args.dir)
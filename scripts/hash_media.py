@@ -0,0 +1,42 @@
+"""
+Precompute content hashes (ETags and URL versions) of the dataset audio tracks.
+
+Usage:
+    python -m scripts.hash_media [--prune]
+
+Hashes every track of the binaural-beats catalog that changed since it was
+last hashed and stores the result in MEDIA_HASH_MANIFEST, so /audio never
+hashes a file on a request and /api/mood-audio hands out versioned
+(immutable) URLs from the start. `--prune` drops manifest entries of files
+that are no longer in the dataset.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from audio_catalog import get_catalog
+from media import content_hashes, MEDIA_HASH_MANIFEST
+
+
+def main(prune):
+    catalog = get_catalog(force=True)
+    paths = [catalog.path(track) for track in catalog.file_tracks()]
+    started = time.perf_counter()
+    hashed = 0
+    for path in paths:
+        if content_hashes.known(path) is None:
+            content_hashes.get(path)
+            hashed += 1
+    elapsed = time.perf_counter() - started
+    print(f"Hashed {hashed} of {len(paths)} tracks in {elapsed:.2f}s ({MEDIA_HASH_MANIFEST})")
+    if prune:
+        print(f"Pruned {content_hashes.prune(paths)} stale entries")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--prune', action='store_true', help='Drop hashes of files no longer in the dataset')
+    args = parser.parse_args()
+    main(args.prune)
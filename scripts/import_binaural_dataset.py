@@ -2,57 +2,83 @@
 Import binaural beats dataset into the application's database.
 
 Usage:
-    python -m scripts.import_binaural_dataset [--dry-run]
+    python -m scripts.import_binaural_dataset [--dry-run] [--batch 1000] [--dir data/binaural-beats-dataset]
 
-This script scans `data/binaural-beats-dataset/` for CSV/JSON files and inserts records
-into the `binaural_tracks` table. It avoids duplicates by youtube_id or by title+artist.
+This script scans `data/binaural-beats-dataset/` for CSV/JSON/JSON Lines files and inserts
+records into the `binaural_tracks` table. It avoids duplicates by youtube_id or by title+artist.
+
+The existing keys are loaded into sets once, rows are streamed from the files and
+deduplicated against (and added to) those sets, and new rows are inserted with one
+executemany per `--batch` rows, all in a single transaction that is committed at the
+end (or rolled back on error, or with `--dry-run`). On PostgreSQL and SQLite the insert
+is ON CONFLICT DO NOTHING on the unique youtube_id index, so a video inserted
+concurrently (another import, or the app) is skipped instead of aborting the import.
 """
 import os
 import argparse
 import json
 import csv
-from datetime import datetime
+import time
+from itertools import islice
 
 from extensions import db
 
 # Import the app module to access Flask app context and models
 import importlib, sys
+from sqlalchemy.dialects import postgresql, sqlite
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 app_mod = importlib.import_module('app')
 from models import BinauralTrack
+import route_cache
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 DATA_DIR = os.path.join(BASE_DIR, 'data', 'binaural-beats-dataset')
+SUPPORTED_EXTENSIONS = ('.csv', '.json', '.jsonl')
 
 
 def find_files(directory):
     supported = []
     for root, _, files in os.walk(directory):
-        for fn in files:
-            if fn.lower().endswith('.csv') or fn.lower().endswith('.json'):
+        for fn in sorted(files):
+            if fn.lower().endswith(SUPPORTED_EXTENSIONS):
                 supported.append(os.path.join(root, fn))
     return supported
 
 
-def parse_csv(path):
-    rows = []
-    with open(path, 'r', encoding='utf-8') as fh:
-        reader = csv.DictReader(fh)
-        for r in reader:
-            rows.append(r)
-    return rows
+def iter_csv(path):
+    with open(path, 'r', encoding='utf-8', newline='') as fh:
+        yield from csv.DictReader(fh)
 
 
-def parse_json(path):
+def iter_json(path):
     with open(path, 'r', encoding='utf-8') as fh:
         data = json.load(fh)
     if isinstance(data, list):
-        return data
+        yield from data
+        return
     # try to find nested lists
     for key in ('tracks', 'data', 'items'):
         if key in data and isinstance(data[key], list):
-            return data[key]
-    return []
+            yield from data[key]
+            return
+
+
+def iter_jsonl(path):
+    """One JSON object per line; the file is never held in memory."""
+    with open(path, 'r', encoding='utf-8') as fh:
+        for line in fh:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def iter_rows(path):
+    lowered = path.lower()
+    if lowered.endswith('.csv'):
+        return iter_csv(path)
+    if lowered.endswith('.jsonl'):
+        return iter_jsonl(path)
+    return iter_json(path)
 
 
 def normalize_row(row):
@@ -76,78 +102,119 @@ def normalize_row(row):
     }
 
 
-def main(dry_run=False):
-    if not os.path.isdir(DATA_DIR):
-        print(f"Dataset directory not found: {DATA_DIR}")
+def load_existing_keys():
+    """youtube_ids and (title, artist) pairs already in binaural_tracks, in one query."""
+    youtube_ids, title_artists = set(), set()
+    rows = db.session.query(BinauralTrack.youtube_id, BinauralTrack.title, BinauralTrack.artist)
+    for youtube_id, title, artist in rows.yield_per(5000):
+        if youtube_id:
+            youtube_ids.add(youtube_id)
+        title_artists.add((title, artist or ''))
+    return youtube_ids, title_artists
+
+
+def insert_statement():
+    """Batch INSERT into binaural_tracks that skips rows whose youtube_id already exists."""
+    table = BinauralTrack.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing(index_elements=['youtube_id'])
+    if dialect == 'sqlite':
+        return sqlite.insert(table).on_conflict_do_nothing(index_elements=['youtube_id'])
+    return table.insert()
+
+
+class ImportStats:
+    def __init__(self):
+        self.read = 0
+        self.inserted = 0
+        self.skipped = 0
+        self.failed_files = 0
+
+
+def new_rows(files, youtube_ids, title_artists, stats):
+    """Insert-ready dicts for rows not seen in the database or earlier in this import."""
+    for f in files:
+        print(f"Processing {f}")
+        source_file = os.path.relpath(f, BASE_DIR)
+        try:
+            for r in iter_rows(f):
+                stats.read += 1
+                if not isinstance(r, dict):
+                    stats.skipped += 1
+                    continue
+                nr = normalize_row(r)
+                key = (nr['title'], nr['artist'])
+                if not nr['title'] or key in title_artists or (nr['youtube_id'] and nr['youtube_id'] in youtube_ids):
+                    stats.skipped += 1
+                    continue
+                title_artists.add(key)
+                if nr['youtube_id']:
+                    youtube_ids.add(nr['youtube_id'])
+                yield {
+                    'title': nr['title'],
+                    'artist': nr['artist'] or None,
+                    'emotion': nr['emotion'] or None,
+                    'youtube_id': nr['youtube_id'] or None,
+                    'tags': nr['tags'] or None,
+                    'source_file': source_file
+                }
+        except (OSError, ValueError, csv.Error) as e:
+            print(f"  Failed to parse {f}: {e}")
+            stats.failed_files += 1
+
+
+def main(dry_run=False, batch_size=1000, data_dir=DATA_DIR):
+    if not os.path.isdir(data_dir):
+        print(f"Dataset directory not found: {data_dir}")
         return
 
-    files = find_files(DATA_DIR)
+    files = find_files(data_dir)
     if not files:
-        print(f"No CSV/JSON files found in {DATA_DIR}")
+        print(f"No CSV/JSON files found in {data_dir}")
         return
 
     print(f"Found {len(files)} files to import.")
 
     with app_mod.app.app_context():
-        inserted = 0
-        skipped = 0
-        for f in files:
-            print(f"Processing {f}")
-            try:
-                if f.lower().endswith('.csv'):
-                    rows = parse_csv(f)
-                else:
-                    rows = parse_json(f)
-            except Exception as e:
-                print(f"  Failed to parse {f}: {e}")
-                continue
-
-            for r in rows:
-                nr = normalize_row(r)
-                if not nr['title']:
-                    skipped += 1
-                    continue
-
-                # Skip duplicates by youtube_id
-                exists = None
-                if nr['youtube_id']:
-                    exists = BinauralTrack.query.filter_by(youtube_id=nr['youtube_id']).first()
-                if not exists:
-                    # Or match by title + artist
-                    exists = BinauralTrack.query.filter_by(title=nr['title'], artist=nr['artist']).first()
-
-                if exists:
-                    skipped += 1
-                    continue
-
-                if dry_run:
-                    print(f"  Dry-run: would insert: {nr['title']} ({nr['youtube_id']})")
-                    inserted += 1
-                else:
-                    track = BinauralTrack(
-                        title=nr['title'],
-                        artist=nr['artist'] or None,
-                        emotion=nr['emotion'] or None,
-                        youtube_id=nr['youtube_id'] or None,
-                        tags=nr['tags'] or None,
-                        source_file=os.path.relpath(f, BASE_DIR),
-                        created_at=datetime.utcnow()
-                    )
-                    try:
-                        db.session.add(track)
-                        db.session.commit()
-                        inserted += 1
-                        print(f"  Inserted: {track.title} (id={track.id})")
-                    except Exception as e:
-                        db.session.rollback()
-                        print(f"  Failed to insert {nr['title']}: {e}")
-                        skipped += 1
-
-        print(f"Import finished. Inserted: {inserted}, Skipped: {skipped}")
+        started = time.perf_counter()
+        stats = ImportStats()
+        youtube_ids, title_artists = load_existing_keys()
+        insert = insert_statement()
+        rows = new_rows(files, youtube_ids, title_artists, stats)
+        try:
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                # One executemany per batch; created_at comes from the column default
+                result = db.session.execute(insert, batch)
+                inserted = result.rowcount if result.rowcount >= 0 else len(batch)
+                stats.inserted += inserted
+                stats.skipped += len(batch) - inserted  # inserted concurrently
+            if dry_run:
+                db.session.rollback()
+            else:
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Import failed, nothing was written: {e}")
+            return
+        if stats.inserted and not dry_run:
+            # Core inserts skip the ORM flush hooks that bump the cache tag
+            route_cache.invalidate('binaural_tracks')
+
+        elapsed = time.perf_counter() - started
+        rate = stats.read / elapsed if elapsed else 0.0
+        print(f"Import finished{' (dry run, rolled back)' if dry_run else ''}. "
+              f"Inserted: {stats.inserted}, Skipped: {stats.skipped}, Unreadable files: {stats.failed_files}")
+        print(f"Read {stats.read} rows in {elapsed:.2f}s ({rate:,.0f} rows/s)")
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
-    parser.add_argument('--dry-run', action='store_true', help='Show what would be inserted without writing to DB')
+    parser.add_argument('--dry-run', action='store_true', help='Run the import in a transaction that is rolled back')
+    parser.add_argument('--batch', type=int, default=1000, help='Rows per INSERT executemany')
+    parser.add_argument('--dir', default=DATA_DIR, help='Dataset directory to scan')
     args = parser.parse_args()
-    main(dry_run=args.dry_run)
+    main(dry_run=args.dry_run, batch_size=args.batch, data_dir=args.dir)
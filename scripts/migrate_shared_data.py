@@ -0,0 +1,90 @@
+"""
+One-shot migration of uploaded voice recordings into the voice_logs table.
+
+Usage:
+    python -m scripts.migrate_shared_data [--uploads static/uploads] [--dry-run]
+
+Journal entries and voice logs used to live in the module-level dicts of the
+old shared_data.py, so their text was lost whenever a worker restarted and
+cannot be recovered. The recordings saved by /api/upload-voice as
+`<user_id>_<uuid>.wav` are still on disk: files without a voice_logs row get
+one (same uuid as id, dated by the file's mtime), idempotently; features and
+AI analysis are left empty.
+"""
+import argparse
+import os
+import re
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app import app
+from extensions import db
+from models import User, VoiceLog
+
+UPLOAD_NAME = re.compile(r'^(\d+)_([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})\.wav$')
+
+
+def _existing_ids(model, ids):
+    ids = list(ids)
+    found = set()
+    for start in range(0, len(ids), 500):
+        found.update(row_id for (row_id,) in db.session.query(model.id).filter(model.id.in_(ids[start:start + 500])))
+    return found
+
+
+def upload_voice_rows(uploads_dir, known_filenames):
+    for filename in sorted(os.listdir(uploads_dir)):
+        match = UPLOAD_NAME.match(filename)
+        if not match or filename in known_filenames:
+            continue
+        file_path = os.path.join(uploads_dir, filename)
+        yield VoiceLog(
+            id=match.group(2),
+            user_id=int(match.group(1)),
+            filename=filename,
+            file_path=file_path,
+            audio_features={},
+            created_at=datetime.utcfromtimestamp(os.path.getmtime(file_path))
+        )
+
+
+def insert_new(model, rows, user_ids, dry_run):
+    """Add rows whose id is not stored yet and whose user exists; returns the number added."""
+    rows = [row for row in rows if row.user_id in user_ids]
+    existing = _existing_ids(model, (row.id for row in rows))
+    added = 0
+    for row in rows:
+        if row.id in existing:
+            continue
+        existing.add(row.id)
+        if not dry_run:
+            db.session.add(row)
+        added += 1
+    return added
+
+
+def main(uploads_dir, dry_run):
+    with app.app_context():
+        user_ids = {user_id for (user_id,) in db.session.query(User.id)}
+        counts = {}
+        if uploads_dir and os.path.isdir(uploads_dir):
+            known = {filename for (filename,) in db.session.query(VoiceLog.filename)}
+            counts['voice logs'] = insert_new(VoiceLog, upload_voice_rows(uploads_dir, known), user_ids, dry_run)
+
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+        for label, added in counts.items():
+            print(f"  {label}: {added}")
+        print(f"{'Would import' if dry_run else 'Imported'} {sum(counts.values())} rows")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--uploads', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'uploads'),
+                        help='Directory with uploaded voice recordings')
+    parser.add_argument('--dry-run', action='store_true', help='Report what would be imported without writing')
+    args = parser.parse_args()
+    main(args.uploads, args.dry_run)
@@ -0,0 +1,29 @@
+"""
+Recompute the user_activity_stats table from the activity logs.
+
+Usage:
+    python -m scripts.rebuild_activity_stats
+
+The table is kept up to date as breathing, yoga, music and medication logs are
+inserted through the ORM, and is built automatically on first start against
+an existing database. Run this after loading logs in bulk (bypassing the ORM)
+or inserting backdated logs, whose streaks are not updated incrementally.
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app import app
+from models import rebuild_activity_stats
+
+
+def main():
+    with app.app_context():
+        started = time.perf_counter()
+        rows = rebuild_activity_stats()
+        print(f"Wrote {rows} activity stats rows in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
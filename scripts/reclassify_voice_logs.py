@@ -0,0 +1,59 @@
+"""
+Classify stored voice logs with the vectorized emotion classifier.
+
+Usage:
+    python -m scripts.reclassify_voice_logs [--all] [--batch 1000] [--dry-run]
+
+Scores the stored summary features (mean pitch, energy and ZCR) of each batch
+of voice logs in one call to emotion_classifier.classify_voice_logs. By
+default only logs without a local confidence are updated (rows saved before
+the classifier existed); `--all` also re-scores logs classified frame by frame
+at upload time, replacing their label with the summary-level one.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app import app
+from extensions import db
+from models import VoiceLog
+from emotion_classifier import classify_voice_logs
+
+
+def main(include_all, batch_size, dry_run):
+    with app.app_context():
+        query = VoiceLog.query.order_by(VoiceLog.id)
+        if not include_all:
+            query = query.filter(VoiceLog.emotion_confidence.is_(None))
+
+        classified, labels, last_id = 0, Counter(), None
+        started = time.perf_counter()
+        while True:
+            batch_query = query.filter(VoiceLog.id > last_id) if last_id is not None else query
+            batch = batch_query.limit(batch_size).all()
+            if not batch:
+                break
+            last_id = batch[-1].id
+            classified += classify_voice_logs(batch)
+            labels.update(log.emotion for log in batch if log.emotion_confidence is not None)
+            if dry_run:
+                db.session.rollback()
+            else:
+                db.session.commit()
+        elapsed = time.perf_counter() - started
+
+        for emotion, count in labels.most_common():
+            print(f"  {emotion}: {count}")
+        print(f"{'Would classify' if dry_run else 'Classified'} {classified} voice logs in {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--all', action='store_true', help='Re-score every voice log, not just unclassified ones')
+    parser.add_argument('--batch', type=int, default=1000, help='Voice logs per query and classifier call')
+    parser.add_argument('--dry-run', action='store_true', help='Report labels without writing')
+    args = parser.parse_args()
+    main(args.all, args.batch, args.dry_run)
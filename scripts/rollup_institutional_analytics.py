@@ -0,0 +1,39 @@
+"""
+Populate the institutional_analytics daily rollup table.
+
+Usage:
+    python -m scripts.rollup_institutional_analytics [--backfill 90] [--rebuild]
+
+Fills in days after each institution's last stored rollup up to yesterday (the
+same work the nightly background job does). `--backfill` sets how many days to
+go back for institutions without rollups; `--rebuild` deletes existing rows first.
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app import app
+from extensions import db
+from models import InstitutionalAnalytics
+from analytics_rollup import run_rollups, ROLLUP_BACKFILL_DAYS
+
+
+def main(backfill_days, rebuild):
+    with app.app_context():
+        if rebuild:
+            deleted = InstitutionalAnalytics.query.delete()
+            db.session.commit()
+            print(f"Deleted {deleted} existing rollup rows")
+        results = run_rollups(backfill_days=backfill_days)
+        for institution, written in sorted(results.items()):
+            print(f"  {institution}: {written} days")
+        print(f"Wrote {sum(results.values())} rollup rows for {len(results)} institutions")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backfill', type=int, default=ROLLUP_BACKFILL_DAYS, help='Days to backfill for institutions without rollups')
+    parser.add_argument('--rebuild', action='store_true', help='Delete existing rollups before recomputing')
+    args = parser.parse_args()
+    main(args.backfill, args.rebuild)
@@ -36,6 +36,84 @@ async function saveAssessment(payload) {
   }
 }
 /* === end saveAssessment helper === */
+/* === assessment insights rendering === */
+function renderAssessmentInsights(insights) {
+  const loadingEl = document.getElementById('aiInsightsLoading');
+  if (loadingEl) loadingEl.classList.add('hidden');
+
+  // Update Summary
+  const summaryEl = document.getElementById('aiSummary');
+  if (summaryEl && insights.summary) {
+    summaryEl.textContent = insights.summary;
+  }
+
+  // Update Recommendations
+  const recsEl = document.getElementById('aiRecommendations');
+  if (recsEl && insights.recommendations && Array.isArray(insights.recommendations)) {
+    recsEl.innerHTML = insights.recommendations.map(rec =>
+      `<li class="flex items-start"><i class="fas fa-check-circle text-green-500 mt-1 mr-2"></i><span>${rec}</span></li>`
+    ).join('');
+  }
+
+  // Update Resources
+  const resEl = document.getElementById('aiResources');
+  if (resEl && insights.resources && Array.isArray(insights.resources)) {
+    resEl.innerHTML = insights.resources.map(res =>
+      `<li class="flex items-start"><i class="fas fa-external-link-alt text-blue-500 mt-1 mr-2"></i><span>${res}</span></li>`
+    ).join('');
+  }
+
+  // Show the container
+  const contentEl = document.getElementById('aiInsightsContent');
+  if (contentEl) {
+    contentEl.classList.remove('hidden');
+    // Scroll to insights
+    contentEl.scrollIntoView({ behavior: 'smooth' });
+  }
+}
+
+// The assessment_insights job pushes its result to the user's room as a
+// job_complete event (see base_inline_2.js). Polling the assessment covers a
+// missing socket; whichever answers first renders the insights.
+function waitForAssessmentInsights(saved) {
+  const loadingEl = document.getElementById('aiInsightsLoading');
+  if (loadingEl) loadingEl.classList.remove('hidden');
+
+  let done = false;
+  let polls = 0;
+  const finish = (insights) => {
+    if (done) return;
+    done = true;
+    document.removeEventListener('job_complete', onComplete);
+    clearInterval(poller);
+    if (insights) {
+      renderAssessmentInsights(insights);
+    } else if (loadingEl) {
+      loadingEl.classList.add('hidden');
+    }
+  };
+  function onComplete(e) {
+    const data = e.detail || {};
+    if (data.job_type !== 'assessment_insights' || !data.result) return;
+    if (data.job_id !== saved.insights_job_id && data.result.assessment_id !== saved.assessment_id) return;
+    finish(data.result.ai_insights);
+  }
+  document.addEventListener('job_complete', onComplete);
+
+  const poller = setInterval(async () => {
+    polls += 1;
+    try {
+      const res = await fetch(`/patient/api/assessment/${saved.assessment_id}/insights`, { credentials: 'include' });
+      const body = await res.json();
+      if (body.success && !body.pending) return finish(body.ai_insights);
+    } catch (err) {
+      console.warn('Polling assessment insights failed', err);
+    }
+    // Give up after about two minutes; the insights show on the next visit
+    if (polls >= 24) finish(null);
+  }, 5000);
+}
+/* === end assessment insights rendering === */
 // static/js/assessment-fixes.js
 // Robust bindings and showQuestion() implementation
 
@@ -397,39 +475,11 @@ function openAssessmentModal(options) {
       const modal = document.getElementById('assessmentModal');
       if (modal) hideModal(modal);
 
-      // Dynamically update AI insights if available
+      // Insights come back inline, or are generated by a background job
       if (json.success && json.ai_insights) {
-        const insights = json.ai_insights;
-
-        // Update Summary
-        const summaryEl = document.getElementById('aiSummary');
-        if (summaryEl && insights.summary) {
-          summaryEl.textContent = insights.summary;
-        }
-
-        // Update Recommendations
-        const recsEl = document.getElementById('aiRecommendations');
-        if (recsEl && insights.recommendations && Array.isArray(insights.recommendations)) {
-          recsEl.innerHTML = insights.recommendations.map(rec =>
-            `<li class="flex items-start"><i class="fas fa-check-circle text-green-500 mt-1 mr-2"></i><span>${rec}</span></li>`
-          ).join('');
-        }
-
-        // Update Resources
-        const resEl = document.getElementById('aiResources');
-        if (resEl && insights.resources && Array.isArray(insights.resources)) {
-          resEl.innerHTML = insights.resources.map(res =>
-            `<li class="flex items-start"><i class="fas fa-external-link-alt text-blue-500 mt-1 mr-2"></i><span>${res}</span></li>`
-          ).join('');
-        }
-
-        // Show the container
-        const contentEl = document.getElementById('aiInsightsContent');
-        if (contentEl) {
-          contentEl.classList.remove('hidden');
-          // Scroll to insights
-          contentEl.scrollIntoView({ behavior: 'smooth' });
-        }
+        renderAssessmentInsights(json.ai_insights);
+      } else if (json.success && json.ai_insights_pending) {
+        waitForAssessmentInsights(json);
       } else {
         // If no insights returned immediately, maybe reload or show a message
         if (confirm('Assessment saved. Reload page to see updated history?')) {
@@ -36,6 +36,11 @@ document.addEventListener('click', function (e) {
                 socket.on('connect_error', function(error) {
                     console.error('WebSocket connection error:', error);
                 });
+
+                // Background AI enrichment finished; pages listen for the DOM event
+                socket.on('job_complete', function(data) {
+                    document.dispatchEvent(new CustomEvent('job_complete', { detail: data }));
+                });
                 
                 window.socket = socket; // Make socket available globally if needed
             } catch (error) {
@@ -77,6 +77,15 @@ document.addEventListener('DOMContentLoaded', function() {
 
     initializeCharts();
 
+    // AI analysis is filled in by a background job and pushed over the socket
+    document.addEventListener('job_complete', function(e) {
+        const data = e.detail || {};
+        if (data.job_type !== 'digital_detox_insights' || !data.result) return;
+        document.getElementById('ai-score').textContent = data.result.ai_score || 'N/A';
+        document.getElementById('ai-suggestion').textContent = data.result.ai_suggestion || 'No suggestion available';
+        document.getElementById('last-analysis-time').textContent = new Date().toLocaleTimeString();
+    });
+
     const form = document.getElementById('digital-detox-form');
     form.addEventListener('submit', async function(e) {
         e.preventDefault();
@@ -119,12 +128,17 @@ document.addEventListener('DOMContentLoaded', function() {
 
             if (result.success) {
                 // Update UI with new data
-                const aiScore = result.ai_analysis?.ai_score || 'N/A';
-                const aiSuggestion = result.ai_analysis?.ai_suggestion || 'No suggestion available';
-                
-                document.getElementById('ai-score').textContent = aiScore;
-                document.getElementById('ai-suggestion').textContent = aiSuggestion;
-                document.getElementById('last-analysis-time').textContent = new Date().toLocaleTimeString();
+                if (result.ai_pending) {
+                    document.getElementById('ai-score').textContent = '...';
+                    document.getElementById('ai-suggestion').textContent = 'Analyzing your data...';
+                } else {
+                    const aiScore = result.ai_analysis?.ai_score || 'N/A';
+                    const aiSuggestion = result.ai_analysis?.ai_suggestion || 'No suggestion available';
+
+                    document.getElementById('ai-score').textContent = aiScore;
+                    document.getElementById('ai-suggestion').textContent = aiSuggestion;
+                    document.getElementById('last-analysis-time').textContent = new Date().toLocaleTimeString();
+                }
                 
                 // Add new data to the log and re-initialize charts
                 if (result.log) {
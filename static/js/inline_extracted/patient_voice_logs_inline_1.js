@@ -19,6 +19,7 @@ function startRecording() {
 
             mediaRecorder.start();
             startTime = Date.now();
+            startPcmStream(stream);
 
             // Update UI
             document.getElementById('recordBtn').disabled = true;
@@ -66,6 +67,89 @@ function stopRecording() {
 
     // Stop waveform visualization
     stopWaveformVisualization();
+
+    // A streamed recording is saved by the server; the upload button is the fallback
+    if (finishPcmStream()) {
+        document.getElementById('uploadBtn').disabled = true;
+    }
+}
+
+// While recording, 16-bit PCM is also streamed over the socket so the server
+// extracts features as the audio arrives (voice_stream_* events). Chunks
+// produced before the server acknowledges the stream are held back and sent
+// in order once it does.
+let pcmStream = null;
+
+function startPcmStream(stream) {
+    if (!window.socket || !window.socket.connected) {
+        return;
+    }
+    const context = new (window.AudioContext || window.webkitAudioContext)();
+    const source = context.createMediaStreamSource(stream);
+    const processor = context.createScriptProcessor(4096, 1, 1);
+    const state = { context, source, processor, seq: 0, ready: false, failed: false, held: [] };
+
+    const send = pcm => window.socket.emit('voice_stream_chunk', { seq: state.seq++, pcm: pcm });
+
+    window.socket.off('voice_stream_error');
+    window.socket.on('voice_stream_error', () => { state.failed = true; });
+    window.socket.emit('voice_stream_start', { sample_rate: context.sampleRate }, response => {
+        if (response && response.success) {
+            state.ready = true;
+            state.held.forEach(send);
+        } else {
+            state.failed = true;
+        }
+        state.held = [];
+    });
+
+    processor.onaudioprocess = event => {
+        if (state.failed) {
+            return;
+        }
+        const input = event.inputBuffer.getChannelData(0);
+        const pcm = new Int16Array(input.length);
+        for (let i = 0; i < input.length; i++) {
+            const sample = Math.max(-1, Math.min(1, input[i]));
+            pcm[i] = sample < 0 ? sample * 0x8000 : sample * 0x7FFF;
+        }
+        if (state.ready) {
+            send(pcm.buffer);
+        } else {
+            state.held.push(pcm.buffer);
+        }
+    };
+    source.connect(processor);
+    processor.connect(context.destination); // onaudioprocess only fires on a connected node
+    pcmStream = state;
+}
+
+function finishPcmStream() {
+    const state = pcmStream;
+    pcmStream = null;
+    if (!state) {
+        return false;
+    }
+    state.processor.disconnect();
+    state.source.disconnect();
+    state.context.close();
+    if (!state.ready || state.failed) {
+        return false;
+    }
+
+    const status = document.getElementById('recordingStatus');
+    status.textContent = 'Saving and analyzing your recording...';
+    status.className = 'text-sm text-blue-600 mb-2';
+    window.socket.emit('voice_stream_end', { chunks: state.seq }, response => {
+        if (response && response.success) {
+            location.reload(); // Refresh to show new voice log
+        } else {
+            status.textContent = 'Streaming failed; use Upload to save the recording.';
+            status.className = 'text-sm text-red-600 mb-2';
+            document.getElementById('uploadBtn').disabled = false;
+        }
+    });
+    return true;
 }
 
 function uploadRecording() {
@@ -93,7 +177,7 @@ function uploadRecording() {
         document.getElementById('uploadStatus').classList.add('hidden');
 
         if (data.success) {
-            location.reload(); // Refresh to show new voice log
+            waitForAnalysis(data);
         } else {
             alert('Upload failed: ' + data.message);
         }
@@ -105,6 +189,24 @@ function uploadRecording() {
     });
 }
 
+// Audio features are extracted by a background job; its result is pushed over
+// the socket as a job_complete event. Reload once it arrives (or after a
+// timeout when the socket is unavailable).
+function waitForAnalysis(upload) {
+    const status = document.getElementById('recordingStatus');
+    status.textContent = 'Uploaded. Analyzing your recording...';
+    status.className = 'text-sm text-blue-600 mb-2';
+
+    const fallback = setTimeout(() => location.reload(), 30000);
+    document.addEventListener('job_complete', function onComplete(e) {
+        const data = e.detail || {};
+        if (data.job_id !== upload.job_id) return;
+        document.removeEventListener('job_complete', onComplete);
+        clearTimeout(fallback);
+        location.reload();
+    });
+}
+
 // Simple waveform visualization
 let audioContext, analyser, dataArray, canvasCtx, animationId;
 
@@ -371,15 +371,15 @@ function showNotification(message, type) {
   // Wrap fetch used for progress with debug output so when server returns 500, client logs useful info
   const originalFetch = window.fetch;
   window.fetch = function(input, init){
-    if (typeof input === 'string' && input.includes('/patient/api/progress')) {
-      console.debug('[DEBUG] calling progress API', input, init);
+    if (typeof input === 'string' && input.includes('/api/series/')) {
+      console.debug('[DEBUG] calling series API', input, init);
       return originalFetch(input, init).then(res => {
         if (!res.ok) {
-          console.warn('[DEBUG] progress API failed', res.status, res.statusText);
+          console.warn('[DEBUG] series API failed', res.status, res.statusText);
         }
         return res;
       }).catch(err => {
-        console.error('[DEBUG] progress API network error', err);
+        console.error('[DEBUG] series API network error', err);
         throw err;
       });
     }
@@ -390,24 +390,29 @@ function showNotification(message, type) {
 (function(){
   async function renderProgressCharts() {
     try {
-      const res = await fetch('/patient/api/progress', { credentials: 'include' });
-      const txt = await res.text();
-      const payload = txt ? JSON.parse(txt) : {};
+      // Bucketed, downsampled series: the payload size does not grow with history
+      const fetchSeries = async (metric) => {
+        const res = await fetch(`/api/series/${metric}?period=day&points=120`, { credentials: 'include' });
+        const txt = await res.text();
+        const payload = txt ? JSON.parse(txt) : {};
+        return payload.ok ? payload : { labels: [], mean: [] };
+      };
+      const [gad7, phq9, mood] = await Promise.all([fetchSeries('gad7'), fetchSeries('phq9'), fetchSeries('mood')]);
 
-      const assessments = payload.assessments || [];
-      const moods = payload.moods || [];
-
-      const aLabels = assessments.map(a => a.created_at ? a.created_at.slice(0,16) : '');
-      const aScores = assessments.map(a => Number(a.score || 0));
-      const mLabels = moods.map(m => m.created_at ? m.created_at.slice(0,16) : '');
-      const mValues = moods.map(m => Number(m.mood || 0));
+      const aLabels = Array.from(new Set(gad7.labels.concat(phq9.labels))).sort();
+      const byLabel = (series) => {
+        const values = new Map(series.labels.map((label, i) => [label, series.mean[i]]));
+        return aLabels.map(label => values.has(label) ? values.get(label) : null);
+      };
+      const mLabels = mood.labels;
+      const mValues = mood.mean;
 
       if (window.Chart) {
         if (document.getElementById('assessment-history-chart') || document.getElementById('assessmentChart')) {
           const canvas = document.getElementById('assessment-history-chart') || document.getElementById('assessmentChart');
           const ctx = canvas.getContext('2d');
           if (window._assessmentChart) window._assessmentChart.destroy();
-          window._assessmentChart = new Chart(ctx, { type: 'line', data: { labels: aLabels, datasets: [{ label: 'Assessment Score', data: aScores, fill:false, tension:0.2 }] }, options: { responsive:true, maintainAspectRatio:false } });
+          window._assessmentChart = new Chart(ctx, { type: 'line', data: { labels: aLabels, datasets: [{ label: 'GAD-7', data: byLabel(gad7), fill:false, tension:0.2, spanGaps:true }, { label: 'PHQ-9', data: byLabel(phq9), fill:false, tension:0.2, spanGaps:true }] }, options: { responsive:true, maintainAspectRatio:false } });
         }
         if (document.getElementById('mood-history-chart') || document.getElementById('moodChart')) {
           const canvas = document.getElementById('mood-history-chart') || document.getElementById('moodChart');
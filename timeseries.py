@@ -0,0 +1,250 @@
+"""
+Day-bucketed chart series.
+
+Chart endpoints used to load every row a user ever wrote and align them in
+Python with a scan (or `list.index`) per label, which is quadratic. Here the
+database buckets rows by day and series key (GROUP BY day, key, or the last
+row per bucket through a window function), and `pivot` turns the day-ordered
+buckets into a label array plus one aligned value array per series in a
+single pass. Series are limited to the last CHART_WINDOW_DAYS days and
+coarsened to at most CHART_MAX_POINTS points.
+
+`summary_series` backs /api/series/<metric>: min/mean/max/count per hour,
+day, week or month bucket, downsampled with Largest-Triangle-Three-Buckets
+to a requested point count, so a chart payload stays the same size however
+long a patient has been logging.
+"""
+import os
+from collections import namedtuple
+from functools import lru_cache
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, select
+
+from extensions import db
+
+CHART_WINDOW_DAYS = int(os.environ.get("CHART_WINDOW_DAYS", "365"))
+CHART_MAX_POINTS = int(os.environ.get("CHART_MAX_POINTS", "120"))
+SERIES_MAX_POINTS = int(os.environ.get("SERIES_MAX_POINTS", "1000"))
+
+PERIODS = ('hour', 'day', 'week', 'month')
+# SQLite bucket labels; other backends use date_trunc and format the same way
+_PERIOD_FORMATS = {'hour': '%Y-%m-%dT%H:00', 'day': '%Y-%m-%d', 'week': '%Y-%m-%d', 'month': '%Y-%m'}
+
+AGGREGATES = {
+    'avg': func.avg,
+    'sum': func.sum,
+    'min': func.min,
+    'max': func.max,
+    'count': func.count,
+}
+
+ChartSeries = namedtuple('ChartSeries', ['labels', 'series'])
+
+
+def _label(day):
+    # SQLite's date() returns text, other backends a date
+    return day if isinstance(day, str) else day.isoformat()
+
+
+def window_start(days, today=None):
+    """First day of a `days`-day window ending today; None for an unbounded window."""
+    if not days:
+        return None
+    return (today or date.today()) - timedelta(days=days - 1)
+
+
+def _since(time_column, since):
+    if since is None:
+        return []
+    if isinstance(time_column.type, db.DateTime):
+        since = datetime.combine(since, datetime.min.time())
+    return [time_column >= since]
+
+
+def bucket_query(value, time_column, filters=(), key=None, keys=None, agg='last', since=None):
+    """
+    SELECT of (day, key, value) rows, one per day and key, ordered by day.
+
+    `agg` is 'last' (the value of the latest row of the bucket) or one of
+    AGGREGATES. Without `key` every row belongs to a single series, None.
+    """
+    day = func.date(time_column)
+    buckets = (day,) if key is None else (day, key)
+    key_expr = key if key is not None else db.null()
+    conditions = list(filters) + _since(time_column, since)
+    if keys is not None and key is not None:
+        conditions.append(key.in_(keys))
+
+    if agg == 'last':
+        ranked = select(
+            day.label('day'), key_expr.label('key'), value.label('value'),
+            func.row_number().over(partition_by=buckets, order_by=time_column.desc()).label('rn')
+        ).where(*conditions).subquery()
+        return select(ranked.c.day, ranked.c.key, ranked.c.value).where(ranked.c.rn == 1).order_by(ranked.c.day)
+    return select(day.label('day'), key_expr.label('key'), AGGREGATES[agg](value).label('value')) \
+        .where(*conditions).group_by(*buckets).order_by(day)
+
+
+def pivot(rows, keys=(None,)):
+    """
+    One pass over day-ordered (day, key, value) rows into a ChartSeries: one
+    label per day and, for every key, a value per label (None where that
+    series has no bucket). Rows of other keys are ignored.
+    """
+    labels = []
+    series = {k: [] for k in keys}
+    for day, key, value in rows:
+        column = series.get(key)
+        if column is None:
+            continue
+        label = _label(day)
+        if not labels or labels[-1] != label:
+            labels.append(label)
+            for values in series.values():
+                values.append(None)
+        column[-1] = value
+    return ChartSeries(labels, series)
+
+
+def coarsen(chart, max_points=CHART_MAX_POINTS):
+    """
+    At most `max_points` points: consecutive labels are merged into equal
+    groups, each keeping its last label and, per series, its last value.
+    """
+    count = len(chart.labels)
+    if not max_points or count <= max_points:
+        return chart
+    step = -(-count // max_points)
+    labels = []
+    series = {k: [] for k in chart.series}
+    for start in range(0, count, step):
+        end = min(start + step, count)
+        labels.append(chart.labels[end - 1])
+        for k, values in chart.series.items():
+            group = [v for v in values[start:end] if v is not None]
+            series[k].append(group[-1] if group else None)
+    return ChartSeries(labels, series)
+
+
+def day_series(value, time_column, filters=(), key=None, keys=(None,), agg='last',
+               days=CHART_WINDOW_DAYS, max_points=CHART_MAX_POINTS):
+    """Aligned labels and per-key series of `value` bucketed by day over the last `days` days."""
+    query = bucket_query(value, time_column, filters, key, None if key is None else keys, agg, window_start(days))
+    return coarsen(pivot(db.session.execute(query), keys), max_points)
+
+
+def assessment_series(user_id, types=('GAD-7', 'PHQ-9'), days=CHART_WINDOW_DAYS, max_points=CHART_MAX_POINTS):
+    """Each assessment type's last score per day for a user, on shared day labels."""
+    from models import Assessment
+
+    return day_series(
+        Assessment.score, Assessment.created_at, [Assessment.user_id == user_id],
+        key=Assessment.assessment_type, keys=types, days=days, max_points=max_points
+    )
+
+
+def period_bucket(time_column, period, dialect_name):
+    """Expression for the start of the hour/day/week (Monday)/month containing `time_column`."""
+    if dialect_name == 'sqlite':
+        if period == 'week':
+            return func.date(time_column, '-6 days', 'weekday 1')
+        return func.strftime(_PERIOD_FORMATS[period], time_column)
+    return func.date_trunc(period, time_column)
+
+
+def _period_label(bucket, period):
+    return bucket if isinstance(bucket, str) else bucket.strftime(_PERIOD_FORMATS[period])
+
+
+def _label_time(label):
+    # Month labels ('2024-05') are not ISO dates on their own
+    return datetime.fromisoformat(label if len(label) > 7 else f"{label}-01").timestamp()
+
+
+def lttb(xs, ys, threshold):
+    """
+    Indices of the `threshold` points Largest-Triangle-Three-Buckets keeps
+    from (xs, ys): the first and last point, and from each of the equal
+    buckets in between the point forming the largest triangle with the
+    previously kept point and the average of the next bucket.
+    """
+    count = len(xs)
+    if threshold >= count:
+        return list(range(count))
+    if threshold < 3:
+        return [0, count - 1]
+    kept = [0]
+    every = (count - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, count)
+        span = next_end - end
+        avg_x = sum(xs[end:next_end]) / span
+        avg_y = sum(ys[end:next_end]) / span
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        kept.append(best)
+        a = best
+    kept.append(count - 1)
+    return kept
+
+
+@lru_cache(maxsize=None)
+def series_metrics():
+    """Metric name -> (value column, time column, owner column, extra filters) for /api/series."""
+    from models import Assessment, DigitalDetoxLog, MoodLog, RPMData
+
+    return {
+        'mood': (MoodLog.mood_score, MoodLog.created_at, MoodLog.user_id, ()),
+        'rpm_mood': (RPMData.mood_score, RPMData.date, RPMData.user_id, ()),
+        'heart_rate': (RPMData.heart_rate, RPMData.date, RPMData.user_id, ()),
+        'sleep': (RPMData.sleep_duration, RPMData.date, RPMData.user_id, ()),
+        'steps': (RPMData.steps, RPMData.date, RPMData.user_id, ()),
+        'screen_time': (DigitalDetoxLog.screen_time_hours, DigitalDetoxLog.date, DigitalDetoxLog.user_id, ()),
+        'gad7': (Assessment.score, Assessment.created_at, Assessment.user_id, (Assessment.assessment_type == 'GAD-7',)),
+        'phq9': (Assessment.score, Assessment.created_at, Assessment.user_id, (Assessment.assessment_type == 'PHQ-9',)),
+    }
+
+
+def summary_series(metric, user_id, period='day', points=CHART_MAX_POINTS, days=CHART_WINDOW_DAYS):
+    """
+    min/mean/max/count of a metric per period bucket over the last `days` days
+    (all history for 0), LTTB-downsampled on the mean to at most `points`
+    buckets. Raises ValueError for an unknown metric or period or a point
+    count outside 2..SERIES_MAX_POINTS.
+    """
+    if metric not in series_metrics():
+        raise ValueError(f"Unknown metric '{metric}', expected one of {', '.join(sorted(series_metrics()))}")
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period '{period}', expected one of {', '.join(PERIODS)}")
+    if not 2 <= points <= SERIES_MAX_POINTS:
+        raise ValueError(f"points must be between 2 and {SERIES_MAX_POINTS}")
+    value, time_column, owner, filters = series_metrics()[metric]
+
+    bucket = period_bucket(time_column, period, db.session.get_bind().dialect.name).label('bucket')
+    query = select(
+        bucket, func.min(value), func.avg(value), func.max(value), func.count(value)
+    ).where(owner == user_id, *filters, *_since(time_column, window_start(days))) \
+        .group_by(bucket).having(func.count(value) > 0).order_by(bucket)
+    rows = db.session.execute(query).all()
+
+    labels = [_period_label(row[0], period) for row in rows]
+    means = [float(row[2]) for row in rows]
+    kept = lttb([_label_time(label) for label in labels], means, points) if len(rows) > points else range(len(rows))
+    return {
+        'metric': metric,
+        'period': period,
+        'buckets': len(rows),
+        'labels': [labels[i] for i in kept],
+        'min': [rows[i][1] for i in kept],
+        'mean': [round(means[i], 3) for i in kept],
+        'max': [rows[i][3] for i in kept],
+        'count': [rows[i][4] for i in kept],
+    }
@@ -26,3 +26,101 @@ def init_db():
     except Exception as e:
         current_app.logger.error(f"Database initialization error: {str(e)}", exc_info=True)
         return False
+
+# Nullable columns added to existing tables after their first release.
+# db.create_all() never alters existing tables, so ensure_schema() adds these.
+# Types are DDL strings valid on every backend, or SQLAlchemy types compiled
+# for the connected dialect (there is no DATETIME on PostgreSQL).
+SCHEMA_ADDITIONS = {
+    'institutional_analytics': [
+        ('completion_rate', 'FLOAT'),
+        ('updated_at', db.DateTime()),
+        ('day_screen_time', 'FLOAT',
+         "UPDATE institutional_analytics SET day_screen_time = (SELECT AVG(d.screen_time_hours) "
+         "FROM digital_detox_logs d JOIN users u ON u.id = d.user_id WHERE u.role = 'patient' "
+         "AND u.institution = institutional_analytics.institution AND d.date = institutional_analytics.date)"),
+    ],
+    # Optional third element: statement that backfills the new column
+    'blog_posts': [
+        ('like_count', 'INTEGER NOT NULL DEFAULT 0',
+         'UPDATE blog_posts SET like_count = (SELECT COUNT(*) FROM blog_likes WHERE blog_likes.post_id = blog_posts.id)'),
+        ('comment_count', 'INTEGER NOT NULL DEFAULT 0',
+         'UPDATE blog_posts SET comment_count = (SELECT COUNT(*) FROM blog_comments WHERE blog_comments.post_id = blog_posts.id)'),
+    ],
+    'voice_logs': [
+        ('emotion_confidence', 'FLOAT'),
+        ('emotion_timeline', db.JSON()),
+    ],
+    'gamification': [
+        ('weekly_points', 'INTEGER NOT NULL DEFAULT 0'),
+        ('week_start', 'DATE'),
+    ],
+}
+
+# Statements run in the same transaction before a unique index is added to an
+# existing table, merging the duplicate rows it would reject
+INDEX_PREPARATIONS = {
+    # Concurrent first awards could create several gamification rows per user:
+    # fold their totals into the oldest row, then drop the others
+    'ux_gamification_user_id': [
+        '''UPDATE gamification SET
+               points = (SELECT SUM(COALESCE(g.points, 0)) FROM gamification g WHERE g.user_id = gamification.user_id),
+               streak = (SELECT MAX(g.streak) FROM gamification g WHERE g.user_id = gamification.user_id),
+               last_activity = (SELECT MAX(g.last_activity) FROM gamification g WHERE g.user_id = gamification.user_id),
+               week_start = (SELECT MAX(g.week_start) FROM gamification g WHERE g.user_id = gamification.user_id),
+               weekly_points = COALESCE((SELECT SUM(COALESCE(g.weekly_points, 0)) FROM gamification g
+                                         WHERE g.user_id = gamification.user_id AND g.week_start =
+                                             (SELECT MAX(h.week_start) FROM gamification h WHERE h.user_id = gamification.user_id)), 0)
+           WHERE id IN (SELECT MIN(id) FROM gamification GROUP BY user_id HAVING COUNT(*) > 1)''',
+        'DELETE FROM gamification WHERE id NOT IN (SELECT MIN(id) FROM gamification GROUP BY user_id)',
+    ],
+    # Earlier imports only deduplicated in process; keep the first row per video
+    'ux_binaural_tracks_youtube_id': [
+        'DELETE FROM binaural_tracks WHERE youtube_id IS NOT NULL AND id NOT IN '
+        '(SELECT MIN(id) FROM binaural_tracks WHERE youtube_id IS NOT NULL GROUP BY youtube_id)',
+    ],
+}
+
+def _column_ddl(ddl_type, dialect):
+    return ddl_type if isinstance(ddl_type, str) else ddl_type.compile(dialect=dialect)
+
+def ensure_schema():
+    """Create missing tables, then add missing columns and indexes to existing ones."""
+    try:
+        with current_app.app_context():
+            db.create_all()
+            inspector = db.inspect(db.engine)
+            for table, columns in SCHEMA_ADDITIONS.items():
+                existing = {col['name'] for col in inspector.get_columns(table)}
+                for name, ddl_type, *backfill in columns:
+                    if name in existing:
+                        continue
+                    # One transaction per column and its backfill, so a failing
+                    # addition does not roll back or block the others
+                    try:
+                        with db.engine.begin() as conn:
+                            conn.execute(db.text(
+                                f"ALTER TABLE {table} ADD COLUMN {name} {_column_ddl(ddl_type, conn.dialect)}"))
+                            for statement in backfill:
+                                conn.execute(db.text(statement))
+                        current_app.logger.info(f"Added column {table}.{name}")
+                    except SQLAlchemyError as e:
+                        current_app.logger.error(f"Could not add column {table}.{name}: {e}")
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    try:
+                        preparation = INDEX_PREPARATIONS.get(index.name)
+                        if preparation and index.name not in {ix['name'] for ix in inspector.get_indexes(table.name)}:
+                            with db.engine.begin() as conn:
+                                for statement in preparation:
+                                    conn.execute(db.text(statement))
+                                index.create(conn, checkfirst=True)
+                            current_app.logger.info(f"Added index {index.name}")
+                        else:
+                            index.create(db.engine, checkfirst=True)
+                    except SQLAlchemyError as e:
+                        current_app.logger.warning(f"Could not create index {index.name}: {e}")
+            return True
+    except Exception as e:
+        current_app.logger.error(f"Schema upgrade error: {str(e)}", exc_info=True)
+        return False
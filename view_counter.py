@@ -0,0 +1,126 @@
+"""
+Write-behind accumulator for blog post view counts.
+
+`GET /blog/<id>` used to increment `views` and commit on every read, which made
+a read-heavy page a write transaction serialized on the post row (and on the
+whole database under SQLite). Views are now counted in process memory and
+written with one bulk UPDATE ... CASE statement every VIEW_FLUSH_INTERVAL
+seconds, when VIEW_FLUSH_HITS views are pending, and at interpreter exit.
+
+Flushes add to the stored value, so several processes each running their own
+counter stay correct. Views counted since the last flush are lost only if the
+process is killed without running exit handlers.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import case, func
+
+from extensions import db
+from models import BlogPost
+
+logger = logging.getLogger(__name__)
+
+VIEW_FLUSH_INTERVAL = float(os.environ.get("VIEW_FLUSH_INTERVAL", "10"))
+VIEW_FLUSH_HITS = int(os.environ.get("VIEW_FLUSH_HITS", "500"))
+
+
+class ViewCounter:
+    """Thread-safe per-post view accumulator with bulk flushes."""
+
+    def __init__(self, flush_hits=VIEW_FLUSH_HITS):
+        self.flush_hits = flush_hits
+        self._pending = Counter()
+        self._pending_hits = 0
+        self._lock = threading.Lock()
+        self._app = None
+        self._started = False
+        self.flushed_views = 0
+        self.flushes = 0
+
+    def hit(self, post_id, count=1):
+        """Record views of `post_id`; flushes inline once enough views are pending."""
+        with self._lock:
+            self._pending[post_id] += count
+            self._pending_hits += count
+            due = self._pending_hits >= self.flush_hits
+        if due:
+            self.flush()
+
+    def pending(self, post_id):
+        """Views of `post_id` not yet written to the database."""
+        with self._lock:
+            return self._pending.get(post_id, 0)
+
+    def _take(self):
+        with self._lock:
+            batch, self._pending = self._pending, Counter()
+            self._pending_hits = 0
+        return batch
+
+    def _restore(self, batch):
+        with self._lock:
+            self._pending.update(batch)
+            self._pending_hits += sum(batch.values())
+
+    def flush(self):
+        """Write all pending views in a single UPDATE; returns the number of views written."""
+        batch = self._take()
+        if not batch:
+            return 0
+        stmt = BlogPost.__table__.update().where(
+            BlogPost.__table__.c.id.in_(list(batch))
+        ).values(
+            views=func.coalesce(BlogPost.__table__.c.views, 0) + case(dict(batch), value=BlogPost.__table__.c.id, else_=0)
+        )
+        try:
+            # Own connection/transaction, independent of the request's session
+            with db.engine.begin() as conn:
+                conn.execute(stmt)
+        except Exception:
+            self._restore(batch)
+            logger.exception(f"Failed to flush {sum(batch.values())} blog views; will retry")
+            return 0
+        written = sum(batch.values())
+        self.flushed_views += written
+        self.flushes += 1
+        return written
+
+    def _flush_in_app(self):
+        if self._app is None:
+            return self.flush()
+        with self._app.app_context():
+            return self.flush()
+
+    def _flush_loop(self, sleep):
+        while True:
+            sleep(VIEW_FLUSH_INTERVAL)
+            try:
+                self._flush_in_app()
+            except Exception:
+                logger.exception("Blog view flush loop error")
+
+    def start(self, app, socketio=None):
+        """Start the periodic flusher and register the exit flush; returns True on the first call."""
+        if self._started:
+            return False
+        self._started = True
+        self._app = app
+        atexit.register(self._flush_in_app)
+        if socketio is not None:
+            socketio.start_background_task(self._flush_loop, socketio.sleep)
+        else:
+            threading.Thread(target=self._flush_loop, args=(time.sleep,), daemon=True).start()
+        return True
+
+    def stats(self):
+        with self._lock:
+            pending = self._pending_hits
+        return {'pending_views': pending, 'flushed_views': self.flushed_views, 'flushes': self.flushes}
+
+
+view_counter = ViewCounter()
@@ -0,0 +1,176 @@
+"""
+Voice recording feature extraction in a process pool.
+
+Analysing an upload with librosa (decode/resample up to VOICE_MAX_SECONDS of
+audio, pitch tracking, RMS, zero-crossing rate, spectral centroid) is seconds
+of CPU. Done in the request handler it pinned the single eventlet worker, so
+`upload_voice` now only stores the file and the VoiceLog row and enqueues a
+`voice_features` job (see enrichment_jobs.py). The job runs on its own
+job_queue workers, one per pool process, sends the file to a pool of
+VOICE_ANALYSIS_WORKERS processes and waits for it cooperatively, keeping the
+hub, the serving process's GIL and the shared job workers free; the result is pushed
+to the user over SocketIO by job_queue. At most VOICE_ANALYSIS_QUEUE analyses
+may be waiting or running; uploads beyond that are refused with a 503.
+
+Pitch tracking and the spectral centroid are computed from one shared
+magnitude STFT instead of each librosa feature recomputing its own; RMS and
+ZCR are time-domain and framed with the same hop, so every feature lines up
+frame for frame and the frames are classified together by emotion_classifier.
+"""
+import importlib.util
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from emotion_classifier import EmotionResult, SILENCE_RMS, classify_frames
+
+logger = logging.getLogger(__name__)
+
+VOICE_ANALYSIS_WORKERS = int(os.environ.get("VOICE_ANALYSIS_WORKERS", "2"))
+VOICE_ANALYSIS_QUEUE = int(os.environ.get("VOICE_ANALYSIS_QUEUE", "16"))
+VOICE_ANALYSIS_TIMEOUT = float(os.environ.get("VOICE_ANALYSIS_TIMEOUT", "120"))
+VOICE_MAX_SECONDS = float(os.environ.get("VOICE_MAX_SECONDS", "120"))
+
+SAMPLE_RATE = 22050
+N_FFT = 2048
+HOP_LENGTH = 512
+
+MIN_PITCH_HZ = 60
+MAX_PITCH_HZ = 400
+VOICED_CORRELATION = 0.3
+
+# librosa (numba/scipy) is imported where it is used, and the app side (ai,
+# models) inside the functions that run in the serving process. Spawned
+# children still re-import the parent's __main__ (as __mp_main__): under
+# `python app.py` that runs the whole app module, minus its __main__ block, in
+# every analysis process, so the pool is long-lived rather than per file
+LIBROSA_AVAILABLE = importlib.util.find_spec('librosa') is not None
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _summary(features, name, values):
+    features[f'mean_{name}'] = float(np.mean(values))
+    features[f'{name}_std'] = float(np.std(values))
+
+
+def frame_pitch(frames, sample_rate, rms):
+    """
+    Fundamental frequency per frame by autocorrelation; NaN for silent or unvoiced frames.
+
+    `frames` is (n_frames, frame_length) and `rms` their RMS energy.
+    """
+    frame_length = frames.shape[1]
+    min_lag = max(1, int(sample_rate / MAX_PITCH_HZ))
+    max_lag = min(frame_length - 1, int(sample_rate / MIN_PITCH_HZ))
+    # Autocorrelation via the power spectrum, zero-padded so it is not circular
+    centred = frames - frames.mean(axis=1, keepdims=True)
+    power = np.abs(np.fft.rfft(centred, n=2 * frame_length, axis=1)) ** 2
+    autocorr = np.fft.irfft(power, axis=1)[:, :max_lag + 1]
+    lags = np.argmax(autocorr[:, min_lag:], axis=1) + min_lag
+    peak = autocorr[np.arange(len(lags)), lags]
+    energy = autocorr[:, 0]
+    voiced = (rms > SILENCE_RMS) & (energy > 0) & (peak > VOICED_CORRELATION * energy)
+    return np.where(voiced, sample_rate / lags, np.nan)
+
+
+def extract_features(file_path, max_duration=VOICE_MAX_SECONDS):
+    """
+    Acoustic summary features of an audio file and its frame-level emotion
+    classification; runs in the analysis processes.
+
+    Returns (features, EmotionResult). Features have the same keys upload_voice
+    used to compute inline plus `analysis_cpu_seconds`, the CPU time spent on
+    this file.
+    """
+    import librosa
+
+    started = time.process_time()
+    y, sr = librosa.load(file_path, sr=SAMPLE_RATE, duration=max_duration)
+    features = {'duration': len(y) / sr, 'sample_rate': sr}
+    emotion = EmotionResult('neutral', 0.0, [])
+    if len(y):
+        magnitude = np.abs(librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH))
+
+        pitches, _ = librosa.piptrack(S=magnitude, sr=sr, n_fft=N_FFT, hop_length=HOP_LENGTH)
+        pitch_values = pitches[pitches > 0]
+        if pitch_values.size:
+            _summary(features, 'pitch', pitch_values)
+        rms = librosa.feature.rms(y=y, frame_length=N_FFT, hop_length=HOP_LENGTH)[0]
+        zcr = librosa.feature.zero_crossing_rate(y, frame_length=N_FFT, hop_length=HOP_LENGTH)[0]
+        _summary(features, 'energy', rms)
+        _summary(features, 'zcr', zcr)
+        _summary(features, 'spectral_centroid', librosa.feature.spectral_centroid(
+            S=magnitude, sr=sr, n_fft=N_FFT, hop_length=HOP_LENGTH
+        ))
+
+        # piptrack's bins include harmonics; classify frames on their f0, framed
+        # (centred) like rms and zcr
+        frames = librosa.util.frame(np.pad(y, N_FFT // 2), frame_length=N_FFT, hop_length=HOP_LENGTH).T
+        rms, zcr = rms[:len(frames)], zcr[:len(frames)]
+        emotion = classify_frames(frame_pitch(frames, sr, rms), rms, zcr, HOP_LENGTH / sr)
+    features['analysis_cpu_seconds'] = round(time.process_time() - started, 4)
+    return features, emotion
+
+
+def get_executor():
+    """The shared process pool, created on first use in the serving process."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn, not fork: children never inherit the hub, sockets or db connections
+            _executor = ProcessPoolExecutor(
+                max_workers=VOICE_ANALYSIS_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            logger.info(f"Started voice analysis pool with {VOICE_ANALYSIS_WORKERS} processes")
+        return _executor
+
+
+def _reset_executor(broken):
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def analyze(file_path, timeout=VOICE_ANALYSIS_TIMEOUT):
+    """(features, EmotionResult) for `file_path`, computed in the process pool (inline when VOICE_ANALYSIS_WORKERS=0)."""
+    if VOICE_ANALYSIS_WORKERS <= 0:
+        from ai.executor import offload
+        return offload(extract_features, file_path)
+    executor = get_executor()
+    try:
+        future = executor.submit(extract_features, file_path)
+        # Under eventlet the pool's manager thread and this wait are both green,
+        # so waiting here yields to the hub; the CPU work is in the child process
+        return future.result(timeout)
+    except BrokenProcessPool:
+        # A child died (e.g. OOM on a huge file); start a fresh pool for the next job
+        logger.error("Voice analysis pool broke; restarting it")
+        _reset_executor(executor)
+        raise
+
+
+def queue_full():
+    """True when VOICE_ANALYSIS_QUEUE analyses are already waiting or running."""
+    return backlog() >= VOICE_ANALYSIS_QUEUE
+
+
+def backlog():
+    """Voice feature jobs not finished yet, across all processes sharing the database."""
+    from extensions import db
+    from models import BackgroundJob
+
+    return db.session.query(db.func.count(BackgroundJob.id)).filter(
+        BackgroundJob.job_type == 'voice_features',
+        BackgroundJob.status.in_(('pending', 'running'))
+    ).scalar()
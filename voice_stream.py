@@ -0,0 +1,230 @@
+"""
+Incremental feature extraction for voice recordings streamed as PCM.
+
+While recording, the voice logs page sends 16-bit mono PCM chunks over
+SocketIO (the `voice_stream_*` events in app.py). Each chunk is appended to
+the WAV file, cut into analysis frames and folded into running mean/variance
+accumulators and per-segment emotion scores, so when the last chunk arrives
+the features are a frame or two of work away and memory stays at one chunk
+plus one frame however long the clip is. Nothing is re-read from disk.
+
+Features use the same keys as voice_analysis.extract_features. Pitch here is
+a per-frame autocorrelation estimate over voiced frames rather than the
+average of librosa's piptrack bins, so values are comparable with the
+file-based path but not identical.
+"""
+import logging
+import os
+import threading
+import time
+import wave
+
+import numpy as np
+
+from emotion_classifier import EmotionTimeline
+from voice_analysis import N_FFT, HOP_LENGTH, SAMPLE_RATE, VOICE_MAX_SECONDS, frame_pitch
+
+logger = logging.getLogger(__name__)
+
+VOICE_STREAM_MAX = int(os.environ.get("VOICE_STREAM_MAX", "8"))
+# Chunks may be handled out of order; this many may wait for a missing one
+VOICE_STREAM_REORDER = 32
+MAX_CHUNK_BYTES = 1024 * 1024
+
+_streams = {}
+_streams_lock = threading.Lock()
+
+
+class RunningStats:
+    """Mean/variance accumulator (Welford's update, merged a batch at a time)."""
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        n = values.size
+        if not n:
+            return
+        batch_mean = float(values.mean())
+        batch_m2 = float(np.square(values - batch_mean).sum())
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += batch_m2 + delta * delta * self.count * n / total
+        self.count = total
+
+    @property
+    def std(self):
+        return float(np.sqrt(self.m2 / self.count)) if self.count else 0.0
+
+
+class StreamingFeatureExtractor:
+    """Frame-level RMS, ZCR, pitch and spectral centroid statistics over PCM fed in pieces."""
+
+    def __init__(self, sample_rate, frame_length=N_FFT, hop_length=HOP_LENGTH, max_seconds=VOICE_MAX_SECONDS):
+        self.sample_rate = sample_rate
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.max_samples = int(max_seconds * sample_rate)
+        self.samples = 0
+        self.frames = 0
+        self.cpu_seconds = 0.0
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._window = np.hanning(frame_length).astype(np.float32)
+        freqs = np.fft.rfftfreq(frame_length, 1.0 / sample_rate)
+        # The file-based path resamples to SAMPLE_RATE; ignore content above its
+        # Nyquist frequency so centroids from both paths are on the same scale
+        self._centroid_bins = freqs <= SAMPLE_RATE / 2
+        self._freqs = freqs[self._centroid_bins]
+        self.stats = {name: RunningStats() for name in ('energy', 'zcr', 'pitch', 'spectral_centroid')}
+        self.emotion = EmotionTimeline(hop_length / sample_rate)
+
+    def feed(self, samples):
+        """Add float samples in [-1, 1]; returns how many were accepted (the clip is capped at max_seconds)."""
+        started = time.process_time()
+        samples = np.asarray(samples, dtype=np.float32)[:max(0, self.max_samples - self.samples)]
+        self.samples += samples.size
+        buffer = np.concatenate((self._buffer, samples))
+        if buffer.size >= self.frame_length:
+            count = 1 + (buffer.size - self.frame_length) // self.hop_length
+            frames = np.lib.stride_tricks.sliding_window_view(buffer, self.frame_length)[::self.hop_length][:count]
+            self._analyse(frames)
+            buffer = buffer[count * self.hop_length:]
+        self._buffer = buffer.copy()
+        self.cpu_seconds += time.process_time() - started
+        return samples.size
+
+    def _analyse(self, frames):
+        rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+        self.stats['energy'].update(rms)
+        zcr = np.mean(np.diff(np.signbit(frames), axis=1), axis=1)
+        self.stats['zcr'].update(zcr)
+
+        magnitude = np.abs(np.fft.rfft(frames * self._window, axis=1))[:, self._centroid_bins]
+        total = magnitude.sum(axis=1)
+        centroid = np.divide(magnitude @ self._freqs, total, out=np.zeros_like(total), where=total > 0)
+        self.stats['spectral_centroid'].update(centroid)
+
+        pitch = frame_pitch(frames, self.sample_rate, rms)
+        voiced = ~np.isnan(pitch)
+        self.stats['pitch'].update(pitch[voiced])
+        self.emotion.add(pitch, rms, zcr)
+        self.frames += len(frames)
+
+    def finish(self):
+        """(features, EmotionResult), features in the voice_analysis key format."""
+        if not self.frames and self._buffer.size:
+            # Clip shorter than one frame: analyse it zero-padded
+            started = time.process_time()
+            padded = np.zeros(self.frame_length, dtype=np.float32)
+            padded[:self._buffer.size] = self._buffer
+            self._analyse(padded[np.newaxis, :])
+            self.cpu_seconds += time.process_time() - started
+        self._buffer = np.zeros(0, dtype=np.float32)
+
+        features = {'duration': self.samples / self.sample_rate, 'sample_rate': self.sample_rate}
+        for name, stats in self.stats.items():
+            if stats.count:
+                features[f'mean_{name}'] = stats.mean
+                features[f'{name}_std'] = stats.std
+        features['analysis_cpu_seconds'] = round(self.cpu_seconds, 4)
+        return features, self.emotion.result()
+
+
+class VoiceStream:
+    """One recording in progress: ordered PCM chunks to a WAV file and the feature extractor."""
+
+    def __init__(self, user_id, file_path, sample_rate):
+        self.user_id = user_id
+        self.file_path = file_path
+        self.filename = os.path.basename(file_path)
+        self.extractor = StreamingFeatureExtractor(sample_rate)
+        self.next_seq = 0
+        self._early = {}
+        self._lock = threading.Lock()
+        self._wav = wave.open(file_path, 'wb')
+        self._wav.setnchannels(1)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(sample_rate)
+
+    def add_chunk(self, seq, pcm):
+        """Accept chunk `seq` of little-endian int16 PCM; chunks are applied in sequence order."""
+        if not isinstance(pcm, (bytes, bytearray)) or len(pcm) > MAX_CHUNK_BYTES or len(pcm) % 2:
+            raise ValueError("Invalid PCM chunk")
+        with self._lock:
+            if seq < self.next_seq or seq in self._early:
+                return
+            self._early[seq] = bytes(pcm)
+            if len(self._early) > VOICE_STREAM_REORDER:
+                raise ValueError(f"Too many chunks waiting for chunk {self.next_seq}")
+            while self.next_seq in self._early:
+                self._write(self._early.pop(self.next_seq))
+                self.next_seq += 1
+
+    def _write(self, pcm):
+        samples = np.frombuffer(pcm, dtype='<i2')
+        accepted = self.extractor.feed(samples.astype(np.float32) / 32768.0)
+        if accepted:
+            self._wav.writeframes(samples[:accepted].tobytes())
+
+    def received(self, chunks):
+        with self._lock:
+            return self.next_seq >= chunks
+
+    def finish(self):
+        with self._lock:
+            self._early.clear()
+            self._wav.close()
+            return self.extractor.finish()
+
+    def abort(self):
+        with self._lock:
+            self._early.clear()
+            try:
+                self._wav.close()
+            except Exception:
+                pass
+        try:
+            os.remove(self.file_path)
+        except OSError:
+            pass
+
+
+def open_stream(key, user_id, file_path, sample_rate):
+    """Start a stream for connection `key`, replacing any unfinished one; raises RuntimeError when at capacity."""
+    abort_stream(key)
+    with _streams_lock:
+        if len(_streams) >= VOICE_STREAM_MAX:
+            raise RuntimeError("Too many voice recordings in progress")
+        stream = VoiceStream(user_id, file_path, sample_rate)
+        _streams[key] = stream
+    return stream
+
+
+def get_stream(key):
+    with _streams_lock:
+        return _streams.get(key)
+
+
+def close_stream(key, stream=None):
+    """
+    Detach the stream of `key` so it can be finished; returns None if there is
+    none, or if it is no longer `stream` (replaced or aborted meanwhile).
+    """
+    with _streams_lock:
+        current = _streams.get(key)
+        if current is None or (stream is not None and current is not stream):
+            return None
+        return _streams.pop(key)
+
+
+def abort_stream(key):
+    """Discard the stream of `key` and its partial file (e.g. on disconnect)."""
+    stream = close_stream(key)
+    if stream is not None:
+        stream.abort()
+        logger.info(f"Discarded unfinished voice stream {stream.filename}")